@@ -1,41 +1,73 @@
-import cv2
-import torch
 import os
 import time
-from datetime import datetime, timezone, timedelta
-import requests
-import sqlite3
 import threading
 from dotenv import load_dotenv
-import json
-import traceback
-from filelock import FileLock
+import queue
 
 # Import từ module gộp mới
 from core_utils import (
-    STATUS_INSIDE, STATUS_COMPLETED, STATUS_INVALID,
-    get_vietnam_time_str, SafeDatabaseManager, SafeErrorLogger,
-    NetworkManager, SafeCameraManager, HardwareMock, ThreadSafeManager,
-    Config
+    STATUS_INSIDE,
+    STATUS_FAIL_NO_PLATE, STATUS_FAIL_PLATE_INSIDE, STATUS_FAIL_PLATE_MISMATCH,
+    ERROR_LOG_FILE, GREEN_LED_PIN, CAMERA_STATE_OK, CAMERA_STATE_STARTING, CAMERA_STATE_STALLED,
+    CAMERA_STATE_DOWN,
+    get_vietnam_time_str, get_vietnam_time_for_filename, safe_normalize_plate,
+    sanitize_filename_component, ensure_directories_exist,
+    SafeDatabaseManager, SafeErrorLogger, ChangeNotifier,
+    NetworkManager, SyncResult, ConnectivityMonitor, build_sync_event, read_event_image, AsyncImageWriter,
+    ThreadSafeManager, get_hardware_modules, EventTrace, TRACE_KIND_ENTRY, TRACE_KIND_EXIT, Config
 )
+from camera import SafeCameraManager, CameraSupervisor, camera_health_path
+from frame_bus import FrameBus
+from lanes import (
+    LaneConfig, load_lane_configs, LaneMetrics, BatchInferenceScheduler, create_rfid_reader,
+    load_plate_models, PlateRecognizer
+)
+from metrics import metrics
+
+# Get appropriate hardware modules (real or mock)
+GPIO, SimpleMFRC522 = get_hardware_modules()
 
 # --- CẤU HÌNH ---
 load_dotenv()
 API_ENDPOINT = os.getenv("API_ENDPOINT", "http://localhost:3000/api/events/submit")
 UID = os.getenv("UID")
+DB_FILE = os.getenv("DB_FILE", "parking_data.db")
 IMAGE_DIR = os.getenv("IMAGE_DIR", "offline_images")
 PICTURE_OUTPUT_DIR = os.getenv("PICTURE_OUTPUT_DIR", "picture")
 YOLOV5_REPO_PATH = os.getenv("YOLOV5_REPO_PATH")
 LP_DETECTOR_MODEL_PATH = os.getenv("LP_DETECTOR_MODEL_PATH")
 LP_OCR_MODEL_PATH = os.getenv("LP_OCR_MODEL_PATH")
 TMP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tmp")
+LANE_STATS_INTERVAL = 300  # Seconds between lane metric reports
 
 # --- Initialize new managers ---
 thread_manager = ThreadSafeManager(DB_FILE)
 error_logger = SafeErrorLogger(ERROR_LOG_FILE)
-db_manager = SafeDatabaseManager(DB_FILE)
+# Writes also notify the web app's live dashboard
+db_manager = SafeDatabaseManager(DB_FILE, notifier=ChangeNotifier(fanout_dir=Config.DASHBOARD_NOTIFY_DIR),
+                                 device_uid=UID)
 network_manager = NetworkManager(API_ENDPOINT, error_logger)
-camera_manager = None  # Will be initialized later
+connectivity_monitor = ConnectivityMonitor(network_manager, on_recovered=thread_manager.signal_sync_work)
+change_notifier = ChangeNotifier()  # Wakes the sync thread when other processes write
+lanes = []  # Lane objects, initialized later
+inference_scheduler = None  # Shared detector + OCR, initialized later
+# Event images are encoded and written off the gate's critical path
+image_writer = AsyncImageWriter(
+    PICTURE_OUTPUT_DIR,
+    max_queue=Config.IMAGE_WRITE_QUEUE_SIZE,
+    durable=Config.IMAGE_WRITE_DURABLE
+)
+
+# --- Metrics (served by the web app at /metrics; see metrics.py) ---
+GATE_DECISIONS = metrics.counter(
+    'parking_gate_decisions_total', 'Swipe outcomes: entry, exit, no_plate, plate_inside, plate_mismatch, error',
+    ('lane', 'decision'))
+SYNC_EVENTS = metrics.counter(
+    'parking_sync_events_total', 'Outbox events handled by the sync thread, by result', ('result',))
+SYNC_BACKLOG = metrics.gauge('parking_sync_backlog', 'Outbox events not yet accepted by the server')
+OCCUPANCY = metrics.gauge('parking_occupancy', 'Vehicles currently inside')
+IMAGE_WRITE_QUEUE = metrics.gauge('parking_image_write_queue', 'Event images waiting to be written')
+LANE_QUEUE = metrics.gauge('parking_lane_queue', 'Swipes waiting for the lane worker', ('lane',))
 
 # --- Legacy variables for compatibility ---
 DB_LOCK_FILE = DB_FILE + ".lock"
@@ -53,32 +85,134 @@ def log_error(message: str, category: str = "GENERAL", exception_obj: Exception
     error_logger.log_error(message, category, exception_obj)
 
 
-def _blink_led_target() -> None:
+def _blink_led_target(pin: int) -> None:
     """LED thread target function."""
     try:
-        GPIO.output(GREEN_LED_PIN, GPIO.HIGH)
-        print("🟢 [LED] Đèn xanh BẬT (Thành công)")
+        GPIO.output(pin, GPIO.HIGH)
+        print(f"🟢 [LED] Đèn xanh BẬT (Thành công) - pin {pin}")
         time.sleep(2)
     finally:
-        GPIO.output(GREEN_LED_PIN, GPIO.LOW)
-        print("🟢 [LED] Đèn xanh TẮT")
+        GPIO.output(pin, GPIO.LOW)
+        print(f"🟢 [LED] Đèn xanh TẮT - pin {pin}")
 
-def blink_success_led() -> None:
+def blink_success_led(pin: int = GREEN_LED_PIN) -> None:
     """Start new thread to blink green LED for 2 seconds."""
-    led_thread = threading.Thread(target=_blink_led_target)
+    led_thread = threading.Thread(target=_blink_led_target, args=(pin,))
     led_thread.daemon = True
     led_thread.start()
 
 
-def live_view_capture_thread(cap) -> None:
+class Lane:
     """
-    Thread for continuous camera frame capture and save to temporary file for web view.
-    Now using SafeCameraManager for better memory management.
+    Runtime of one gate lane: camera grabber, RFID reader thread and a
+    worker that processes the lane's swipes in order. Recognition goes
+    through the shared inference_scheduler.
     """
-    if camera_manager:
-        camera_manager.live_view_thread_safe()
-    else:
-        print("❌ [LiveView] Camera manager not initialized")
+
+    def __init__(self, config: LaneConfig):
+        self.config = config
+        self.lane_id = config.lane_id
+        self.gate_id = config.gate_id
+        self.metrics = LaneMetrics(config.lane_id)
+        self.swipes = queue.Queue(maxsize=Config.LANE_QUEUE_SIZE)
+        self.frame_bus = FrameBus(config.frame_bus_name, create=True)
+        self.camera_manager = SafeCameraManager(0, thread_manager, error_logger, TMP_DIR, self.frame_bus,
+                                                backend=config.capture_backend(), name=config.lane_id)
+        self.camera_supervisor = CameraSupervisor(
+            self.camera_manager,
+            stall_timeout=Config.CAMERA_STALL_TIMEOUT,
+            backoff_max=Config.CAMERA_REOPEN_BACKOFF_MAX,
+            recovery_wait=Config.CAMERA_RECOVERY_WAIT,
+            status_path=camera_health_path(config.lane_id),
+            on_state_change=self._on_camera_state_change,
+            name=f"Camera-{config.lane_id}"
+        )
+        reader_settings = config.reader
+        self.reader = create_rfid_reader(SimpleMFRC522, reader_settings.get("bus", 0),
+                                         reader_settings.get("device", 0), reader_settings.get("pin_rst"))
+        self._threads = []
+        LANE_QUEUE.set_function(self.swipes.qsize, lane=self.lane_id)
+
+    def initialize(self):
+        if not self.camera_manager.initialize_camera():
+            # Không dừng hệ thống: camera_supervisor sẽ thử mở lại camera
+            print(f"⚠️  [Lane {self.lane_id}] Không thể khởi tạo camera, sẽ thử lại trong nền")
+            log_error(f"Camera of lane {self.lane_id} failed to initialize, supervisor will retry", category="CAMERA")
+        GPIO.setup(self.config.led_pin, GPIO.OUT)
+        GPIO.output(self.config.led_pin, GPIO.LOW)  # Đảm bảo đèn tắt khi khởi động
+
+    def start(self):
+        for target, name in ((self.camera_manager.grabber_thread_safe, "Grabber"),
+                             (self._reader_loop, "Reader"), (self._worker_loop, "Worker")):
+            thread = threading.Thread(target=target, name=f"{name}-{self.lane_id}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self.camera_supervisor.start()
+
+    def _on_camera_state_change(self, previous, state):
+        if state in (CAMERA_STATE_STALLED, CAMERA_STATE_DOWN) and previous == CAMERA_STATE_OK:
+            log_error(f"Camera of lane {self.lane_id} is {state}, reopening", category="CAMERA_HEALTH")
+        elif state == CAMERA_STATE_OK and previous != CAMERA_STATE_STARTING:
+            log_error(f"Camera of lane {self.lane_id} recovered after "
+                      f"{self.camera_supervisor.last_recovery_time:.1f}s", category="CAMERA_HEALTH")
+
+    def _reader_loop(self):
+        """Wait for cards; grab the frame at swipe time and queue the swipe."""
+        while not thread_manager.is_shutdown_requested():
+            try:
+                print(f"\n💡 [Lane {self.lane_id}] Vui lòng đưa thẻ vào đầu đọc...")
+                rfid_id, rfid_text = self.reader.read()
+                swipe_time = time.monotonic()
+                print(f"💳 [Lane {self.lane_id}] Phát hiện thẻ! ID: {rfid_id}.")
+                self.metrics.record_swipe()
+
+                # Chờ camera phục hồi một chút thay vì báo lỗi ngay;
+                # chọn khung hình nét nhất quanh thời điểm quẹt thẻ
+                frame, quality = self.camera_supervisor.select_event_frame(
+                    window=Config.FRAME_SELECT_WINDOW, lookback=Config.FRAME_SELECT_LOOKBACK)
+                captured_at = time.monotonic()
+                try:
+                    self.swipes.put_nowait((rfid_id, frame, quality, swipe_time, captured_at))
+                except queue.Full:
+                    self.metrics.record_dropped()
+                    print(f"🚨 [Lane {self.lane_id}] Hàng đợi đầy, bỏ qua thẻ {rfid_id}")
+                    log_error(f"Lane {self.lane_id} queue full, swipe dropped. RFID: {rfid_id}", category="LANE")
+                    continue
+
+                time.sleep(1)  # Nghỉ một chút trước khi chờ lần quẹt thẻ tiếp theo
+            except Exception as e:
+                print(f"🔥 [Lane {self.lane_id}] Lỗi đầu đọc RFID: {e}")
+                log_error(f"RFID reader error on lane {self.lane_id}", category="LANE", exception_obj=e)
+                time.sleep(1)
+
+    def _worker_loop(self):
+        while not thread_manager.is_shutdown_requested():
+            try:
+                rfid_id, frame, quality, swipe_time, captured_at = self.swipes.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            # Thời gian từng bước của lần quẹt thẻ, lưu cạnh sự kiện (bảng event_trace)
+            trace = EventTrace(self.lane_id, swipe_time)
+            trace.add("capture", captured_at - swipe_time)
+            trace.add("queue", time.monotonic() - captured_at)
+            success = _process_vehicle_event(self, rfid_id, frame, quality, trace)
+            self.metrics.record_processed(trace.close(), success)
+            try:
+                db_manager.record_event_trace(trace)
+            except Exception as e:
+                log_error(f"Could not store swipe trace on lane {self.lane_id}: {trace.as_dict()}",
+                          category="TRACE", exception_obj=e)
+
+    def stats(self) -> dict:
+        stats = self.metrics.as_dict(self.swipes.qsize())
+        stats['camera'] = self.camera_manager.get_stats()
+        stats['camera_health'] = self.camera_supervisor.get_stats()
+        return stats
+
+    def release(self):
+        self.camera_supervisor.stop()
+        self.camera_manager.release()
+        self.frame_bus.close()
 
 
 def validate_environment_variables() -> bool:
@@ -97,6 +231,7 @@ if not validate_environment_variables():
 
 try:
     import function.helper as helper
+    import function.utils_rotate as utils_rotate
     print("✅ Tải thành công các module helper tùy chỉnh.")
 except ImportError:
     print("❌ Cảnh báo: Không thể tải các module helper. Sử dụng hàm giả lập.")
@@ -109,6 +244,7 @@ except ImportError:
                  return f"MOCK{int(time.time())%1000 + cls._plate_counter:04d}LP"
             return "unknown"
     helper = MockHelper()
+    utils_rotate = None
 
 def init_db() -> None:
     """Initialize SQLite database using SafeDatabaseManager."""
@@ -117,130 +253,96 @@ def init_db() -> None:
     ensure_directories_exist(IMAGE_DIR, PICTURE_OUTPUT_DIR, TMP_DIR)
 
 
-def send_event_to_server(event_payload: dict, image_data_bytes: bytes = None) -> str:
-    """
-    Send complete event object to server endpoint.
-    Now using NetworkManager for better error handling.
-    """
-    result = network_manager.send_event_to_server(event_payload, image_data_bytes)
-    
-    # Convert SyncResult to legacy string format for compatibility
-    if result == SyncResult.SUCCESS:
-        return 'success'
-    elif result == SyncResult.PERMANENT_FAILURE:
-        return 'permanent_failure'
-    else:
-        return 'temporary_failure'
-
-
 def sync_offline_data_to_server():
     """Improved sync function using new managers."""
     while True:
         try:
-            # Wait for work or timeout after 60 seconds
-            thread_manager.wait_for_sync_work(timeout=60.0)
-            
+            # Writers signal us directly (same process) or via ChangeNotifier (web app);
+            # the timeout is only a safety net for lost notifications and retries.
+            thread_manager.wait_for_sync_work(timeout=Config.SYNC_SAFETY_INTERVAL)
+            thread_manager.clear_sync_work()
+
             # Don't sync while processing vehicle events
-            if thread_manager.is_vehicle_processing():
-                time.sleep(0.5)
+            thread_manager.wait_until_idle()
+
+            # Server known to be down: skip the DB/image work entirely.
+            # ConnectivityMonitor signals sync work as soon as it is back.
+            if not network_manager.is_server_available():
                 continue
 
-            # Get unsynced records using safe database manager
-            unsynced_records = db_manager.get_unsynced_records(limit=1)
+            # Next event from the outbox, in order, right after the sync cursor
+            pending_events = db_manager.get_pending_events(limit=1)
             
-            if not unsynced_records:
+            if not pending_events:
                 # No more work
-                thread_manager.clear_sync_work()
                 continue
                 
-            record = unsynced_records[0]
-            print(f"🔄 [SyncDB] Processing record ID: {record['id']}, Plate: {record['plate']}")
+            event = pending_events[0]
+            print(f"🔄 [SyncDB] Processing {event['event_type']} event #{event['id']} "
+                  f"(record ID: {event['log_id']}, Plate: {event['plate']})")
             
-            # Determine event type and details
-            status_int = record['status']
-            details_payload = f"DB_ID: {record['id']}"
-            is_out_event = False
-            
-            # Map database status to server event type
-            if status_int == STATUS_COMPLETED:
-                is_out_event = True
-                event_type = "OUT"
-            elif status_int == STATUS_INSIDE:
-                event_type = "IN"
-            elif status_int == STATUS_FAIL_NO_PLATE:
-                event_type = "NO_PLATE_DETECTED"
-                details_payload += " - Lỗi: AI không nhận dạng được biển số."
-            elif status_int == STATUS_FAIL_PLATE_INSIDE:
-                event_type = "TOKEN_DUPLICATED"
-                details_payload += " - Lỗi: Biển số đã có trong bãi với thẻ khác."
-            elif status_int == STATUS_FAIL_PLATE_MISMATCH:
-                is_out_event = True
-                event_type = "PLATE_MISMATCH"
-                details_payload += " - Lỗi: Biển số ra không khớp biển số vào."
-            else:
-                event_type = "FAIL_OUT"
-                details_payload += " - Lỗi hệ thống không xác định."
+            # Map the outbox event to its server payload
+            event_payload, image_filename = build_sync_event(event, UID)
 
-            # Get correct timestamp and image
-            timestamp = record['time_out'] if is_out_event and record['time_out'] else record['time_in']
-            image_filename = record['image_path_out'] if is_out_event and record['image_path_out'] else record['image_path_in']
-            
             # Load image data if available
             image_bytes = None
+            if not image_writer.wait_for(image_filename, timeout=Config.IMAGE_WRITE_SYNC_WAIT):
+                # Never upload an event before its image is on disk
+                print(f"⏳ [SyncDB] Image {image_filename} still being written, event #{event['id']} waits")
+                SYNC_EVENTS.inc(result="image_pending")
+                thread_manager.signal_sync_work()
+                continue
             if image_filename:
                 full_image_path = os.path.join(PICTURE_OUTPUT_DIR, image_filename)
-                if os.path.exists(full_image_path):
-                    try:
-                        with open(full_image_path, 'rb') as img_file:
-                            image_bytes = img_file.read()
-                    except IOError as e:
-                        log_error(f"SyncDB: Error reading image {full_image_path} for ID {record['id']}: {e}", 
-                                category="SYNC/FS", exception_obj=e)
-                        continue
-                else:
-                    log_error(f"SyncDB: Image file not found {full_image_path} for log ID {record['id']}", 
-                            category="SYNC/FS")
-
-            # Create event payload using new helper function
-            event_payload = create_event_payload(
-                uid=UID,
-                plate=record['plate'],
-                rfid_token=record['rfid_token'],
-                timestamp=timestamp,
-                event_type=event_type,
-                details=details_payload,
-                device_db_id=record['id']
-            )
+                try:
+                    image_bytes = read_event_image(PICTURE_OUTPUT_DIR, image_filename)
+                    if image_bytes is None:
+                        log_error(f"SyncDB: Image file not found {full_image_path} for log ID {event['log_id']}", 
+                                category="SYNC/FS")
+                except IOError as e:
+                    # Like a missing file: send the event without its image
+                    # rather than blocking the outbox behind it
+                    log_error(f"SyncDB: Error reading image {full_image_path} for ID {event['log_id']}, "
+                              f"sending without it: {e}", category="SYNC/FS", exception_obj=e)
+
+            # The idempotency key was stored with the event: if we crash after
+            # the server accepted it, the re-send carries the same key.
+            db_manager.begin_event_attempt(event)
 
             # Send to server using NetworkManager
-            result = network_manager.send_event_to_server(event_payload, image_bytes)
+            result = network_manager.send_event_to_server(event_payload, image_bytes, event['idempotency_key'])
 
             # Handle result
+            SYNC_EVENTS.inc(result=result.value)
             if result == SyncResult.SUCCESS:
-                if db_manager.mark_as_synced(record['id']):
-                    print(f"✅ [SyncDB] Record ID: {record['id']} marked as synced")
-                    thread_manager.signal_sync_work()  # Check for more work
+                if db_manager.complete_event(event):
+                    print(f"✅ [SyncDB] Record ID: {event['log_id']} marked as synced")
+                thread_manager.signal_sync_work()  # Check for more work
                     
             elif result == SyncResult.PERMANENT_FAILURE:
-                if db_manager.mark_as_invalid(record['id']):
-                    print(f"🚫 [SyncDB] Record ID: {record['id']} marked as invalid due to permanent failure")
-                    thread_manager.signal_sync_work()
+                db_manager.complete_event(event, invalid=True)
+                print(f"🚫 [SyncDB] Record ID: {event['log_id']} marked as invalid due to permanent failure")
+                thread_manager.signal_sync_work()
+
+            elif result == SyncResult.CIRCUIT_OPEN:
+                print(f"🔌 [SyncDB] Server unreachable, event #{event['id']} stays queued until it recovers")
                     
             else:  # Temporary failure or network error
-                print(f"⏳ [SyncDB] Temporary failure for record ID: {record['id']}. Will retry later")
-                thread_manager.clear_sync_work()
+                print(f"⏳ [SyncDB] Temporary failure for event #{event['id']}. Will retry later")
 
         except Exception as e:
             print(f"🔥 [SyncDB] Critical error in sync thread: {e}")
+            SYNC_EVENTS.inc(result="error")
             log_error("Critical error in DB sync thread", category="SYNC_DB", exception_obj=e)
-            thread_manager.clear_sync_work()
             time.sleep(30)  # Wait before retrying
 
 def _save_vehicle_images(base_filename_part, event_type, original_frame, cropped_frame=None):
     """
     Hàm helper để lưu ảnh gốc và ảnh cắt vào thư mục picture.
     Tránh lặp lại code và làm cho logic xử lý VÀO/RA gọn gàng hơn.
-    Trả về một dict chứa tên các file ảnh đã lưu.
+    Ảnh được đưa vào hàng đợi của image_writer (mã hóa và ghi ở luồng nền),
+    tên file được trả về ngay để lưu vào CSDL.
+    Trả về một dict chứa tên các file ảnh.
     """
     timestamp_fn = get_vietnam_time_for_filename()
     base_fn = f"{event_type}_{timestamp_fn}_{sanitize_filename_component(base_filename_part)}"
@@ -253,15 +355,14 @@ def _save_vehicle_images(base_filename_part, event_type, original_frame, cropped
 
     try:
         raw_path_viewer = os.path.join(PICTURE_OUTPUT_DIR, raw_image_filename)
-        cv2.imwrite(raw_path_viewer, original_frame)
-        image_paths["raw"] = raw_image_filename
-        print(f"🖼️  [FS] Đã lưu ảnh {event_type.upper()} (gốc): {raw_path_viewer}")
+        # Mã hóa JPEG một lần; bytes được giữ lại cho luồng sync upload
+        image_paths["raw"] = image_writer.submit(raw_image_filename, original_frame)
+        print(f"🖼️  [FS] Đã xếp hàng lưu ảnh {event_type.upper()} (gốc): {raw_path_viewer}")
 
         if crop_image_filename:
             crop_path_viewer = os.path.join(PICTURE_OUTPUT_DIR, crop_image_filename)
-            cv2.imwrite(crop_path_viewer, cropped_frame)
-            image_paths["crop"] = crop_image_filename
-            print(f"🖼️  [FS] Đã lưu ảnh {event_type.upper()} (biển số): {crop_path_viewer}")
+            image_paths["crop"] = image_writer.submit(crop_image_filename, cropped_frame)
+            print(f"🖼️  [FS] Đã xếp hàng lưu ảnh {event_type.upper()} (biển số): {crop_path_viewer}")
             
     except Exception as e_img:
         print(f"❌ [FS] Lỗi khi lưu ảnh {event_type.upper()}: {e_img}")
@@ -269,47 +370,46 @@ def _save_vehicle_images(base_filename_part, event_type, original_frame, cropped
 
     return image_paths
 
-def _process_vehicle_event(rfid_id, cap):
+def _process_vehicle_event(lane, rfid_id, original_frame_to_save, frame_quality=None, trace=None) -> bool:
     """
-    Improved vehicle event processing using new managers.
-    Thread-safe and with better error handling.
+    Process one swipe on a lane: recognize the plate through the shared
+    scheduler, then apply the entry/exit rules. Returns False on failure.
+    A frame the quality gate rejected (blur, exposure, motion) skips the
+    detector and is handled like an unreadable plate. Stage timings and the
+    resulting parking_log row go into `trace` (an EventTrace).
     """
-    print("📸 [Main] Bắt đầu chụp ảnh và nhận dạng biển số...")
+    trace = trace or EventTrace(lane.lane_id)
+    print(f"📸 [Lane {lane.lane_id}] Bắt đầu nhận dạng biển số...")
     
-    # Use safe camera capture
-    original_frame_to_save = camera_manager.capture_frame_safe(flush_buffer=True)
+    # Frame grabbed by the lane's reader thread right after the swipe
     if original_frame_to_save is None:
         print("❌ [Main] Không thể lấy khung hình từ camera.")
-        log_error("Không thể lấy khung hình từ camera trong vòng lặp chính.", category="CAMERA")
-        return
-
-    # AI processing outside of database lock for better performance
-    print("📸 [AI] Đang xử lý ảnh để nhận dạng biển số...")
-    live_frame_copy = original_frame_to_save.copy()
-    plate_detection_results = yolo_LP_detect(live_frame_copy, size=640)
-    detected_coords_list = plate_detection_results.pandas().xyxy[0].values.tolist()
-    
-    cropped_license_plate_img = None
-    if detected_coords_list:
-        # Sort by area (largest first) and take the biggest detection
-        detected_coords_list.sort(key=lambda x: (x[2]-x[0])*(x[3]-x[1]), reverse=True)
-        x1, y1, x2, y2 = map(int, detected_coords_list[0][:4])
-        
-        # Ensure coordinates are within image bounds
-        h, w = original_frame_to_save.shape[:2]
-        y1, y2 = max(0, y1), min(h, y2)
-        x1, x2 = max(0, x1), min(w, x2)
-        
-        if y2 > y1 and x2 > x1:
-            cropped_license_plate_img = original_frame_to_save[y1:y2, x1:x2]
-            found_license_plate_text = helper.read_plate(yolo_license_plate, cropped_license_plate_img.copy())
-        else:
-            found_license_plate_text = helper.read_plate(yolo_license_plate, live_frame_copy)
+        log_error(f"Không thể lấy khung hình từ camera của làn {lane.lane_id}.", category="CAMERA")
+        GATE_DECISIONS.inc(lane=lane.lane_id, decision="error")
+        return False
+
+    if Config.FRAME_QUALITY_GATING and frame_quality is not None and not frame_quality.usable:
+        # Khung hình không thể cho ra biển số: bỏ qua model AI
+        print(f"🌫️  [AI] Bỏ qua nhận dạng, khung hình kém chất lượng ({frame_quality.reason}): {frame_quality.as_dict()}")
+        found_license_plate_text, cropped_license_plate_img = None, None
+        lane.metrics.record_recognition(False, skipped=True)
     else:
-        found_license_plate_text = helper.read_plate(yolo_license_plate, live_frame_copy)
+        # AI processing outside of database lock, batched with other lanes
+        print("📸 [AI] Đang xử lý ảnh để nhận dạng biển số...")
+        try:
+            found_license_plate_text, cropped_license_plate_img, timings = inference_scheduler.infer(original_frame_to_save)
+        except Exception as e_ai:
+            print(f"🔥 [AI] Lỗi nhận dạng biển số: {e_ai}")
+            log_error(f"Plate recognition failed on lane {lane.lane_id}", category="AI", exception_obj=e_ai)
+            GATE_DECISIONS.inc(lane=lane.lane_id, decision="error")
+            return False
+        for stage, seconds in timings.items():
+            trace.add(stage, seconds)
+        lane.metrics.record_recognition(safe_normalize_plate(found_license_plate_text) != "UNKNOWN")
     
     # Use safe normalize function
-    normalized_plate = safe_normalize_plate(found_license_plate_text)
+    with trace.span("normalize"):
+        normalized_plate = safe_normalize_plate(found_license_plate_text)
 
     # Now use exclusive processing to ensure thread safety
     try:
@@ -317,7 +417,8 @@ def _process_vehicle_event(rfid_id, cap):
             print(f"   [Main] Exclusive processing started for RFID: {rfid_id}")
             
             # Get vehicle record using database manager
-            vehicle_inside_record = db_manager.get_vehicle_inside_by_rfid(str(rfid_id))
+            with trace.span("lookup"):
+                vehicle_inside_record = db_manager.get_vehicle_inside_by_rfid(str(rfid_id))
 
             # CHECK PLATE VALIDITY
             if not normalized_plate or normalized_plate == "UNKNOWN":
@@ -326,19 +427,24 @@ def _process_vehicle_event(rfid_id, cap):
                 
                 # Save error event to database
                 current_time_str = get_vietnam_time_str()
-                image_paths = _save_vehicle_images(f"rfid_{rfid_id}", "in_fail_no_plate", original_frame_to_save, cropped_license_plate_img)
+                with trace.span("image"):
+                    image_paths = _save_vehicle_images(f"rfid_{rfid_id}", "in_fail_no_plate", original_frame_to_save, cropped_license_plate_img)
                 
-                record_id = db_manager.insert_vehicle_entry(
-                    plate="UNKNOWN",
-                    rfid_token=str(rfid_id),
-                    time_in=current_time_str,
-                    image_path_in=image_paths.get("raw"),
-                    status=STATUS_FAIL_NO_PLATE
-                )
+                with trace.span("commit"):
+                    record_id = db_manager.insert_vehicle_entry(
+                        plate="UNKNOWN",
+                        rfid_token=str(rfid_id),
+                        time_in=current_time_str,
+                        image_path_in=image_paths.get("raw"),
+                        status=STATUS_FAIL_NO_PLATE,
+                        gate_id=lane.gate_id
+                    )
+                trace.set_event(record_id, TRACE_KIND_ENTRY)
                 print(f"💾 [DB] Saved error event 'No plate detected' for RFID: {rfid_id}, ID: {record_id}")
+                GATE_DECISIONS.inc(lane=lane.lane_id, decision="no_plate")
                 
                 thread_manager.signal_sync_work()
-                return
+                return True
 
             print(f"🎉 [AI] Detected plate: '{found_license_plate_text}' -> Normalized: '{normalized_plate}'")
 
@@ -347,36 +453,48 @@ def _process_vehicle_event(rfid_id, cap):
                 print("➡️  [Logic] Processing ENTRY...")
                 
                 # Check if plate is already inside with different RFID
-                if db_manager.is_plate_inside(normalized_plate):
+                with trace.span("lookup"):
+                    plate_inside = db_manager.is_plate_inside(normalized_plate)
+                if plate_inside:
                     print(f"🚨 [Logic] VALIDATION FAILED: Plate '{normalized_plate}' already inside with different RFID.")
                     log_error(f"VALIDATION FAILED ENTRY: Plate '{normalized_plate}' (RFID: {rfid_id}) already inside with different RFID.", category="LOGIC/VALIDATION")
                     
                     # Save error event
-                    image_paths = _save_vehicle_images(normalized_plate, "in_fail_plate_inside", original_frame_to_save, cropped_license_plate_img)
+                    with trace.span("image"):
+                        image_paths = _save_vehicle_images(normalized_plate, "in_fail_plate_inside", original_frame_to_save, cropped_license_plate_img)
                     current_time_str = get_vietnam_time_str()
                     
-                    record_id = db_manager.insert_vehicle_entry(
-                        plate=normalized_plate,
-                        rfid_token=str(rfid_id),
-                        time_in=current_time_str,
-                        image_path_in=image_paths.get("raw"),
-                        status=STATUS_FAIL_PLATE_INSIDE
-                    )
+                    with trace.span("commit"):
+                        record_id = db_manager.insert_vehicle_entry(
+                            plate=normalized_plate,
+                            rfid_token=str(rfid_id),
+                            time_in=current_time_str,
+                            image_path_in=image_paths.get("raw"),
+                            status=STATUS_FAIL_PLATE_INSIDE,
+                            gate_id=lane.gate_id
+                        )
+                    trace.set_event(record_id, TRACE_KIND_ENTRY)
                     print(f"💾 [DB] Saved error event 'Plate already inside' for RFID: {rfid_id}, ID: {record_id}")
+                    GATE_DECISIONS.inc(lane=lane.lane_id, decision="plate_inside")
                 else:
                     print(f"✅ [Logic] VALIDATION SUCCESS: Plate '{normalized_plate}' valid for entry.")
                     current_time_str = get_vietnam_time_str()
-                    image_paths = _save_vehicle_images(normalized_plate, "in", original_frame_to_save, cropped_license_plate_img)
+                    with trace.span("image"):
+                        image_paths = _save_vehicle_images(normalized_plate, "in", original_frame_to_save, cropped_license_plate_img)
                     
-                    record_id = db_manager.insert_vehicle_entry(
-                        plate=normalized_plate,
-                        rfid_token=str(rfid_id),
-                        time_in=current_time_str,
-                        image_path_in=image_paths.get("raw"),
-                        status=STATUS_INSIDE
-                    )
+                    with trace.span("commit"):
+                        record_id = db_manager.insert_vehicle_entry(
+                            plate=normalized_plate,
+                            rfid_token=str(rfid_id),
+                            time_in=current_time_str,
+                            image_path_in=image_paths.get("raw"),
+                            status=STATUS_INSIDE,
+                            gate_id=lane.gate_id
+                        )
+                    trace.set_event(record_id, TRACE_KIND_ENTRY)
                     print(f"💾 [DB] ENTRY event saved. ID: {record_id}")
-                    blink_success_led()
+                    GATE_DECISIONS.inc(lane=lane.lane_id, decision="entry")
+                    blink_success_led(lane.config.led_pin)
 
             # VEHICLE EXIT LOGIC
             else:
@@ -386,35 +504,45 @@ def _process_vehicle_event(rfid_id, cap):
                 current_time_str = get_vietnam_time_str()
                 
                 # Always save exit image for evidence
-                image_paths = _save_vehicle_images(normalized_plate, "out", original_frame_to_save, cropped_license_plate_img)
+                with trace.span("image"):
+                    image_paths = _save_vehicle_images(normalized_plate, "out", original_frame_to_save, cropped_license_plate_img)
 
                 if normalized_plate != plate_in_db:
                     print(f"🚨 [Logic] SECURITY WARNING: Exit plate '{normalized_plate}' DOES NOT MATCH entry plate '{plate_in_db}'. Access denied.")
                     log_error(f"SECURITY WARNING EXIT: Exit plate '{normalized_plate}' (RFID: {rfid_id}) DOES NOT MATCH entry plate '{plate_in_db}'.", category="LOGIC/SECURITY")
                     
                     # Save security error event as separate record
-                    record_id = db_manager.insert_vehicle_entry(
-                        plate=normalized_plate,
-                        rfid_token=str(rfid_id),
-                        time_in=current_time_str,
-                        image_path_in=image_paths.get("raw"),
-                        status=STATUS_FAIL_PLATE_MISMATCH
-                    )
+                    with trace.span("commit"):
+                        record_id = db_manager.insert_vehicle_entry(
+                            plate=normalized_plate,
+                            rfid_token=str(rfid_id),
+                            time_in=current_time_str,
+                            image_path_in=image_paths.get("raw"),
+                            status=STATUS_FAIL_PLATE_MISMATCH,
+                            gate_id=lane.gate_id
+                        )
+                    trace.set_event(record_id, TRACE_KIND_ENTRY)
                     print(f"💾 [DB] Saved security error event 'Plate mismatch' for RFID: {rfid_id}, ID: {record_id}")
+                    GATE_DECISIONS.inc(lane=lane.lane_id, decision="plate_mismatch")
                 else:
                     print(f"✅ [Logic] VALIDATION SUCCESS: Plate '{normalized_plate}' matches. Exit allowed.")
                     
-                    success = db_manager.update_vehicle_exit(
-                        record_id=db_id_in,
-                        time_out=current_time_str,
-                        image_path_out=image_paths.get("raw")
-                    )
+                    with trace.span("commit"):
+                        success = db_manager.update_vehicle_exit(
+                            record_id=db_id_in,
+                            time_out=current_time_str,
+                            image_path_out=image_paths.get("raw"),
+                            gate_id=lane.gate_id
+                        )
                     
                     if success:
                         print(f"💾 [DB] EXIT event updated for ID: {db_id_in}")
-                        blink_success_led()
+                        trace.set_event(db_id_in, TRACE_KIND_EXIT)
+                        GATE_DECISIONS.inc(lane=lane.lane_id, decision="exit")
+                        blink_success_led(lane.config.led_pin)
                     else:
                         print(f"❌ [DB] Failed to update exit for ID: {db_id_in}")
+                        GATE_DECISIONS.inc(lane=lane.lane_id, decision="error")
             
             # Signal sync work after every event
             thread_manager.signal_sync_work()
@@ -422,36 +550,41 @@ def _process_vehicle_event(rfid_id, cap):
     except Exception as e_txn:
         print(f"🔥 [Main] Critical error in vehicle processing: {e_txn}")
         log_error("Critical error in vehicle processing", category="VEHICLE_PROCESSING", exception_obj=e_txn)
+        GATE_DECISIONS.inc(lane=lane.lane_id, decision="error")
+        return False
     finally:
         print("   [Main] Vehicle processing completed.")
+    return True
 
 
 # --- KHỞI TẠO HỆ THỐNG ---
 print("🚀 [Main] Bắt đầu khởi tạo hệ thống...")
 init_db()
 try:
-    print("   [AI] Đang tải model phát hiện biển số...")
-    yolo_LP_detect = torch.hub.load(YOLOV5_REPO_PATH, 'custom', path=LP_DETECTOR_MODEL_PATH, source='local', _verbose=False)
-    print("   [AI] Đang tải model OCR biển số...")
-    yolo_license_plate = torch.hub.load(YOLOV5_REPO_PATH, 'custom', path=LP_OCR_MODEL_PATH, source='local', _verbose=False)
-    yolo_license_plate.conf = 0.60
+    print("   [AI] Đang tải model phát hiện biển số và model OCR biển số...")
+    yolo_LP_detect, yolo_license_plate = load_plate_models(YOLOV5_REPO_PATH, LP_DETECTOR_MODEL_PATH, LP_OCR_MODEL_PATH)
+    # Cùng một bước nhận dạng được recognition_benchmark.py chạy lại trên ảnh mẫu
+    plate_recognizer = PlateRecognizer(yolo_LP_detect, yolo_license_plate, helper.read_plate,
+                                       deskew=utils_rotate.deskew if Config.PLATE_DESKEW and utils_rotate else None)
     
-    print("   [HW] Khởi tạo camera...")
-    camera_manager = SafeCameraManager(0, thread_manager, error_logger, TMP_DIR)
-    if not camera_manager.initialize_camera():
-        raise IOError("Không thể khởi tạo camera")
+    # One model pair for all lanes; simultaneous swipes are batched
+    inference_scheduler = BatchInferenceScheduler(
+        plate_recognizer.recognize_batch,
+        max_batch_size=Config.INFERENCE_MAX_BATCH,
+        max_wait=Config.INFERENCE_MAX_WAIT_MS / 1000.0
+    ).start()
     
     print("   [HW] Khởi tạo chân GPIO...")
     GPIO.setwarnings(False)
     GPIO.setmode(GPIO.BCM)
-    
-    print("   [HW] Khởi tạo đầu đọc RFID...")
-    reader = SimpleMFRC522()
 
-    GPIO.setup(GREEN_LED_PIN, GPIO.OUT)
-    GPIO.output(GREEN_LED_PIN, GPIO.LOW) # Đảm bảo đèn tắt khi khởi động
+    for lane_config in load_lane_configs():
+        print(f"   [HW] Khởi tạo làn {lane_config.lane_id} (cổng: {lane_config.gate_id}): camera, đầu đọc RFID, LED...")
+        lane = Lane(lane_config)
+        lanes.append(lane)
+        lane.initialize()
 
-    print("✅ [Main] Model AI, Camera, GPIO và Đầu đọc RFID đã được khởi tạo thành công!")
+    print(f"✅ [Main] Model AI và {len(lanes)} làn (Camera, GPIO, Đầu đọc RFID) đã được khởi tạo thành công!")
 except Exception as e:
     print(f"🔥 [Main] LỖI NGHIÊM TRỌNG khi khởi tạo: {e}")
     log_error("LỖI NGHIÊM TRỌNG khi khởi tạo hệ thống", category="INITIALIZATION", exception_obj=e)
@@ -465,29 +598,46 @@ if db_manager.has_unsynced_data():
     print("   [Main] Phát hiện dữ liệu cũ chưa đồng bộ. Bật tín hiệu cho luồng sync DB.")
     thread_manager.signal_sync_work()
 
+image_writer.start()
+change_notifier.listen(lambda reason: thread_manager.signal_sync_work())
 sync_thread = threading.Thread(target=sync_offline_data_to_server, daemon=True)
 sync_thread.start()
+connectivity_monitor.start()
 print("🚀 [Main] Đã khởi động luồng đồng bộ CSDL theo tín hiệu.")
 
-# --- LIVE VIEW THREAD ---
-print("🚀 [Main] Khởi động luồng xem camera trực tiếp...")
+# Số liệu của tiến trình cổng, ghi ra file để trang /metrics của web app đọc
+def update_summary_gauges():
+    """Một lần đọc tóm tắt CSDL cho mỗi lần ghi số liệu, dùng cho cả hai gauge."""
+    summary = db_manager.get_dashboard_summary() or {}
+    for gauge, field in ((SYNC_BACKLOG, 'sync_pending'), (OCCUPANCY, 'occupancy')):
+        if summary.get(field) is None:
+            gauge.clear()  # CSDL lỗi: bỏ mẫu thay vì báo giá trị cũ
+        else:
+            gauge.set(summary[field])
+
+metrics.add_collect_hook(update_summary_gauges)
+IMAGE_WRITE_QUEUE.set_function(lambda: image_writer.queue_depth)
+metrics.start_exporter("gate", Config.METRICS_DIR, Config.METRICS_FLUSH_INTERVAL)
+
+# --- LANE THREADS (camera grabber, RFID reader, worker per lane) ---
+print("🚀 [Main] Khởi động các làn xe và luồng xem camera trực tiếp...")
 thread_manager.start_live_view()
-live_view_thread = threading.Thread(target=live_view_capture_thread, args=(None,), daemon=True)
-live_view_thread.start()
+for lane in lanes:
+    lane.start()
 
-# --- VÒNG LẶP CHÍNH CỦA ỨNG DỤNG (ĐÃ ĐƯỢC TÁI CẤU TRÚC) ---
+# --- VÒNG LẶP CHÍNH: các làn tự xử lý, ở đây chỉ báo cáo số liệu ---
 print("✅ [Main] Hệ thống sẵn sàng. Bắt đầu vòng lặp chính...")
 try:
     while True:
-        print("\n💡 [Main] Vui lòng đưa thẻ vào đầu đọc...")
-        rfid_id, rfid_text = reader.read()
-
-        print(f"💳 [Main] Phát hiện thẻ! ID: {rfid_id}.")
-        
-        # Use improved processing function with thread safety
-        _process_vehicle_event(rfid_id, None)  # camera_manager is global now
-        
-        time.sleep(1) # Nghỉ một chút trước khi chờ lần quẹt thẻ tiếp theo
+        time.sleep(LANE_STATS_INTERVAL)
+        for lane in lanes:
+            print(f"📊 [Lane {lane.lane_id}] {lane.stats()}")
+        ai_stats = inference_scheduler.get_stats()
+        recognized = sum(lane.metrics.plates_recognized for lane in lanes)
+        if ai_stats['total_inference_time']:
+            ai_stats['plates_per_inference_second'] = round(recognized / ai_stats['total_inference_time'], 2)
+        print(f"📊 [AI] {ai_stats}")
+        print(f"📊 [FS] {image_writer.get_stats()}")
 
 except KeyboardInterrupt:
     print("\n🛑 [Main] Phát hiện ngắt từ bàn phím. Đang tắt chương trình...")
@@ -498,10 +648,15 @@ except Exception as e_main_loop:
 finally:
     print("🧹 [Main] Dọn dẹp tài nguyên...")
     thread_manager.stop_live_view()
-    if 'live_view_thread' in locals() and live_view_thread.is_alive():
-        live_view_thread.join(timeout=1)
-    if 'camera_manager' in locals():
-        camera_manager.release()
+    thread_manager.shutdown()
+    for lane in lanes:
+        lane.release()
+    if inference_scheduler:
+        inference_scheduler.stop()
+    image_writer.stop()  # Flush queued event images before exit
+    metrics.stop_exporter()
+    connectivity_monitor.stop()
+    change_notifier.close()
     if 'network_manager' in locals():
         network_manager.close()
     if 'db_manager' in locals():
@@ -1,24 +1,195 @@
-from flask import Flask, render_template, send_from_directory, request, redirect, url_for
+from flask import Flask, Response, render_template, send_file, request, redirect, url_for, jsonify, g, make_response
+from werkzeug.security import safe_join
+from urllib.parse import quote
 import os
+import glob
+import base64
+import hashlib
+import json
+import time
+from functools import wraps
 from datetime import datetime, date, timedelta
 import sqlite3
-from filelock import FileLock, Timeout
 
 # Import từ module gộp mới
 from core_utils import (
-    STATUS_INSIDE, STATUS_COMPLETED, STATUS_INVALID,
-    get_vietnam_time_str, SafeDatabaseManager, SafeErrorLogger, Config
+    get_vietnam_time_str, SafeDatabaseManager, SafeErrorLogger, ChangeNotifier, TRACE_STAGES, Config
 )
+from camera import read_camera_health, camera_health_path
+from frame_bus import FrameBus, FrameBusSource, mjpeg_stream
+from history_export import EXPORT_COLUMNS, parse_time_bound, HistoryExporter
+from http_cache import compress_body, FileDigestCache, HttpCacheStats, QueryResultCache
+from lanes import load_lane_configs
+from live_dashboard import EventBroadcaster, sse_stream, DashboardFeed
+from metrics import metrics, read_metric_snapshots, render_prometheus
+from thumbnails import ThumbnailService
 
 # Initialize services
-db_manager = SafeDatabaseManager(Config.DB_FILE)
+# Writes from the web UI (force_out) wake the sync thread in LPR.py and the
+# live dashboard of every web app process immediately
+db_manager = SafeDatabaseManager(Config.DB_FILE, notifier=ChangeNotifier(fanout_dir=Config.DASHBOARD_NOTIFY_DIR))
 error_logger = SafeErrorLogger("app_error.log")
 app = Flask(__name__)
 
+# Camera frames come from LPR.py over shared memory (one frame bus per lane);
+# each size/quality variant is encoded once per frame into a latest-frame
+# buffer shared by every live view client of that lane and variant
+lanes = load_lane_configs()
+live_views = {lane.lane_id: FrameBusSource(FrameBus(lane.frame_bus_name)) for lane in lanes}
+
+
+def get_live_view(lane_id=None, variant=None):
+    """(source, variant) for a lane (first by default); None if lane or variant is unknown."""
+    source = live_views.get(lane_id or lanes[0].lane_id)
+    variant = variant or Config.LIVE_VIEW_DEFAULT_VARIANT
+    if source is None or variant not in source.variants:
+        return None
+    return source, variant
+
+# Live dashboard: one feed per process queries only what changed and pushes
+# it to every /events client
+dashboard_feed = DashboardFeed(db_manager, EventBroadcaster(), poll_interval=Config.DASHBOARD_POLL_INTERVAL,
+                               notify_dir=Config.DASHBOARD_NOTIFY_DIR)
+
 # Ensure directories exist
 os.makedirs(Config.PICTURE_OUTPUT_DIR, exist_ok=True)
 os.makedirs(Config.TMP_DIR, exist_ok=True)
 
+# Event images are shown as small thumbnails on the dashboard pages
+thumbnails = ThumbnailService(
+    Config.PICTURE_OUTPUT_DIR,
+    Config.THUMBNAIL_DIR,
+    width=Config.THUMBNAIL_WIDTH,
+    quality=Config.THUMBNAIL_QUALITY,
+    max_bytes=Config.THUMBNAIL_CACHE_MAX_MB * 1024 * 1024
+)
+
+# HTTP caching: pages carry a weak ETag built from the DB's data_version (and
+# the app/template build), so an unchanged page is answered with 304 without
+# querying or rendering; images get content-hash ETags; text is compressed
+_build_files = [os.path.abspath(__file__)] + sorted(glob.glob(os.path.join(app.root_path, 'templates', '*.html')))
+APP_BUILD = hashlib.sha1("".join(f"{path}:{os.path.getmtime(path)}" for path in _build_files).encode()).hexdigest()[:12]
+COMPRESSIBLE_MIMETYPES = ('text/html', 'text/plain', 'text/css', 'text/csv', 'application/json',
+                          'application/javascript', 'image/svg+xml')
+http_cache_stats = HttpCacheStats()
+image_digests = FileDigestCache()
+# Query results of the busiest pages, reused until the data changes; views
+# that miss the ETag (other browsers, integrations) cost a dict lookup
+result_cache = QueryResultCache(db_manager.get_data_version, max_entries=Config.RESULT_CACHE_SIZE)
+
+# Under gunicorn behind nginx/Apache the proxy sends picture and thumbnail
+# bodies (X-Accel-Redirect / X-Sendfile); the app only checks the file and
+# sets the caching headers, so no worker thread is tied up streaming bytes
+app.config['USE_X_SENDFILE'] = Config.SENDFILE_MODE in ('x-sendfile', 'x-accel-redirect')
+
+# Request metrics of this process; /metrics adds those of the gate process
+# and the other workers (snapshots in Config.METRICS_DIR)
+WEB_REQUEST_SECONDS = metrics.histogram(
+    'parking_web_request_seconds', 'Web request time until the response starts (streamed bodies not included)', ('endpoint',))
+WEB_REQUESTS = metrics.counter('parking_web_requests_total', 'Web requests by status code', ('endpoint', 'status'))
+
+
+def send_picture(path, root, internal_dir, **kwargs):
+    """
+    send_file() for files under `root`, handed to the front proxy when
+    Config.SENDFILE_MODE is set. For nginx the file is addressed as
+    <ACCEL_REDIRECT_PREFIX>/<internal_dir>/<path relative to root>.
+    """
+    if app.config['USE_X_SENDFILE']:
+        # The proxy applies Range itself to the file it sends
+        request.environ.pop('HTTP_RANGE', None)
+    response = send_file(path, conditional=True, **kwargs)
+    if 'X-Sendfile' in response.headers:
+        # The body comes from the proxy, which sets its own Content-Length
+        response.content_length = 0
+        if Config.SENDFILE_MODE == 'x-accel-redirect':
+            del response.headers['X-Sendfile']
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            response.headers['X-Accel-Redirect'] = f"{Config.ACCEL_REDIRECT_PREFIX}/{internal_dir}/{quote(relative)}"
+    return response
+
+
+def conditional_page(uses_db=True, extra=None, vary=None):
+    """
+    Weak-ETag revalidation for a page: ETag = build + data_version (+ extra()).
+    If-None-Match with the current tag gets 304 before the view runs. Pages
+    that set g.page_error (DB busy etc.) are not tagged. A page whose body
+    depends on a request header names it in vary (and puts the value it
+    picked in extra), so caches keep one copy per variant.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            parts = [APP_BUILD]
+            if uses_db:
+                version = db_manager.get_data_version()
+                if version is None:
+                    response = make_response(view(*args, **kwargs))
+                    if vary:
+                        response.vary.add(vary)
+                    return response
+                parts.append(str(version))
+            if extra:
+                parts.append(str(extra()))
+            tag = "-".join(parts)
+
+            if request.if_none_match.contains_weak(tag):
+                http_cache_stats.record_not_modified(request.endpoint)
+                response = Response(status=304)
+                response.set_etag(tag, weak=True)
+                response.headers['Cache-Control'] = 'no-cache'
+                if vary:
+                    response.vary.add(vary)
+                return response
+
+            started = time.perf_counter()
+            response = make_response(view(*args, **kwargs))
+            if vary:
+                response.vary.add(vary)
+            if response.status_code == 200 and not g.get('page_error'):
+                response.set_etag(tag, weak=True)
+                response.headers['Cache-Control'] = 'no-cache'
+                http_cache_stats.record_full(request.endpoint, response.calculate_content_length() or 0,
+                                             time.perf_counter() - started)
+            return response
+        return wrapper
+    return decorator
+
+
+@app.before_request
+def start_request_timer():
+    # Started here rather than at import: with gunicorn's preload the
+    # exporter thread must belong to the worker, not the master
+    metrics.start_exporter(f"web-{os.getpid()}", Config.METRICS_DIR, Config.METRICS_FLUSH_INTERVAL)
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Registered before compression, so it runs after it and includes it."""
+    endpoint = request.endpoint or 'unknown'
+    if 'request_started' in g:
+        WEB_REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint=endpoint)
+    WEB_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+
+@app.after_request
+def compress_text_response(response):
+    """gzip (or brotli, if installed) for text responses the client accepts."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    data = response.get_data()
+    body, encoding = compress_body(data, request.headers.get('Accept-Encoding', ''))
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        http_cache_stats.record_compression(len(data), len(body))
+    return response
+
+
 def get_db_connection():
     """Get database connection with row factory."""
     conn = sqlite3.connect(Config.DB_FILE, timeout=5.0)
@@ -30,71 +201,46 @@ def handle_db_error(operation, error):
     error_logger.log_error(f"Error in {operation}: {error}", "WEB_APP", error)
     return "Lỗi cơ sở dữ liệu. Vui lòng thử lại sau."
 
-def create_event(row, event_type, time_field):
-    """Helper function to create event object."""
-    time_str = row[time_field]
-    dt_obj = datetime.strptime(time_str, "%Y-%m-%d %H:%M:%S")
-    image_path = row['image_path_out'] if event_type == "OUT" else row['image_path_in']
-    
+def create_event(event):
+    """Template event for /log from a query_log_events row."""
+    dt_obj = datetime.strptime(event['event_time'], "%Y-%m-%d %H:%M:%S")
     return {
         'dt': dt_obj,
         'time_str': dt_obj.strftime('%d-%m-%Y %H:%M:%S'),
-        'plate': row['plate'],
-        'type': event_type,
-        'raw': image_path,
+        'plate': event['plate'],
+        'type': event['type'],
+        'raw': event['image'],
         'crop': None,
-        'db_id': row['id']
+        'db_id': event['db_id']
     }
 
 @app.route('/log')
+@conditional_page()
 def index():
     """Trang lịch sử với sự kiện IN/OUT riêng biệt."""
-    page = request.args.get('page', 1, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
     per_page = 10
     search_query = request.args.get('search', '').strip()
     
     events = []
+    total_pages = 1
     error_message = None
 
+    def load_page():
+        # Chỉ đọc đúng trang cần hiển thị (truy vấn theo chỉ mục time_in/time_out)
+        plate = search_query or None
+        total_events = db_manager.count_log_events(plate)
+        rows = db_manager.query_log_events(plate=plate, limit=per_page, offset=(page - 1) * per_page)
+        return [create_event(row) for row in rows], (total_events + per_page - 1) // per_page
+
     try:
-        with FileLock(Config.DB_FILE + ".lock", timeout=5.0):
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Build query
-                query = "SELECT * FROM parking_log"
-                params = []
-                if search_query:
-                    query += " WHERE plate LIKE ?"
-                    params.append(f"%{search_query}%")
-                query += " ORDER BY id DESC"
-                
-                rows = cursor.execute(query, params).fetchall()
-                
-                # Process records into events
-                all_events = []
-                for row in rows:
-                    if row['time_out'] and row['status'] == STATUS_COMPLETED:
-                        # Add both OUT and IN events for completed trips
-                        all_events.append(create_event(row, "OUT", 'time_out'))
-                        all_events.append(create_event(row, "IN", 'time_in'))
-                    else:
-                        # Add single event for ongoing or invalid entries
-                        event_type = "INVALID" if row['status'] == STATUS_INVALID else "IN"
-                        all_events.append(create_event(row, event_type, 'time_in'))
-                
-                # Sort and paginate
-                all_events.sort(key=lambda x: x['dt'], reverse=True)
-                total_events = len(all_events)
-                total_pages = (total_events + per_page - 1) // per_page
-                
-                start_idx = (page - 1) * per_page
-                events = all_events[start_idx:start_idx + per_page]
-
-    except Timeout:
-        error_message = "Không thể truy cập cơ sở dữ liệu do đang bị khóa. Vui lòng thử lại sau."
+        if page <= Config.RESULT_CACHE_LOG_PAGES:
+            events, total_pages = result_cache.get_or_compute(('log', search_query, page), load_page)
+        else:
+            events, total_pages = load_page()
     except sqlite3.Error as e:
         error_message = handle_db_error("log page", e)
+    g.page_error = error_message
 
     return render_template('index.html', 
                          events=events,
@@ -116,15 +262,18 @@ def get_vehicles_inside_from_db() -> list:
 
 
 @app.route('/vehicles_in_lot')
+@conditional_page()
 def vehicles_in_lot():
     search_query = request.args.get('search', '').strip()
     vehicles = []
     error_message = None
     try:
-        vehicles = db_manager.get_vehicles_inside(search_query if search_query else None)
+        vehicles = result_cache.get_or_compute(('vehicles_inside', search_query),
+                                               lambda: db_manager.get_vehicles_inside(search_query or None))
     except Exception as e:
         error_message = "Không thể tải danh sách xe do lỗi cơ sở dữ liệu. Vui lòng thử lại."
         error_logger.log_error(f"Error in vehicles_in_lot: {e}", "WEB_APP", e)
+    g.page_error = error_message
 
     return render_template('vehicles_in_lot.html', vehicles=vehicles, count=len(vehicles), search_query=search_query, error_message=error_message)
 
@@ -155,29 +304,79 @@ def force_out(db_id):
 
 
 @app.route('/')
+@conditional_page(uses_db=False)
 def cameras():
     """Trang xem camera trực tiếp."""
-    return render_template('cameras.html')
+    return render_template('cameras.html', lanes=lanes, variants=Config.LIVE_VIEW_VARIANTS)
 
 
 @app.route('/video_feed')
 def video_feed():
-    """Endpoint để cung cấp hình ảnh camera trực tiếp."""
-    response = send_from_directory(Config.TMP_DIR, 'live_view.jpg')
+    """Endpoint để cung cấp một ảnh camera trực tiếp (?lane=<lane_id>&variant=thumb|medium|full)."""
+    live_view = get_live_view(request.args.get('lane'), request.args.get('variant'))
+    if live_view is None:
+        return "Không tìm thấy làn xe hoặc chất lượng hình ảnh.", 404
+    source, variant = live_view
+    jpeg_bytes = source.snapshot(variant)
+    if jpeg_bytes is None:
+        return "Camera chưa sẵn sàng.", 503
+    response = Response(jpeg_bytes, mimetype='image/jpeg')
     response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '0'
     return response
 
 
-@app.route('/statistics')
-def statistics():
-    """
-    Trang thống kê, giờ đây truy vấn trực tiếp từ CSDL.
-    """
-    period = request.args.get('period', 'daily')
+@app.route('/video_stream')
+def video_stream():
+    """MJPEG stream (multipart/x-mixed-replace) của camera trực tiếp (?lane=<lane_id>&variant=...)."""
+    live_view = get_live_view(request.args.get('lane'), request.args.get('variant'))
+    if live_view is None:
+        return "Không tìm thấy làn xe hoặc chất lượng hình ảnh.", 404
+    source, variant = live_view
+    source.start()
+    response = Response(mjpeg_stream(source.broadcaster(variant), Config.LIVE_VIEW_MAX_FPS),
+                        mimetype='multipart/x-mixed-replace; boundary=frame')
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    return response
+
+
+@app.route('/camera_health')
+def camera_health():
+    """Trạng thái camera của từng làn (do CameraSupervisor trong LPR.py ghi ra)."""
+    return jsonify({lane.lane_id: read_camera_health(camera_health_path(lane.lane_id)) for lane in lanes})
+
+
+@app.route('/events')
+def events():
+    """Luồng server-sent events: sự kiện ra/vào mới, số xe trong bãi, trạng thái đồng bộ."""
+    dashboard_feed.start()
+    initial = [("summary", dashboard_feed.summary)] if dashboard_feed.summary else []
+    stream = sse_stream(dashboard_feed.broadcaster, request.headers.get('Last-Event-ID'), initial)
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: do not buffer the stream
+    return response
+
+
+@app.route('/cache_stats')
+def cache_stats():
+    """Số liệu cache HTTP (304, nén), cache kết quả truy vấn và cache ảnh thu nhỏ."""
+    return jsonify({'http': http_cache_stats.as_dict(), 'results': result_cache.get_stats(),
+                    'thumbnails': thumbnails.get_stats()})
+
+
+@app.route('/metrics')
+def metrics_page():
+    """Số liệu dạng Prometheus của cả hệ thống: tiến trình cổng (LPR.py) và các worker web."""
+    snapshots = [metrics.snapshot(f"web-{os.getpid()}")] + read_metric_snapshots(
+        Config.METRICS_DIR, Config.METRICS_STALE_AFTER, exclude_pid=os.getpid())
+    return Response(render_prometheus(snapshots), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def statistics_period(period):
+    """(start 'YYYY-MM-DD HH:MM:SS', title) of the daily/weekly/monthly statistics period."""
     today = date.today()
-    
     if period == 'weekly':
         start_of_period = today - timedelta(days=today.weekday())
         period_title = "tuần này"
@@ -187,48 +386,322 @@ def statistics():
     else: # daily
         start_of_period = today
         period_title = "hôm nay"
+    return datetime.combine(start_of_period, datetime.min.time()).strftime("%Y-%m-%d %H:%M:%S"), period_title
 
-    start_dt_str = datetime.combine(start_of_period, datetime.min.time()).strftime("%Y-%m-%d %H:%M:%S")
 
-    stats = { 'total_in': 0, 'total_out': 0, 'total_fail': 0 } # Giữ total_fail để không lỗi template
+@app.route('/statistics')
+@conditional_page(extra=lambda: date.today().isoformat())
+def statistics():
+    """
+    Trang thống kê, dùng chung truy vấn với API thống kê.
+    """
+    period = request.args.get('period', 'daily')
+    start_dt_str, period_title = statistics_period(period)
+
+    # Cùng nguồn số liệu với /api/v1/statistics (db_manager.get_statistics)
+    stats = result_cache.get_or_compute(('api_statistics', start_dt_str, None),
+                                        lambda: db_manager.get_statistics(start_dt_str))
     error_message = None
+    if stats is None:
+        stats = { 'total_in': 0, 'total_out': 0, 'total_fail': 0 }
+        error_message = "Không thể tải thống kê do cơ sở dữ liệu đang bận. Vui lòng thử lại."
+        print("🔥 [DB_ERROR] Lỗi khi lấy dữ liệu thống kê.")
+    g.page_error = error_message
+
+
+    return render_template('statistics.html', stats=stats, period=period, period_title=period_title, error_message=error_message)
+
+# Các bước xử lý một lần quẹt thẻ (TRACE_STAGES) trên trang /traces
+TRACE_STAGE_TITLES = {
+    'capture': 'Chọn khung hình',
+    'queue': 'Chờ trong hàng đợi',
+    'detect': 'Phát hiện biển số',
+    'crop': 'Cắt biển số',
+    'ocr': 'Đọc ký tự (OCR)',
+    'normalize': 'Chuẩn hóa biển số',
+    'lookup': 'Tra cứu CSDL',
+    'image': 'Lưu ảnh',
+    'commit': 'Ghi CSDL',
+    'other': 'Khác (chờ khóa xử lý...)',
+}
+
+
+@app.route('/traces')
+@conditional_page(extra=lambda: date.today().isoformat())
+def traces():
+    """
+    Thời gian từng bước của các lần quẹt thẻ: p50/p95/p99 theo bước và
+    danh sách các lượt chậm nhất kèm phân bổ thời gian.
+    """
+    period = request.args.get('period', 'daily')
+    start_dt_str, period_title = statistics_period(period)
+    summary, slow_events, error_message = None, [], None
 
     try:
-        with FileLock(Config.DB_FILE + ".lock", timeout=5.0):
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Đếm tổng lượt vào trong kỳ
-                cursor.execute(
-                    "SELECT COUNT(id) FROM parking_log WHERE time_in >= ?", (start_dt_str,)
-                )
-                stats['total_in'] = cursor.fetchone()[0]
-
-                # Đếm tổng lượt ra trong kỳ
-                cursor.execute(
-                    "SELECT COUNT(id) FROM parking_log WHERE status = ? AND time_out >= ?", (STATUS_COMPLETED, start_dt_str)
-                )
-                stats['total_out'] = cursor.fetchone()[0]
-                
-                # Lưu ý: Không thể đếm 'total_fail' vì nó không được lưu trong CSDL.
-                # Để giá trị là 0.
-
-    except Timeout:
-        error_message = "Không thể tải thống kê do cơ sở dữ liệu đang bận. Vui lòng thử lại."
-        print("🔥 [DB_LOCK] Timeout khi lấy dữ liệu thống kê.")
+        summary = result_cache.get_or_compute(
+            ('trace_percentiles', start_dt_str),
+            lambda: db_manager.get_trace_percentiles(start_dt_str, limit=Config.TRACE_STATS_MAX_EVENTS))
+        slow_events = result_cache.get_or_compute(
+            ('slow_traces', start_dt_str),
+            lambda: db_manager.get_slow_traces(start_dt_str, limit=Config.TRACE_SLOW_EVENTS))
     except sqlite3.Error as e:
+        print(f"🔥 [DB_ERROR] Lỗi ở trang thời gian xử lý: {e}")
+    if summary is None:
         error_message = "Lỗi truy vấn cơ sở dữ liệu."
-        print(f"🔥 [DB_ERROR] Lỗi ở trang thống kê: {e}")
+    g.page_error = error_message
 
+    return render_template('traces.html', summary=summary, slow_events=slow_events, period=period,
+                           period_title=period_title, stages=TRACE_STAGES, stage_titles=TRACE_STAGE_TITLES,
+                           error_message=error_message)
 
-    return render_template('statistics.html', stats=stats, period=period, period_title=period_title, error_message=error_message)
 
 @app.route('/image/<filename>')
 def get_image(filename):
-    return send_from_directory(Config.PICTURE_OUTPUT_DIR, filename)
+    """Ảnh sự kiện gốc; không bao giờ thay đổi nên dùng ETag theo nội dung và cache lâu dài."""
+    path = safe_join(Config.PICTURE_OUTPUT_DIR, filename)
+    digest = image_digests.digest(path) if path else None
+    if digest is None:
+        return "Không tìm thấy ảnh.", 404
+    response = send_picture(path, Config.PICTURE_OUTPUT_DIR, 'picture', etag=digest)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    if response.status_code == 304:
+        http_cache_stats.record_not_modified(request.endpoint)
+    else:
+        http_cache_stats.record_full(request.endpoint, os.path.getsize(path), 0.0)
+    return response
+
+
+@app.route('/thumb/<filename>')
+def get_thumbnail(filename):
+    """
+    Ảnh thu nhỏ của ảnh sự kiện (WebP nếu trình duyệt hỗ trợ, ngược lại JPEG).
+    Tên file ảnh sự kiện là duy nhất và không bao giờ bị ghi đè, nên có thể
+    cache vĩnh viễn (immutable).
+    """
+    fmt = "webp" if "image/webp" in request.headers.get("Accept", "") else "jpeg"
+    thumbnail = thumbnails.get(filename, fmt)
+    if thumbnail is None:
+        return "Không tìm thấy ảnh.", 404
+    path, mimetype, etag = thumbnail
+    response = send_picture(path, Config.THUMBNAIL_DIR, 'thumbnails', mimetype=mimetype, etag=etag)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.vary.add('Accept')
+    if response.status_code == 304:
+        http_cache_stats.record_not_modified(request.endpoint)
+    else:
+        http_cache_stats.record_full(request.endpoint, os.path.getsize(path), 0.0)
+    return response
+
+# === JSON API (v1) ===
+# For integrations: same data as the pages, as JSON. Lists use keyset
+# pagination (?cursor= from the previous page's next_cursor), ?fields= to pick
+# fields, ?from=/?to= (YYYY-MM-DD or YYYY-MM-DD HH:MM:SS, Vietnam time; a date
+# in ?to= includes that day) and ?format=ndjson (or Accept:
+# application/x-ndjson) to stream every match one JSON object per line.
+
+API_DEFAULT_LIMIT = 50
+API_MAX_LIMIT = 500
+API_EVENT_FIELDS = EXPORT_COLUMNS['events']
+API_RECORD_FIELDS = EXPORT_COLUMNS['records']
+API_VEHICLE_FIELDS = ('db_id', 'plate', 'time_in', 'gate', 'image')
+
+
+class ApiError(Exception):
+    """Bad API request; answered as {"error": message} with the given status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+@app.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({'error': str(error)}), error.status
+
+
+def api_fields(allowed):
+    """Fields picked with ?fields=a,b (all allowed fields by default)."""
+    requested = request.args.get('fields')
+    if not requested:
+        return allowed
+    fields = tuple(field.strip() for field in requested.split(',') if field.strip())
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(allowed)}")
+    return fields
+
+
+def api_time(name, is_end=False):
+    """?from=/?to= as a DB time string; a bare date in ?to= means up to the end of that day."""
+    try:
+        return parse_time_bound(request.args.get(name), is_end)
+    except ValueError:
+        raise ApiError(f"Invalid {name}: use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS")
+
+
+def encode_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(is_valid):
+    token = request.args.get('cursor')
+    if not token:
+        return None
+    try:
+        value = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        value = None
+    if value is None or not is_valid(value):
+        raise ApiError("Invalid cursor")
+    return value
+
+
+def api_list_format():
+    """'ndjson' for ?format=ndjson or Accept: application/x-ndjson, else 'json'."""
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best_match(
+            ['application/json', 'application/x-ndjson']) == 'application/x-ndjson':
+        return 'ndjson'
+    return 'json'
+
+
+def api_list(query_page, allowed_fields, is_valid_cursor, **filters):
+    """A page of query_page() results, or all of them as NDJSON, projected to ?fields=."""
+    fields = api_fields(allowed_fields)
+    after = decode_cursor(is_valid_cursor)
+
+    if api_list_format() == 'ndjson':
+        def generate():
+            try:
+                for row in SafeDatabaseManager.iter_pages(query_page, after=after, **filters):
+                    yield json.dumps({field: row[field] for field in fields}, ensure_ascii=False) + "\n"
+            except sqlite3.Error as e:
+                error_logger.log_error(f"Error in NDJSON export: {e}", "WEB_API", e)
+                yield json.dumps({'error': "database error, export incomplete"}) + "\n"
+        return Response(generate(), mimetype='application/x-ndjson')
+
+    limit = min(max(request.args.get('limit', API_DEFAULT_LIMIT, type=int), 1), API_MAX_LIMIT)
+    try:
+        rows = query_page(after=after, limit=limit + 1, **filters)
+    except sqlite3.Error as e:
+        error_logger.log_error(f"Error in API {request.endpoint}: {e}", "WEB_API", e)
+        raise ApiError("Database error, try again later", 503)
+    next_cursor = encode_cursor(rows[limit - 1]['cursor']) if len(rows) > limit else None
+    return jsonify({
+        'data': [{field: row[field] for field in fields} for row in rows[:limit]],
+        'next_cursor': next_cursor,
+        'limit': limit,
+    })
+
+
+def is_event_cursor(value):
+    return (isinstance(value, list) and len(value) == 3 and isinstance(value[0], str)
+            and isinstance(value[1], int) and value[2] in (0, 1))
+
+
+def is_record_cursor(value):
+    return isinstance(value, int)
+
+
+@app.route('/api/v1/events')
+@conditional_page(extra=api_list_format, vary='Accept')
+def api_events():
+    """Sự kiện vào/ra (như trang /log), mới nhất trước."""
+    return api_list(db_manager.query_log_events, API_EVENT_FIELDS, is_event_cursor,
+                    start=api_time('from'), end=api_time('to', is_end=True),
+                    plate=request.args.get('plate', '').strip() or None)
+
+
+@app.route('/api/v1/records')
+@conditional_page(extra=api_list_format, vary='Accept')
+def api_records():
+    """Bản ghi parking_log (mỗi lượt gửi xe một bản ghi), mới nhất trước; lọc theo time_in."""
+    status = request.args.get('status', type=int)
+    return api_list(db_manager.query_records, API_RECORD_FIELDS, is_record_cursor,
+                    start=api_time('from'), end=api_time('to', is_end=True),
+                    plate=request.args.get('plate', '').strip() or None, status=status)
+
+
+@app.route('/api/v1/search')
+@conditional_page(extra=api_list_format, vary='Accept')
+def api_search():
+    """Tìm biển số (?q=, một phần biển số) trong toàn bộ lịch sử gửi xe."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        raise ApiError("Missing q")
+    return api_list(db_manager.query_records, API_RECORD_FIELDS, is_record_cursor,
+                    start=api_time('from'), end=api_time('to', is_end=True), plate=query)
+
+
+@app.route('/api/v1/occupancy')
+@conditional_page()
+def api_occupancy():
+    """Số xe và danh sách xe đang trong bãi (?plate= để lọc)."""
+    fields = api_fields(API_VEHICLE_FIELDS)
+    plate = request.args.get('plate', '').strip()
+    try:
+        vehicles = result_cache.get_or_compute(('vehicles_inside', plate),
+                                               lambda: db_manager.get_vehicles_inside(plate or None))
+    except Exception as e:
+        error_logger.log_error(f"Error in API occupancy: {e}", "WEB_API", e)
+        raise ApiError("Database error, try again later", 503)
+    rows = [{'db_id': v['db_id'], 'plate': v['plate'], 'time_in': v['dt'].strftime("%Y-%m-%d %H:%M:%S"),
+             'gate': v['gate'], 'image': v['raw']} for v in vehicles]
+    return jsonify({'occupancy': len(rows), 'data': [{field: row[field] for field in fields} for row in rows]})
+
+
+@app.route('/api/v1/statistics')
+@conditional_page(extra=lambda: date.today().isoformat())
+def api_statistics():
+    """Lượt vào/ra/lỗi theo kỳ (?period=daily|weekly|monthly) hoặc khoảng ?from=&to=."""
+    start, end = api_time('from'), api_time('to', is_end=True)
+    period = None
+    if not start:
+        period = request.args.get('period', 'daily')
+        if period not in ('daily', 'weekly', 'monthly'):
+            raise ApiError("Invalid period: use daily, weekly or monthly")
+        start, _ = statistics_period(period)
+    stats = result_cache.get_or_compute(('api_statistics', start, end), lambda: db_manager.get_statistics(start, end))
+    if stats is None:
+        raise ApiError("Database error, try again later", 503)
+    return jsonify({'period': period, 'from': start, 'to': end, **stats})
+
+
+@app.route('/api/v1/export')
+def api_export():
+    """
+    Tải lịch sử gửi xe (?kind=events|records, ?format=csv|parquet, ?from=&to=,
+    ?gzip=1, ?excel=1 cho CSV mở bằng Excel). Dữ liệu được đọc và gửi dần
+    từng đợt, không nạp toàn bộ vào bộ nhớ.
+    """
+    try:
+        exporter = HistoryExporter(
+            db_manager,
+            kind=request.args.get('kind', 'events'),
+            fmt=request.args.get('format', 'csv'),
+            start=api_time('from'),
+            end=api_time('to', is_end=True),
+            compress=request.args.get('gzip') in ('1', 'true'),
+            excel=request.args.get('excel') in ('1', 'true'),
+        )
+    except ValueError as e:
+        raise ApiError(str(e))
+
+    def generate():
+        try:
+            yield from exporter.chunks()
+        except sqlite3.Error as e:
+            # Headers are already sent: log it, the client gets a truncated file
+            error_logger.log_error(f"Error in history export: {e}", "WEB_API", e)
+
+    response = Response(generate(), mimetype=exporter.mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{exporter.filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 
 if __name__ == '__main__':
     print("✅ Flask Web Interface - Parking Management System")
     print(f"🌐 Listening on {Config.FLASK_HOST}:{Config.FLASK_PORT}")
+    print("⚠️  Development server; in production use: gunicorn -c gunicorn.conf.py app:app")
     
     app.run(host=Config.FLASK_HOST, port=Config.FLASK_PORT, debug=Config.FLASK_DEBUG)
\ No newline at end of file
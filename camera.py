@@ -0,0 +1,998 @@
+# -*- coding: utf-8 -*-
+"""
+Camera input of the gate: frame quality scoring, capture backends (OpenCV,
+GStreamer, V4L2 MJPEG, RTSP, file replay), the grabbing SafeCameraManager
+and the CameraSupervisor watchdog.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+import cv2
+import numpy as np
+
+from core_utils import (
+    CAMERA_STATE_STARTING, CAMERA_STATE_OK, CAMERA_STATE_STALLED, CAMERA_STATE_RECOVERING,
+    CAMERA_STATE_DOWN, sanitize_filename_component, SafeErrorLogger, get_image_codec,
+    write_file_atomic, ThreadSafeManager, Config
+)
+from frame_bus import FrameBus
+from metrics import metrics
+
+
+# Metrics updated by the camera classes
+CAMERA_FRAMES = metrics.counter('parking_camera_frames_total', 'Frames read from the camera', ('camera',))
+CAMERA_FRAMES_DROPPED = metrics.counter(
+    'parking_camera_frames_dropped_total', 'Frames missed by the grabber (estimated from gaps)', ('camera',))
+CAMERA_READ_FAILURES = metrics.counter(
+    'parking_camera_read_failures_total', 'Failed camera reads', ('camera',))
+CAMERA_REOPENS = metrics.counter('parking_camera_reopens_total', 'Camera device reopens', ('camera',))
+CAMERA_FPS = metrics.gauge('parking_camera_fps', 'Frames per second delivered by the camera', ('camera',))
+CAMERA_UP = metrics.gauge('parking_camera_up', '1 while the camera watchdog reports the camera healthy',
+                          ('camera',))
+
+
+# === FRAME QUALITY ===
+class FrameQuality:
+    """
+    Cheap quality measures of one frame, computed on a small grayscale copy:
+
+    - sharpness: variance of the Laplacian (low = blurred / out of focus)
+    - clipped: share of pixels that are crushed black or blown white
+    - motion: mean absolute difference to the previous frame (0-255)
+
+    usable is False when the frame cannot produce a plate, so running the
+    detector on it would be wasted.
+    """
+
+    def __init__(self, sharpness: float, clipped: float, motion: Optional[float],
+                 usable: bool, reason: Optional[str] = None):
+        self.sharpness = sharpness
+        self.clipped = clipped
+        self.motion = motion
+        self.usable = usable
+        self.reason = reason
+
+    @property
+    def score(self) -> float:
+        """Higher is better; used to rank the frames around a swipe."""
+        score = self.sharpness * (1.0 - self.clipped)
+        if self.motion is not None:
+            score /= 1.0 + self.motion / 10.0
+        return score if self.usable else score * 1e-3
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'sharpness': round(self.sharpness, 1),
+            'clipped': round(self.clipped, 3),
+            'motion': round(self.motion, 2) if self.motion is not None else None,
+            'usable': self.usable,
+            'reason': self.reason,
+        }
+
+    def __repr__(self):
+        return f"FrameQuality({self.as_dict()})"
+
+
+def _quality_gray(frame: np.ndarray, width: int = 320) -> np.ndarray:
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if frame.shape[1] > width:
+        height = int(round(frame.shape[0] * width / frame.shape[1]))
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def score_frame_quality(frame: np.ndarray, previous: Optional[np.ndarray] = None,
+                        min_sharpness: Optional[float] = None, max_clipped: Optional[float] = None,
+                        max_motion: Optional[float] = None) -> FrameQuality:
+    """Score a BGR frame (about 1 ms at 320 px wide); thresholds default to Config."""
+    min_sharpness = Config.FRAME_MIN_SHARPNESS if min_sharpness is None else min_sharpness
+    max_clipped = Config.FRAME_MAX_CLIPPED if max_clipped is None else max_clipped
+    max_motion = Config.FRAME_MAX_MOTION if max_motion is None else max_motion
+
+    gray = _quality_gray(frame)
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    clipped = float((hist[:6].sum() + hist[250:].sum()) / gray.size)
+
+    motion = None
+    if previous is not None:
+        previous_gray = _quality_gray(previous)
+        if previous_gray.shape == gray.shape:
+            motion = float(cv2.absdiff(gray, previous_gray).mean())
+
+    reason = None
+    if clipped > max_clipped:
+        reason = "exposure"
+    elif sharpness < min_sharpness:
+        reason = "blur"
+    elif motion is not None and motion > max_motion:
+        reason = "motion"
+    return FrameQuality(sharpness, clipped, motion, reason is None, reason)
+
+
+def select_best_frame(frames: List[np.ndarray],
+                      previous: Optional[np.ndarray] = None) -> Tuple[Optional[int], Optional[FrameQuality]]:
+    """
+    Score consecutive frames (each against the one before it) and return
+    (index, quality) of the best one, or (None, None) for an empty list.
+    """
+    best_index, best_quality = None, None
+    for index, frame in enumerate(frames):
+        quality = score_frame_quality(frame, previous)
+        if best_quality is None or quality.score > best_quality.score:
+            best_index, best_quality = index, quality
+        previous = frame
+    return best_index, best_quality
+
+
+# === CAPTURE BACKENDS ===
+class CaptureBackend:
+    """
+    Frame source used by SafeCameraManager.
+
+    Subclasses open a device/stream/file and return BGR frames from read().
+    Settings are plain constructor arguments so each backend can be
+    configured independently (see create_capture_backend).
+    """
+
+    name = "base"
+
+    def __init__(self, width: int = 640, height: int = 480, fps: float = 15):
+        self.width = width
+        self.height = height
+        self.fps = fps
+
+    def open(self) -> bool:
+        raise NotImplementedError
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        raise NotImplementedError
+
+    def is_opened(self) -> bool:
+        raise NotImplementedError
+
+    def release(self):
+        raise NotImplementedError
+
+    @property
+    def frame_interval(self) -> float:
+        return 1.0 / self.fps if self.fps else 0.0
+
+    def describe(self) -> str:
+        return self.name
+
+
+class OpenCVCaptureBackend(CaptureBackend):
+    """cv2.VideoCapture on a device index with software decoding (the original behaviour)."""
+
+    name = "opencv"
+
+    def __init__(self, source: Any = 0, width: int = 640, height: int = 480, fps: float = 15,
+                 api_preference: int = cv2.CAP_ANY, buffer_size: int = 1):
+        super().__init__(width, height, fps)
+        self.source = int(source) if isinstance(source, str) and source.isdigit() else source
+        self.api_preference = api_preference
+        self.buffer_size = buffer_size
+        self._cap: Optional[cv2.VideoCapture] = None
+
+    def _configure(self):
+        self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        self._cap.set(cv2.CAP_PROP_FPS, self.fps)
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)  # Minimize buffer to get latest frame
+
+    def open(self) -> bool:
+        self._cap = cv2.VideoCapture(self.source, self.api_preference)
+        if not self._cap.isOpened():
+            return False
+        self._configure()
+        actual_fps = self._cap.get(cv2.CAP_PROP_FPS)
+        if actual_fps and actual_fps > 0:
+            self.fps = actual_fps
+        return True
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if self._cap is None:
+            return False, None
+        return self._cap.read()
+
+    def is_opened(self) -> bool:
+        return self._cap is not None and self._cap.isOpened()
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def describe(self) -> str:
+        return f"{self.name}:{self.source} ({self.width}x{self.height}@{self.fps:g})"
+
+
+class GStreamerCaptureBackend(OpenCVCaptureBackend):
+    """
+    GStreamer pipeline ending in appsink, e.g. with a hardware decoder:
+
+        v4l2src device=/dev/video0 ! image/jpeg,width=1280,height=720 ! v4l2jpegdec ! videoconvert ! appsink
+
+    Without a pipeline a plain v4l2src one is built from the settings.
+    Requires OpenCV built with GStreamer.
+    """
+
+    name = "gstreamer"
+
+    def __init__(self, pipeline: Optional[str] = None, device: str = "/dev/video0",
+                 width: int = 640, height: int = 480, fps: float = 15):
+        pipeline = pipeline or (
+            f"v4l2src device={device} ! video/x-raw,width={width},height={height},"
+            f"framerate={int(fps)}/1 ! videoconvert ! video/x-raw,format=BGR ! "
+            f"appsink drop=true max-buffers=1 sync=false"
+        )
+        super().__init__(pipeline, width, height, fps, api_preference=cv2.CAP_GSTREAMER)
+
+    def _configure(self):
+        pass  # Caps are part of the pipeline
+
+    def describe(self) -> str:
+        return f"{self.name}: {self.source}"
+
+
+class V4L2MJPEGCaptureBackend(OpenCVCaptureBackend):
+    """
+    V4L2 camera in MJPEG mode: the camera compresses, so higher resolutions
+    fit the USB bandwidth. OpenCV hands back the raw JPEG and frames are
+    decoded on demand in read(), optionally at reduced scale (2, 4 or 8).
+    The compressed bytes of the last frame stay available in last_jpeg.
+    """
+
+    name = "v4l2_mjpeg"
+
+    def __init__(self, device: Any = "/dev/video0", width: int = 1280, height: int = 720,
+                 fps: float = 15, decode_scale: int = 1):
+        super().__init__(device, width, height, fps, api_preference=cv2.CAP_V4L2)
+        if decode_scale not in (1, 2, 4, 8):
+            raise ValueError("decode_scale must be one of [1, 2, 4, 8]")
+        self.decode_scale = decode_scale
+        self.last_jpeg: Optional[bytes] = None
+
+    def _configure(self):
+        self._cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+        super()._configure()
+        self._cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)  # Keep the compressed buffer
+
+    def grab_jpeg(self) -> Optional[bytes]:
+        """Next frame as the camera's JPEG bytes, without decoding."""
+        if self._cap is None:
+            return None
+        ret, buf = self._cap.read()
+        if not ret or buf is None:
+            return None
+        self.last_jpeg = buf.tobytes()
+        return self.last_jpeg
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        jpeg_bytes = self.grab_jpeg()
+        if jpeg_bytes is None:
+            return False, None
+        frame = get_image_codec().decode(jpeg_bytes, self.decode_scale)
+        return frame is not None, frame
+
+
+class RTSPCaptureBackend(OpenCVCaptureBackend):
+    """
+    IP camera over RTSP (FFmpeg). A failed read drops the connection and it
+    is reopened with exponential backoff; reads fail fast meanwhile so the
+    grabber keeps running.
+    """
+
+    name = "rtsp"
+
+    def __init__(self, url: str, width: int = 640, height: int = 480, fps: float = 15,
+                 transport: str = "tcp", reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0,
+                 open_timeout_ms: int = 5000):
+        super().__init__(url, width, height, fps, api_preference=cv2.CAP_FFMPEG)
+        self.transport = transport
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.open_timeout_ms = open_timeout_ms
+        self.reconnects = 0
+        self._current_delay = reconnect_delay
+        self._next_attempt = 0.0
+
+    def open(self) -> bool:
+        os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", f"rtsp_transport;{self.transport}")
+        self._cap = cv2.VideoCapture(self.source, self.api_preference,
+                                     [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, self.open_timeout_ms])
+        if not self._cap.isOpened():
+            self._cap.release()
+            self._cap = None
+            return False
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+        self._current_delay = self.reconnect_delay
+        return True
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if self._cap is None:
+            if time.monotonic() < self._next_attempt:
+                time.sleep(min(self._next_attempt - time.monotonic(), 0.5))
+                return False, None
+            self.reconnects += 1
+            if not self.open():
+                self._next_attempt = time.monotonic() + self._current_delay
+                print(f"⚠️  [Camera] RTSP reconnect failed, next try in {self._current_delay:.1f}s")
+                self._current_delay = min(self._current_delay * 2, self.max_reconnect_delay)
+                return False, None
+            print(f"✅ [Camera] RTSP stream reconnected ({self.reconnects} reconnects)")
+
+        ret, frame = self._cap.read()
+        if not ret or frame is None:
+            self.release()
+            self._next_attempt = time.monotonic() + self._current_delay
+        return ret, frame
+
+    def is_opened(self) -> bool:
+        # A dropped stream is being reconnected, not closed
+        return True
+
+    def describe(self) -> str:
+        return f"{self.name}:{self.source.split('@')[-1]}"  # Don't print credentials
+
+
+class FileReplayBackend(CaptureBackend):
+    """
+    Replay a video file or a directory of images as if it were a camera, so
+    the pipeline can be tested and benchmarked without hardware. Frames are
+    paced to fps (0 = as fast as possible) and loop by default.
+    """
+
+    name = "file"
+    _IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+    def __init__(self, path: str, width: int = 0, height: int = 0, fps: float = 15, loop: bool = True):
+        super().__init__(width, height, fps)
+        self.path = path
+        self.loop = loop
+        self._cap: Optional[cv2.VideoCapture] = None
+        self._images: List[str] = []
+        self._index = 0
+        self._next_frame_at = 0.0
+        self._opened = False
+
+    def open(self) -> bool:
+        if os.path.isdir(self.path):
+            self._images = sorted(os.path.join(self.path, name) for name in os.listdir(self.path)
+                                  if name.lower().endswith(self._IMAGE_EXTENSIONS))
+            self._opened = bool(self._images)
+        else:
+            self._cap = cv2.VideoCapture(self.path)
+            self._opened = self._cap.isOpened()
+        self._index = 0
+        self._next_frame_at = time.monotonic()
+        return self._opened
+
+    def _next_frame(self) -> Optional[np.ndarray]:
+        if self._images:
+            if self._index >= len(self._images):
+                if not self.loop:
+                    return None
+                self._index = 0
+            frame = cv2.imread(self._images[self._index])
+            self._index += 1
+            return frame
+
+        ret, frame = self._cap.read()
+        if not ret and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._cap.read()
+        return frame if ret else None
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if not self._opened:
+            return False, None
+        if self.fps:
+            delay = self._next_frame_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_frame_at = max(self._next_frame_at + self.frame_interval, time.monotonic())
+
+        frame = self._next_frame()
+        if frame is None:
+            return False, None
+        if self.width and self.height and frame.shape[1::-1] != (self.width, self.height):
+            frame = cv2.resize(frame, (self.width, self.height))
+        return True, frame
+
+    def is_opened(self) -> bool:
+        return self._opened
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        self._opened = False
+
+    def describe(self) -> str:
+        return f"{self.name}:{self.path}"
+
+
+CAPTURE_BACKENDS = {
+    OpenCVCaptureBackend.name: OpenCVCaptureBackend,
+    GStreamerCaptureBackend.name: GStreamerCaptureBackend,
+    V4L2MJPEGCaptureBackend.name: V4L2MJPEGCaptureBackend,
+    RTSPCaptureBackend.name: RTSPCaptureBackend,
+    FileReplayBackend.name: FileReplayBackend,
+}
+
+# Which constructor argument CAMERA_SOURCE maps to for each backend
+_CAPTURE_SOURCE_ARGS = {
+    "opencv": "source", "gstreamer": "pipeline", "v4l2_mjpeg": "device", "rtsp": "url", "file": "path",
+}
+
+
+def create_capture_backend(name: str, source: Any = None, **settings) -> CaptureBackend:
+    """Build a capture backend by name; settings are that backend's constructor arguments."""
+    try:
+        backend_class = CAPTURE_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown camera backend '{name}' (choose from {', '.join(CAPTURE_BACKENDS)})")
+    if source not in (None, ""):
+        settings[_CAPTURE_SOURCE_ARGS[name]] = source
+    return backend_class(**settings)
+
+
+def capture_backend_from_config(source: Any = None, backend: Optional[str] = None,
+                                options: Optional[Dict[str, Any]] = None) -> CaptureBackend:
+    """Capture backend from CAMERA_* settings; arguments override them (used per lane)."""
+    settings = {"width": Config.CAMERA_WIDTH, "height": Config.CAMERA_HEIGHT, "fps": Config.CAMERA_FPS}
+    settings.update(Config.CAMERA_BACKEND_OPTIONS)
+    settings.update(options or {})
+    return create_capture_backend(backend or Config.CAMERA_BACKEND,
+                                  Config.CAMERA_SOURCE if source is None else source, **settings)
+
+
+# === CAMERA MANAGER ===
+class SafeCameraManager:
+    """Thread-safe camera manager with memory leak prevention."""
+
+    FPS_WINDOW = 2.0  # seconds over which the grabber measures the frame rate
+
+    def __init__(self, camera_index: int, thread_manager: "ThreadSafeManager",
+                 error_logger: SafeErrorLogger, tmp_dir: str,
+                 frame_bus: Optional["FrameBus"] = None,
+                 backend: Optional[CaptureBackend] = None, name: Optional[str] = None):
+        self.camera_index = camera_index
+        self.name = name or str(camera_index)  # "camera" label of its metrics
+        self.thread_manager = thread_manager
+        self.error_logger = error_logger
+        self.tmp_dir = tmp_dir
+        self.frame_bus = frame_bus or FrameBus()
+
+        # Camera configuration
+        self.frame_width = 640
+        self.frame_height = 480
+        self.fps = 15
+        self.jpeg_quality = 85
+
+        # Frame buffer management (flushing is only needed without the grabber)
+        self._frame_buffer_size = 5
+        self._frame_interval = 1.0 / self.fps
+
+        # Latest frame held by the grabber thread
+        self._frame_condition = threading.Condition()
+        self._latest_frame: Optional[np.ndarray] = None
+        self._latest_timestamp = 0.0
+        self._grabber_running = False
+        # Recent (timestamp, frame) pairs, to pick the best frame around a swipe
+        self._recent_frames: "deque[Tuple[float, np.ndarray]]" = deque(maxlen=max(1, Config.FRAME_RING_SIZE))
+
+        # Grabber counters
+        self.frames_grabbed = 0
+        self.frames_dropped = 0     # estimated from gaps between frames
+        self.read_failures = 0
+        self.consecutive_failures = 0
+        self.reopens = 0
+        self.measured_fps = 0.0
+
+        self.backend = backend or OpenCVCaptureBackend(camera_index, self.frame_width,
+                                                       self.frame_height, self.fps)
+        self._is_initialized = False
+        # Per camera, so lanes never wait on each other's cameras
+        self._camera_lock = threading.Lock()
+
+    @contextmanager
+    def _camera_access(self):
+        """Exclusive access to this camera, with timeout."""
+        if not self._camera_lock.acquire(timeout=5.0):
+            raise TimeoutError("Could not acquire camera lock within 5 seconds")
+        try:
+            yield
+        finally:
+            self._camera_lock.release()
+
+    def initialize_camera(self) -> bool:
+        """Initialize camera with proper configuration."""
+        try:
+            if not self.backend.open():
+                raise IOError(f"Cannot open camera {self.backend.describe()}")
+            if self.backend.frame_interval:
+                self._frame_interval = self.backend.frame_interval
+
+            ret, test_frame = self.backend.read()
+            if not ret or test_frame is None:
+                raise IOError("Cannot read test frame from camera")
+            self.frame_height, self.frame_width = test_frame.shape[:2]
+            del test_frame
+
+            self._is_initialized = True
+            print(f"✅ [Camera] Initialized {self.backend.describe()} ({self.frame_width}x{self.frame_height})")
+            return True
+
+        except Exception as e:
+            error_msg = f"Failed to initialize camera {self.backend.describe()}: {e}"
+            print(f"❌ [Camera] {error_msg}")
+            self.error_logger.log_error(error_msg, "CAMERA_INIT", e)
+            self.backend.release()
+            return False
+
+    @property
+    def is_initialized(self) -> bool:
+        return self._is_initialized
+
+    def reopen(self, lock_timeout: float = 2.0) -> bool:
+        """
+        Release and reinitialize the device (used by CameraSupervisor).
+        If a read is hung and holds the camera lock, the device is released
+        without the lock to unblock it and False is returned; the next
+        attempt then reopens it.
+        """
+        self._is_initialized = False
+        if not self._camera_lock.acquire(timeout=lock_timeout):
+            print(f"⚠️  [Camera] {self.backend.describe()} is blocked in a read, forcing release")
+            try:
+                self.backend.release()
+            except Exception as e:
+                print(f"⚠️  [Camera] Error releasing camera: {e}")
+            return False
+        try:
+            try:
+                self.backend.release()
+            except Exception as e:
+                print(f"⚠️  [Camera] Error releasing camera: {e}")
+            self.reopens += 1
+            CAMERA_REOPENS.inc(camera=self.name)
+            return self.initialize_camera()
+        finally:
+            self._camera_lock.release()
+
+    def capture_frame_safe(self, flush_buffer: bool = True) -> Optional[np.ndarray]:
+        """Capture a frame (optionally flushing stale buffered frames first)."""
+        if not self._is_initialized or not self.backend.is_opened():
+            return None
+
+        try:
+            with self._camera_access():
+                if flush_buffer:
+                    for _ in range(self._frame_buffer_size):
+                        ret, _ = self.backend.read()
+                        if not ret:
+                            break
+
+                ret, frame = self.backend.read()
+                if not ret or frame is None:
+                    print("⚠️  [Camera] Failed to capture frame")
+                    return None
+
+                return frame.copy()
+
+        except Exception as e:
+            error_msg = f"Error capturing frame: {e}"
+            print(f"❌ [Camera] {error_msg}")
+            self.error_logger.log_error(error_msg, "CAMERA_CAPTURE", e)
+            return None
+
+    def capture_image(self, output_path: str) -> bool:
+        """Capture a frame and save it as JPEG."""
+        frame = self.capture_frame_safe(flush_buffer=True)
+        if frame is None:
+            return False
+        return self.save_frame_as_jpeg(frame, output_path)
+
+    def save_frame_as_jpeg(self, frame: np.ndarray, output_path: str) -> bool:
+        """Encode a frame as JPEG and write it atomically (temp file + rename)."""
+        try:
+            write_file_atomic(output_path, get_image_codec().encode(frame, self.jpeg_quality))
+            return True
+
+        except Exception as e:
+            error_msg = f"Error saving frame to {output_path}: {e}"
+            print(f"❌ [Camera] {error_msg}")
+            self.error_logger.log_error(error_msg, "CAMERA_SAVE", e)
+            return False
+
+    def frame_age(self) -> Optional[float]:
+        """Seconds since the grabber's latest frame was captured (None before the first one)."""
+        with self._frame_condition:
+            if self._latest_frame is None:
+                return None
+            return time.time() - self._latest_timestamp
+
+    def current_fps(self) -> float:
+        """Frame rate measured by the grabber; 0 once frames stop arriving."""
+        age = self.frame_age()
+        if age is None or age > 2 * self.FPS_WINDOW:
+            return 0.0
+        return round(self.measured_fps, 2)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Grabber counters and current frame age."""
+        frame_age = self.frame_age()
+        return {
+            'fps': self.current_fps(),
+            'frames_grabbed': self.frames_grabbed,
+            'frames_dropped': self.frames_dropped,
+            'read_failures': self.read_failures,
+            'reopens': self.reopens,
+            'frame_age': round(frame_age, 3) if frame_age is not None else None,
+            'grabber_running': self._grabber_running,
+        }
+
+    def get_event_frame(self, timeout: float = 1.0) -> Optional[np.ndarray]:
+        """
+        Frame for a card swipe: the grabber's first frame captured after this
+        call, so it is never older than the swipe. Falls back to reading the
+        camera directly when the grabber is not running.
+        """
+        return self.select_event_frame(timeout)[0]
+
+    def select_event_frame(self, timeout: float = 1.0, window: float = 0.0,
+                           lookback: float = 0.0) -> Tuple[Optional[np.ndarray], Optional[FrameQuality]]:
+        """
+        Best frame around a card swipe and its quality. Waits for the first
+        frame after the call, keeps collecting for `window` seconds, then
+        scores every frame in the grabber's ring buffer captured from
+        `lookback` seconds before the swipe on and returns the best one.
+        With window=0 and lookback=0 this is the first frame after the swipe.
+        """
+        swipe_time = time.time()
+        if self._grabber_running:
+            with self._frame_condition:
+                if self._frame_condition.wait_for(lambda: self._latest_timestamp >= swipe_time, timeout):
+                    if window > 0:
+                        self._frame_condition.wait_for(
+                            lambda: self._latest_timestamp >= swipe_time + window, window + self._frame_interval)
+                    recent = list(self._recent_frames)
+                    candidates = [i for i, (ts, _) in enumerate(recent) if ts >= swipe_time - lookback]
+                    if not candidates:
+                        return self._latest_frame.copy(), None
+                    first = candidates[0]
+                    frames = [frame for _, frame in recent[first:]]
+                    previous = recent[first - 1][1] if first > 0 else None
+                    if len(frames) == 1 and previous is None:
+                        return frames[0].copy(), score_frame_quality(frames[0])
+                else:
+                    frames = None
+            if frames is not None:
+                # Score outside the lock so the grabber is not held up
+                index, quality = select_best_frame(frames, previous)
+                return frames[index].copy(), quality
+            print("⚠️  [Camera] Grabber has no fresh frame, reading camera directly")
+        frame = self.capture_frame_safe(flush_buffer=True)
+        return frame, score_frame_quality(frame) if frame is not None else None
+
+    def grabber_thread_safe(self):
+        """
+        Grabber thread: read the camera continuously and keep only the newest
+        frame, so nobody ever reads a stale buffered frame. Each frame is also
+        published on the frame bus for live view.
+
+        Read errors never stop the thread: it keeps retrying while a
+        CameraSupervisor reopens the device.
+        """
+        target = self.frame_bus.name or "in-process frame bus"
+        print(f"🎥 [Grabber] Thread started, publishing to: {target}")
+
+        last_timestamp = None
+        fps_window_start, fps_window_frames = time.monotonic(), 0
+        self._grabber_running = True
+        CAMERA_FPS.set_function(self.current_fps, camera=self.name)
+
+        try:
+            while self.thread_manager.is_live_view_running():
+                try:
+                    if not self._is_initialized:
+                        # Device closed or being reopened by the supervisor
+                        last_timestamp = None
+                        time.sleep(0.1)
+                        continue
+
+                    # read() blocks until the camera delivers the next frame
+                    frame = self.capture_frame_safe(flush_buffer=False)
+                    timestamp = time.time()
+                    if frame is None:
+                        self.read_failures += 1
+                        self.consecutive_failures += 1
+                        CAMERA_READ_FAILURES.inc(camera=self.name)
+                        time.sleep(0.5)
+                        continue
+
+                    self.consecutive_failures = 0
+                    if last_timestamp is not None:
+                        missed = round((timestamp - last_timestamp) / self._frame_interval) - 1
+                        if missed > 0:
+                            self.frames_dropped += missed
+                            CAMERA_FRAMES_DROPPED.inc(missed, camera=self.name)
+                    last_timestamp = timestamp
+
+                    with self._frame_condition:
+                        self._latest_frame = frame
+                        self._latest_timestamp = timestamp
+                        self._recent_frames.append((timestamp, frame))
+                        self._frame_condition.notify_all()
+                    self.frames_grabbed += 1
+                    CAMERA_FRAMES.inc(camera=self.name)
+                    fps_window_frames += 1
+                    elapsed = time.monotonic() - fps_window_start
+                    if elapsed >= self.FPS_WINDOW:
+                        self.measured_fps = fps_window_frames / elapsed
+                        fps_window_start, fps_window_frames = time.monotonic(), 0
+
+                    # No encoding here: viewers encode only while someone is watching
+                    self.frame_bus.publish(frame, timestamp)
+
+                    if self.frames_grabbed % 1000 == 0:
+                        print(f"🎥 [Grabber] {self.get_stats()}")
+
+                except Exception as e:
+                    self.consecutive_failures += 1
+                    error_msg = f"Error in grabber thread: {e}"
+                    print(f"🎥 [Grabber] {error_msg}")
+                    self.error_logger.log_error(error_msg, "CAMERA_GRABBER", e)
+                    time.sleep(1.0)
+        finally:
+            self._grabber_running = False
+
+        print(f"🎥 [Grabber] Thread stopped: {self.get_stats()}")
+
+    def release(self):
+        """Release camera resources."""
+        try:
+            if self.backend.is_opened():
+                self.backend.release()
+                print("✅ [Camera] Camera released")
+        except Exception as e:
+            print(f"⚠️  [Camera] Error releasing camera: {e}")
+        finally:
+            self._is_initialized = False
+
+class CameraSupervisor:
+    """
+    Watchdog for one SafeCameraManager.
+
+    Every check_interval it looks at the grabber's frame age and read
+    failures. When no fresh frame arrived within stall_timeout (or reads
+    keep failing) the camera is released and reopened, with exponential
+    backoff between failed attempts. The current health state is kept
+    here, reported to on_state_change and, if status_path is set, written
+    as JSON for other processes (the web app).
+
+    Swipes call get_event_frame(), which waits up to recovery_wait for
+    the camera to come back instead of failing straight away.
+    """
+
+    def __init__(self, camera: SafeCameraManager, stall_timeout: float = 3.0,
+                 failure_threshold: int = 5, backoff_initial: float = 1.0,
+                 backoff_max: float = 30.0, check_interval: float = 0.5,
+                 recovery_wait: float = 3.0, status_path: Optional[str] = None,
+                 on_state_change: Optional[Callable[[str, str], None]] = None,
+                 name: str = "CameraSupervisor"):
+        self.camera = camera
+        self.stall_timeout = stall_timeout
+        self.failure_threshold = failure_threshold
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.check_interval = check_interval
+        self.recovery_wait = recovery_wait
+        self.status_path = status_path
+        self.on_state_change = on_state_change
+        self.name = name
+
+        self._state_condition = threading.Condition()
+        self.state = CAMERA_STATE_STARTING
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        now = time.monotonic()
+        self._started_at = now
+        self._state_since = now
+        self._unhealthy_since: Optional[float] = None
+        self._next_attempt = 0.0
+        self._backoff = backoff_initial
+        self._last_status_write = 0.0
+
+        # Metrics
+        self.healthy_seconds = 0.0
+        self.outages = 0
+        self.recoveries = 0
+        self.reopen_attempts = 0
+        self.failed_reopens = 0
+        self.last_recovery_time: Optional[float] = None
+        self.total_recovery_time = 0.0
+        self.max_recovery_time = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+
+    @property
+    def is_healthy(self) -> bool:
+        return self.state == CAMERA_STATE_OK
+
+    def wait_until_healthy(self, timeout: Optional[float] = None) -> bool:
+        with self._state_condition:
+            return self._state_condition.wait_for(lambda: self.state == CAMERA_STATE_OK, timeout)
+
+    def get_event_frame(self, timeout: float = 1.0) -> Optional[np.ndarray]:
+        """Event frame for a swipe, waiting up to recovery_wait for an unhealthy camera."""
+        return self.select_event_frame(timeout)[0]
+
+    def select_event_frame(self, timeout: float = 1.0, window: float = 0.0,
+                           lookback: float = 0.0) -> Tuple[Optional[np.ndarray], Optional[FrameQuality]]:
+        """SafeCameraManager.select_event_frame, waiting up to recovery_wait for an unhealthy camera."""
+        if not self.is_healthy and self.state != CAMERA_STATE_STARTING:
+            print(f"⏳ [{self.name}] Camera {self.state}, waiting up to {self.recovery_wait:.1f}s for recovery")
+            self.wait_until_healthy(self.recovery_wait)
+        frame, quality = self.camera.select_event_frame(timeout, window, lookback)
+        if frame is None and self.wait_until_healthy(self.recovery_wait):
+            frame, quality = self.camera.select_event_frame(timeout, window, lookback)
+        return frame, quality
+
+    def _frame_is_fresh(self) -> bool:
+        age = self.camera.frame_age()
+        return (self.camera.is_initialized and age is not None and age <= self.stall_timeout
+                and self.camera.consecutive_failures < self.failure_threshold)
+
+    def _set_state(self, state: str):
+        now = time.monotonic()
+        with self._state_condition:
+            previous = self.state
+            if previous == state:
+                return
+            if previous == CAMERA_STATE_OK:
+                self.healthy_seconds += now - self._state_since
+            self.state = state
+            self._state_since = now
+            self._state_condition.notify_all()
+        CAMERA_UP.set(1 if state == CAMERA_STATE_OK else 0, camera=self.camera.name)
+        print(f"🩺 [{self.name}] Camera {previous} -> {state}")
+        self._write_status()
+        if self.on_state_change:
+            try:
+                self.on_state_change(previous, state)
+            except Exception as e:
+                print(f"⚠️  [{self.name}] State change callback failed: {e}")
+
+    def check(self):
+        """One watchdog pass (called by the supervisor thread)."""
+        now = time.monotonic()
+        if self._frame_is_fresh():
+            if self._unhealthy_since is not None:
+                recovery_time = now - self._unhealthy_since
+                self.recoveries += 1
+                self.last_recovery_time = recovery_time
+                self.total_recovery_time += recovery_time
+                self.max_recovery_time = max(self.max_recovery_time, recovery_time)
+                print(f"✅ [{self.name}] Camera recovered after {recovery_time:.1f}s")
+                self._unhealthy_since = None
+            self._backoff = self.backoff_initial
+            self._set_state(CAMERA_STATE_OK)
+            return
+
+        if self.state == CAMERA_STATE_STARTING and self.camera.is_initialized \
+                and now - self._started_at < self.stall_timeout:
+            return  # Grace period for the first frame
+
+        if self._unhealthy_since is None:
+            self._unhealthy_since = now
+            self.outages += 1
+            self._next_attempt = now
+            self._set_state(CAMERA_STATE_STALLED)
+
+        if now < self._next_attempt:
+            return
+
+        self._set_state(CAMERA_STATE_RECOVERING)
+        self.reopen_attempts += 1
+        reopened = self.camera.reopen()
+        if not reopened:
+            self.failed_reopens += 1
+        # Give the grabber time to deliver a frame before trying again
+        self._next_attempt = time.monotonic() + max(self._backoff, self.stall_timeout if reopened else 0)
+        print(f"🩺 [{self.name}] Reopen {'succeeded' if reopened else 'failed'}, "
+              f"next attempt in {self._next_attempt - time.monotonic():.1f}s if still unhealthy")
+        self._backoff = min(self._backoff * 2, self.backoff_max)
+        self._set_state(CAMERA_STATE_STALLED if reopened else CAMERA_STATE_DOWN)
+
+    def _run(self):
+        print(f"🩺 [{self.name}] Watching {self.camera.backend.describe()} (stall timeout {self.stall_timeout}s)")
+        while not self._stop_event.is_set():
+            try:
+                self.check()
+                if time.monotonic() - self._last_status_write >= 10.0:
+                    self._write_status()
+            except Exception as e:
+                print(f"🔥 [{self.name}] Watchdog error: {e}")
+                self.camera.error_logger.log_error(f"Camera watchdog error: {e}", "CAMERA_WATCHDOG", e)
+            self._stop_event.wait(self.check_interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._state_condition:
+            healthy = self.healthy_seconds + (now - self._state_since if self.state == CAMERA_STATE_OK else 0.0)
+            state = self.state
+        elapsed = now - self._started_at
+        return {
+            'state': state,
+            'availability': round(healthy / elapsed, 4) if elapsed > 0 else None,
+            'uptime': round(elapsed, 1),
+            'outages': self.outages,
+            'recoveries': self.recoveries,
+            'reopen_attempts': self.reopen_attempts,
+            'failed_reopens': self.failed_reopens,
+            'last_recovery_time': round(self.last_recovery_time, 2) if self.last_recovery_time is not None else None,
+            'avg_recovery_time': round(self.total_recovery_time / self.recoveries, 2) if self.recoveries else None,
+            'max_recovery_time': round(self.max_recovery_time, 2),
+        }
+
+    def _write_status(self):
+        if not self.status_path:
+            return
+        self._last_status_write = time.monotonic()
+        status = self.get_stats()
+        status['updated_at'] = time.time()
+        status['camera'] = self.camera.backend.describe()
+        try:
+            write_file_atomic(self.status_path, json.dumps(status).encode("utf-8"))
+        except OSError as e:
+            print(f"⚠️  [{self.name}] Cannot write health status: {e}")
+
+
+def read_camera_health(status_path: str, max_age: float = 30.0) -> Dict[str, Any]:
+    """
+    Health published by a CameraSupervisor in another process. The state
+    is 'unknown' when there is no status file or it is older than max_age
+    (LPR.py not running).
+    """
+    try:
+        with open(status_path, "r", encoding="utf-8") as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return {'state': 'unknown'}
+    if time.time() - status.get('updated_at', 0) > max_age:
+        status['state'] = 'unknown'
+    return status
+
+
+def camera_health_path(lane_id: str) -> str:
+    """Status file a lane's CameraSupervisor writes to."""
+    return os.path.join(Config.TMP_DIR, f"camera_health_{sanitize_filename_component(lane_id)}.json")
+
+
+__all__ = [
+    'FrameQuality', 'score_frame_quality', 'select_best_frame',
+    'CaptureBackend', 'OpenCVCaptureBackend', 'GStreamerCaptureBackend', 'V4L2MJPEGCaptureBackend',
+    'RTSPCaptureBackend', 'FileReplayBackend', 'CAPTURE_BACKENDS', 'create_capture_backend',
+    'capture_backend_from_config',
+    'SafeCameraManager', 'CameraSupervisor', 'read_camera_health', 'camera_health_path'
+]
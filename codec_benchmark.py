@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+JPEG codec microbenchmark.
+
+Encodes and decodes camera-sized frames with every available ImageCodec
+backend (libjpeg-turbo via PyTurboJPEG, OpenCV) and reports per-frame
+times and output sizes, plus the live view resize+encode path for each
+variant in LIVE_VIEW_VARIANTS.
+
+    python3 codec_benchmark.py --iterations 50 --json codec_results.json
+"""
+import argparse
+import json
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from core_utils import ImageCodec, Config
+
+FRAME_SIZES = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def make_frame(width: int, height: int) -> np.ndarray:
+    """Synthetic frame with camera-like texture (blurred noise + a plate)."""
+    frame = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (9, 9), 0)
+    x, y = width // 3, height * 2 // 3
+    cv2.rectangle(frame, (x, y), (x + width // 3, y + height // 8), (255, 255, 255), -1)
+    cv2.putText(frame, "51F-123.45", (x + 10, y + height // 10), cv2.FONT_HERSHEY_SIMPLEX,
+                width / 640, (0, 0, 0), 2)
+    return frame
+
+
+def time_ms(fn, iterations: int) -> dict:
+    """Median and p95 wall time of fn() in milliseconds (after one warm-up call)."""
+    fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+    }
+
+
+def available_codecs(names) -> list:
+    codecs = []
+    for name in names:
+        try:
+            codecs.append(ImageCodec(name))
+        except Exception as e:
+            print(f"⚠️  [CodecBench] Skipping {name}: {e}")
+    return codecs
+
+
+def benchmark(codec: ImageCodec, width: int, height: int, quality: int, iterations: int) -> list:
+    frame = make_frame(width, height)
+    jpeg_bytes = codec.encode(frame, quality)
+    size = f"{width}x{height}"
+    results = [
+        {'codec': codec.name, 'size': size, 'op': f'encode q{quality}', 'bytes': len(jpeg_bytes),
+         **time_ms(lambda: codec.encode(frame, quality), iterations)},
+        {'codec': codec.name, 'size': size, 'op': 'decode', 'bytes': len(jpeg_bytes),
+         **time_ms(lambda: codec.decode(jpeg_bytes), iterations)},
+        {'codec': codec.name, 'size': size, 'op': 'decode 1/2', 'bytes': len(jpeg_bytes),
+         **time_ms(lambda: codec.decode(jpeg_bytes, 2), iterations)},
+    ]
+    for variant, settings in Config.LIVE_VIEW_VARIANTS.items():
+        width_limit, variant_quality = settings.get('width') or 0, settings.get('quality', 85)
+        encoded = codec.encode_resized(frame, width_limit, variant_quality)
+        results.append({'codec': codec.name, 'size': size, 'op': f'live {variant}', 'bytes': len(encoded),
+                        **time_ms(lambda: codec.encode_resized(frame, width_limit, variant_quality), iterations)})
+    return results
+
+
+def print_report(results: list):
+    print("\n📊 [CodecBench] JPEG codec results (per frame)")
+    header = f"{'codec':<11}{'size':<11}{'op':<14}{'median ms':>10}{'p95 ms':>10}{'KB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['codec']:<11}{r['size']:<11}{r['op']:<14}{r['median_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+              f"{r['bytes'] / 1024:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JPEG codecs on camera frame sizes")
+    parser.add_argument('--codec', choices=('all', 'turbojpeg', 'opencv'), default='all')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--quality', type=int, default=Config.EVENT_JPEG_QUALITY)
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    args = parser.parse_args()
+
+    names = ('turbojpeg', 'opencv') if args.codec == 'all' else (args.codec,)
+    codecs = available_codecs(names)
+    print(f"🧪 [CodecBench] Codecs: {', '.join(c.name for c in codecs) or 'none'}, "
+          f"{args.iterations} iterations, cv2 threads: {cv2.getNumThreads()}")
+
+    results = []
+    for codec in codecs:
+        for width, height in FRAME_SIZES:
+            results.extend(benchmark(codec, width, height, args.quality, args.iterations))
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 [CodecBench] Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
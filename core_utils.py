@@ -2,37 +2,202 @@
 """
 Parking System Core Utilities
 Gộp tất cả các utility functions và classes cần thiết
+
+Các hệ thống con có module riêng: metrics, http_cache, thumbnails,
+camera, frame_bus, live_dashboard, history_export, lanes.
 """
 
 import os
 import sqlite3
 import threading
 import time
+import json
 import logging
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+import math
+import random
+import socket
+import queue
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+from enum import Enum
+from typing import Optional, List, Dict, Any, Callable, Tuple, Iterator
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+import requests
+from dotenv import load_dotenv
 from filelock import FileLock, Timeout
 
+from metrics import metrics
+
+# Load .env before Config reads the environment
+load_dotenv()
+
 # === CONSTANTS ===
-STATUS_INSIDE = 0
-STATUS_COMPLETED = 1  
-STATUS_INVALID = 2
+STATUS_INSIDE = 0       # Xe đã vào bãi, chưa ra
+STATUS_COMPLETED = 1    # Giao dịch hoàn tất (xe đã ra)
+STATUS_INVALID = 2      # Bản ghi không hợp lệ (lỗi dữ liệu, không thể đồng bộ)
+
+# Trạng thái lỗi chi tiết để ghi vào DB và đồng bộ lên server
+STATUS_FAIL_NO_PLATE = 3        # Lỗi: AI không nhận dạng được biển số khi quẹt thẻ
+STATUS_FAIL_PLATE_INSIDE = 4    # Lỗi: Biển số đã được ghi nhận ở trong bãi với thẻ khác
+STATUS_FAIL_PLATE_MISMATCH = 5  # Lỗi: An ninh - Biển số lúc ra không khớp với lúc vào
+
+# File paths
+ERROR_LOG_FILE = "error_log.txt"
+
+# Camera health states published by CameraSupervisor
+CAMERA_STATE_STARTING = "starting"      # Waiting for the first frame
+CAMERA_STATE_OK = "ok"                  # Fresh frames are arriving
+CAMERA_STATE_STALLED = "stalled"        # No fresh frame within the stall timeout
+CAMERA_STATE_RECOVERING = "recovering"  # Device is being reopened
+CAMERA_STATE_DOWN = "down"              # Reopen failed, waiting for the next attempt
+
+# GPIO pins
+GREEN_LED_PIN = 23
 
 # === TIME UTILITIES ===
+def get_vietnam_time_object() -> datetime:
+    """Get current Vietnam time as datetime object."""
+    return datetime.now(timezone(timedelta(hours=7)))
+
 def get_vietnam_time_str() -> str:
     """Get current Vietnam time as formatted string."""
-    from datetime import datetime, timezone, timedelta
-    vietnam_tz = timezone(timedelta(hours=7))
-    return datetime.now(vietnam_tz).strftime("%Y-%m-%d %H:%M:%S")
+    return get_vietnam_time_object().strftime("%Y-%m-%d %H:%M:%S")
+
+def get_vietnam_time_for_filename() -> str:
+    """Get current Vietnam time formatted for file names."""
+    return get_vietnam_time_object().strftime("%d_%m_%Y_%Hh%Mm%S")
+
+# === STRING / FILESYSTEM UTILITIES ===
+def normalize_plate(plate_text: str) -> str:
+    """Normalize license plate text (alphanumeric, upper case)."""
+    if not plate_text:
+        return ""
+    return "".join(filter(str.isalnum, plate_text)).upper()
+
+def safe_normalize_plate(plate_text: str) -> str:
+    """Normalize plate text, returning 'UNKNOWN' instead of raising."""
+    try:
+        if not plate_text:
+            return "UNKNOWN"
+        result = normalize_plate(plate_text)
+        return result if result else "UNKNOWN"
+    except Exception as e:
+        print(f"🔥 [SafeNormalize] Error normalizing plate '{plate_text}': {e}")
+        return "UNKNOWN"
+
+def sanitize_filename_component(name_part: str) -> str:
+    """Make a string safe to use as part of a file name."""
+    return "".join(c if c.isalnum() else "_" for c in str(name_part)).rstrip("_")
+
+def ensure_directories_exist(*directories) -> None:
+    """Create directories if they do not exist."""
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+
+# === METRICS ===
+# Metrics updated by the classes in this module (registry and exporter in
+# metrics.py; the web app only ever touches the DB ones)
+DB_LOCK_WAIT_SECONDS = metrics.histogram(
+    'parking_db_lock_wait_seconds', 'Time waiting for the database write lock (thread + file lock)')
+DB_LOCK_HELD_SECONDS = metrics.histogram(
+    'parking_db_lock_held_seconds', 'Time the database write lock was held (one transaction)')
+DB_LOCK_TIMEOUTS = metrics.counter(
+    'parking_db_lock_timeouts_total', 'Database file lock acquisitions that timed out')
+SERVER_REQUEST_SECONDS = metrics.histogram(
+    'parking_server_request_seconds', 'HTTP request time to the central server', ('endpoint',))
+SERVER_REQUESTS = metrics.counter(
+    'parking_server_requests_total', 'HTTP requests to the central server by status code or error',
+    ('endpoint', 'status'))
+IMAGE_WRITE_SECONDS = metrics.histogram(
+    'parking_image_write_seconds', 'Event image queued -> on disk (encode + write)')
+IMAGE_WRITE_FAILURES = metrics.counter('parking_image_write_failures_total', 'Event images that failed to write')
+
+# === SWIPE TRACING ===
+# Stages of one card swipe, in pipeline order; each is a <stage>_us column
+# of the event_trace table (microseconds, NULL when the stage did not run)
+TRACE_STAGES = ('capture', 'queue', 'detect', 'crop', 'ocr', 'normalize', 'lookup', 'image', 'commit')
+TRACE_KIND_ENTRY = 0  # entries and refused swipes (the row's IN side)
+TRACE_KIND_EXIT = 1
+
+TRACE_STAGE_SECONDS = metrics.histogram(
+    'parking_swipe_stage_seconds', 'Time spent in each stage of a swipe (see TRACE_STAGES)', ('stage',))
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100) of an already sorted list; None if empty."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class EventTrace:
+    """
+    Stage timings of one swipe, from the card read to the gate decision.
+
+    The lane worker creates it with the swipe time, the pipeline adds each
+    stage (span() or add(); repeated stages accumulate) and sets log_id and
+    kind once the event is stored. close() fixes the total; the time not
+    covered by any stage (waiting for the processing lock etc.) is
+    total - sum(stages).
+    """
+
+    def __init__(self, lane_id: str, swipe_time: Optional[float] = None):
+        self.lane_id = lane_id
+        self.started = time.monotonic() if swipe_time is None else swipe_time
+        self.stages: Dict[str, float] = {}
+        self.log_id: Optional[int] = None
+        self.kind: Optional[int] = None
+        self.total: Optional[float] = None
+
+    def add(self, stage: str, seconds: float):
+        if stage not in TRACE_STAGES:
+            raise ValueError(f"Unknown trace stage: {stage}")
+        self.stages[stage] = self.stages.get(stage, 0.0) + max(seconds, 0.0)
+
+    @contextmanager
+    def span(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def set_event(self, log_id: int, kind: int = TRACE_KIND_ENTRY):
+        """The parking_log row (and side, entry or exit) this swipe produced."""
+        self.log_id = log_id
+        self.kind = kind
+
+    def close(self) -> float:
+        """Fix the total (seconds since the swipe) and feed the stage histograms."""
+        if self.total is None:
+            self.total = time.monotonic() - self.started
+            for stage, seconds in self.stages.items():
+                TRACE_STAGE_SECONDS.observe(seconds, stage=stage)
+        return self.total
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'lane': self.lane_id,
+            'log_id': self.log_id,
+            'kind': self.kind,
+            'total_ms': round(self.total * 1000, 1) if self.total is not None else None,
+            'stages_ms': {stage: round(self.stages[stage] * 1000, 1) for stage in TRACE_STAGES
+                          if stage in self.stages},
+        }
 
 # === SAFE ERROR LOGGER ===
 class SafeErrorLogger:
     """Thread-safe error logger."""
-    
+
     def __init__(self, log_file: str):
         self.log_file = log_file
         self._lock = threading.Lock()
-        
+
         # Setup logging
         logging.basicConfig(
             level=logging.INFO,
@@ -43,172 +208,1925 @@ class SafeErrorLogger:
             ]
         )
         self.logger = logging.getLogger(__name__)
-    
-    def log_error(self, message: str, component: str, exception: Exception = None):
+
+    def log_error(self, message: str, category: str = "GENERAL", exception_obj: Exception = None):
         """Log error message with thread safety."""
         with self._lock:
-            full_message = f"[{component}] {message}"
-            if exception:
-                full_message += f" | Exception: {str(exception)}"
+            full_message = f"[{category}] {message}"
+            if exception_obj:
+                full_message += f" | Exception: {str(exception_obj)}"
             self.logger.error(full_message)
 
+# === CROSS-PROCESS CHANGE NOTIFICATION ===
+class ChangeNotifier:
+    """
+    Wake the gate process' sync thread from any process that writes parking_log.
+
+    The sync thread listens on a Unix datagram socket; writers (LPR.py itself,
+    the web app's force_out, tools) send a tiny datagram after committing.
+    Sending never blocks and is a no-op when nobody is listening, so the
+    periodic safety wake-up in the sync thread still covers lost messages.
+
+    With fanout_dir, notify() also sends to every listener socket in that
+    directory (one per web app process, for the live dashboard); sockets
+    left behind by dead processes are removed.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, fanout_dir: Optional[str] = None):
+        self.socket_path = socket_path or Config.SYNC_NOTIFY_SOCKET
+        self.fanout_dir = fanout_dir
+        self._send_sock: Optional[socket.socket] = None
+        self._recv_sock: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def is_supported() -> bool:
+        return hasattr(socket, "AF_UNIX")
+
+    def notify(self, reason: str = "change") -> bool:
+        """Send a wake-up datagram; returns False if no listener is running."""
+        if not self.is_supported():
+            return False
+        message = reason.encode("utf-8")[:64]
+        with self._send_lock:
+            delivered = self._send(message, self.socket_path)
+            if self.fanout_dir:
+                try:
+                    entries = [entry.path for entry in os.scandir(self.fanout_dir) if entry.name.endswith(".sock")]
+                except FileNotFoundError:
+                    entries = []
+                for path in entries:
+                    if path != self.socket_path:
+                        delivered = self._send(message, path, remove_stale=True) or delivered
+            return delivered
+
+    def _send(self, message: bytes, path: str, remove_stale: bool = False) -> bool:
+        try:
+            if self._send_sock is None:
+                self._send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self._send_sock.setblocking(False)
+            self._send_sock.sendto(message, path)
+            return True
+        except ConnectionRefusedError:
+            # Nobody bound to it any more (process died without cleaning up)
+            if remove_stale:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            return False
+        except (FileNotFoundError, BlockingIOError):
+            # Listener not running, or its queue is already full of wake-ups
+            return False
+        except OSError as e:
+            print(f"⚠️  [Notify] Cannot send change notification: {e}")
+            return False
+
+    def listen(self, callback: Callable[[str], None]) -> bool:
+        """Bind the socket and call `callback(reason)` for every notification."""
+        if not self.is_supported():
+            print("⚠️  [Notify] Unix sockets not supported, relying on periodic sync wake-ups")
+            return False
+        ensure_directories_exist(os.path.dirname(self.socket_path) or ".")
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        self._recv_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._recv_sock.bind(self.socket_path)
+        self._thread = threading.Thread(target=self._listen_loop, args=(callback,),
+                                        name="ChangeNotifier", daemon=True)
+        self._thread.start()
+        print(f"📨 [Notify] Listening for change notifications on {self.socket_path}")
+        return True
+
+    def _listen_loop(self, callback: Callable[[str], None]):
+        while self._recv_sock is not None:
+            try:
+                data = self._recv_sock.recv(64)
+            except OSError:
+                break
+            try:
+                callback(data.decode("utf-8", "replace"))
+            except Exception as e:
+                print(f"⚠️  [Notify] Change callback error: {e}")
+
+    def close(self):
+        """Stop listening and release sockets."""
+        recv_sock, self._recv_sock = self._recv_sock, None
+        if recv_sock is not None:
+            recv_sock.close()
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+        with self._send_lock:
+            if self._send_sock is not None:
+                self._send_sock.close()
+                self._send_sock = None
+
 # === SAFE DATABASE MANAGER ===
 class SafeDatabaseManager:
     """Thread-safe database manager with connection pooling."""
-    
-    def __init__(self, db_file: str):
+
+    def __init__(self, db_file: str, notifier: Optional[ChangeNotifier] = None,
+                 device_uid: Optional[str] = None):
         self.db_file = db_file
         self.lock_file = db_file + ".lock"
+        self.notifier = notifier
+        self.device_uid = device_uid or Config.UID
         self._lock = threading.Lock()
-        
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._local = threading.local()
+
+    def _notify_change(self, reason: str):
+        """Tell the sync engine (possibly in another process) there is new work."""
+        if self.notifier:
+            self.notifier.notify(reason)
+
     def _get_connection(self):
         """Get database connection with proper settings."""
         conn = sqlite3.connect(self.db_file, timeout=10.0)
         conn.row_factory = sqlite3.Row
         return conn
-    
-    def get_vehicles_inside(self, search_query: Optional[str] = None) -> List[Dict]:
-        """Get list of vehicles currently inside the parking lot."""
+
+    @contextmanager
+    def _locked_connection(self):
+        """Open a connection under the thread lock and the cross-process file lock."""
+        wait_started = time.perf_counter()
         with self._lock:
+            file_lock = FileLock(self.lock_file, timeout=5.0)
             try:
-                with FileLock(self.lock_file, timeout=5.0):
-                    with self._get_connection() as conn:
-                        cursor = conn.cursor()
-                        
-                        query = """
-                        SELECT id, plate, time_in, image_path_in 
-                        FROM parking_log 
-                        WHERE status = ?
-                        """
-                        params = [STATUS_INSIDE]
-                        
-                        if search_query:
-                            query += " AND plate LIKE ?"
-                            params.append(f"%{search_query}%")
-                        
-                        query += " ORDER BY time_in DESC"
-                        
-                        cursor.execute(query, params)
-                        rows = cursor.fetchall()
-                        
-                        vehicles = []
-                        for row in rows:
-                            vehicles.append({
-                                'id': row['id'],
-                                'plate': row['plate'],
-                                'time_in': row['time_in'],
-                                'image_path': row['image_path_in']
-                            })
-                        
-                        return vehicles
-                        
-            except Exception as e:
-                raise Exception(f"Database error in get_vehicles_inside: {e}")
-    
-    def update_vehicle_exit(self, vehicle_id: int, exit_time: str, image_path: Optional[str]) -> bool:
-        """Update vehicle exit information."""
-        with self._lock:
+                file_lock.acquire()
+            except Timeout:
+                DB_LOCK_TIMEOUTS.inc()
+                raise
+            acquired = time.perf_counter()
+            DB_LOCK_WAIT_SECONDS.observe(acquired - wait_started)
+            try:
+                conn = self._get_connection()
+                try:
+                    with conn:
+                        yield conn
+                finally:
+                    conn.close()
+            finally:
+                file_lock.release()
+                DB_LOCK_HELD_SECONDS.observe(time.perf_counter() - acquired)
+
+    def init_database(self) -> None:
+        """Initialize database with proper schema."""
+        with self._init_lock:
+            if self._initialized:
+                return
+
             try:
-                with FileLock(self.lock_file, timeout=5.0):
-                    with self._get_connection() as conn:
-                        cursor = conn.cursor()
-                        
-                        # Check if vehicle exists and is inside
-                        cursor.execute(
-                            "SELECT id FROM parking_log WHERE id = ? AND status = ?",
-                            (vehicle_id, STATUS_INSIDE)
+                with self._locked_connection() as conn:
+                    cursor = conn.cursor()
+
+                    # WAL lets the web app read while the gate process writes
+                    cursor.execute("PRAGMA journal_mode=WAL")
+
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS parking_log (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            plate TEXT NOT NULL,
+                            rfid_token TEXT NOT NULL,
+                            time_in TEXT NOT NULL,
+                            time_out TEXT NULL,
+                            image_path_in TEXT NULL,
+                            image_path_out TEXT NULL,
+                            status INTEGER NOT NULL CHECK (status IN (0, 1, 2, 3, 4, 5)),
+                            gate_in TEXT NULL,
+                            gate_out TEXT NULL,
+                            synced_to_server INTEGER NOT NULL DEFAULT 0 CHECK (synced_to_server IN (0, 1)),
+                            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+                            updated_at TEXT NOT NULL DEFAULT (datetime('now'))
                         )
-                        
-                        if not cursor.fetchone():
-                            return False
-                        
-                        # Update exit information
-                        cursor.execute("""
-                            UPDATE parking_log 
-                            SET time_out = ?, image_path_out = ?, status = ?, synced_to_server = 0
-                            WHERE id = ?
-                        """, (exit_time, image_path, STATUS_COMPLETED, vehicle_id))
-                        
-                        conn.commit()
-                        return True
-                        
+                    ''')
+
+                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_token_status ON parking_log (rfid_token, status)")
+                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_plate_status ON parking_log (plate, status)")
+                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sync_status ON parking_log (synced_to_server)")
+                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_time_in ON parking_log (time_in)")
+                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inside ON parking_log (id) WHERE status = 0")
+                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_time_out ON parking_log (time_out) WHERE status = 1")
+                    self._add_missing_columns(cursor, "parking_log", {"gate_in": "TEXT NULL", "gate_out": "TEXT NULL"})
+
+                    self._init_sync_outbox(cursor)
+                    self._init_event_trace(cursor)
+                    self._init_data_version(cursor)
+
+                    cursor.execute('''
+                        CREATE TRIGGER IF NOT EXISTS update_parking_log_timestamp
+                        AFTER UPDATE ON parking_log
+                        FOR EACH ROW
+                        BEGIN
+                            UPDATE parking_log SET updated_at = datetime('now') WHERE id = NEW.id;
+                        END
+                    ''')
+
             except Exception as e:
-                raise Exception(f"Database error in update_vehicle_exit: {e}")
+                raise Exception(f"Database error in init_database: {e}")
+
+            self._initialized = True
+
+    @staticmethod
+    def _init_data_version(cursor: sqlite3.Cursor):
+        """
+        Counter in sync_state bumped by triggers whenever parking_log changes
+        in a way the dashboard shows (not for sync bookkeeping) or a swipe
+        trace is stored, so every process can tell cheaply whether the data
+        changed.
+        """
+        cursor.execute("INSERT OR IGNORE INTO sync_state (name, value) VALUES ('data_version', 0)")
+        bump = "BEGIN UPDATE sync_state SET value = value + 1 WHERE name = 'data_version'; END"
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS parking_log_version_insert AFTER INSERT ON parking_log {bump}")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS parking_log_version_delete AFTER DELETE ON parking_log {bump}")
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS parking_log_version_update
+            AFTER UPDATE OF plate, rfid_token, time_in, time_out, image_path_in, image_path_out,
+                            status, gate_in, gate_out ON parking_log {bump}
+        """)
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS event_trace_version_insert AFTER INSERT ON event_trace {bump}")
+
+    @staticmethod
+    def _init_event_trace(cursor: sqlite3.Cursor):
+        """
+        Side table with the stage timings of each swipe (EventTrace), one
+        row per parking_log id and side (kind 0 = entry or refused swipe,
+        1 = exit). Durations are integer microseconds, NULL for stages
+        that did not run.
+        """
+        stage_columns = ", ".join(f"{stage}_us INTEGER NULL" for stage in TRACE_STAGES)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS event_trace (
+                log_id INTEGER NOT NULL,
+                kind INTEGER NOT NULL CHECK (kind IN (0, 1)),
+                lane TEXT NULL,
+                created_at TEXT NOT NULL,
+                total_us INTEGER NOT NULL,
+                {stage_columns},
+                PRIMARY KEY (log_id, kind)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_trace_created ON event_trace (created_at)")
+
+    @staticmethod
+    def _add_missing_columns(cursor: sqlite3.Cursor, table: str, columns: Dict[str, str]):
+        """Add columns introduced after a database was created."""
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row['name'] for row in cursor.fetchall()}
+        for name, definition in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+    def _init_sync_outbox(self, cursor: sqlite3.Cursor):
+        """
+        Create the append-only event outbox the sync engine reads from.
+
+        Every state transition (entry, failed swipe, exit) appends one event in
+        the same transaction as the parking_log write, so IN and OUT of a row
+        are tracked separately. The sync cursor stores the highest outbox id
+        handled; pending work is a primary-key range scan above it, and a
+        restart resumes right after it.
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sync_outbox'")
+        is_new_outbox = cursor.fetchone() is None
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                log_id INTEGER NOT NULL REFERENCES parking_log (id),
+                event_type TEXT NOT NULL,
+                event_time TEXT NOT NULL,
+                image_path TEXT NULL,
+                gate_id TEXT NULL,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_attempt_at TEXT NULL,
+                acked_at TEXT NULL,
+                result TEXT NULL,
+                created_at TEXT NOT NULL DEFAULT (datetime('now'))
+            )
+        ''')
+        self._add_missing_columns(cursor, "sync_outbox", {"gate_id": "TEXT NULL"})
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_outbox_log_id ON sync_outbox (log_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_outbox_unacked ON sync_outbox (id) WHERE acked_at IS NULL")
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO sync_state (name, value) VALUES ('outbox_cursor', 0)")
+
+        if is_new_outbox:
+            # Queue what the old single synced_to_server flag still owed. For a
+            # completed trip we cannot tell whether its IN went out, so queue
+            # both; the idempotency key makes a repeat harmless.
+            cursor.execute("SELECT * FROM parking_log WHERE synced_to_server = 0 ORDER BY id")
+            for row in cursor.fetchall():
+                if row['status'] == STATUS_COMPLETED:
+                    self._enqueue_event(cursor, row['id'], "IN", row['time_in'], row['image_path_in'],
+                                        row['gate_in'])
+                    self._enqueue_event(cursor, row['id'], "OUT", row['time_out'] or row['time_in'],
+                                        row['image_path_out'], row['gate_out'])
+                else:
+                    self._enqueue_event(cursor, row['id'], sync_event_type(row['status']),
+                                        row['time_in'], row['image_path_in'], row['gate_in'])
+
+    def _enqueue_event(self, cursor: sqlite3.Cursor, log_id: int, event_type: str,
+                       event_time: str, image_path: Optional[str], gate_id: Optional[str] = None):
+        """Append one server event to the outbox (caller owns the transaction)."""
+        cursor.execute("""
+            INSERT OR IGNORE INTO sync_outbox (log_id, event_type, event_time, image_path, gate_id, idempotency_key)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (log_id, event_type, event_time, image_path, gate_id,
+              make_idempotency_key(self.device_uid, log_id, event_type)))
+
+    def insert_vehicle_entry(self, plate: str, rfid_token: str, time_in: str,
+                             image_path_in: Optional[str], status: int, gate_id: Optional[str] = None) -> int:
+        """Insert a new vehicle entry (at gate gate_id) and return the ID."""
+        try:
+            with self._locked_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO parking_log
+                    (plate, rfid_token, time_in, image_path_in, status, gate_in, synced_to_server)
+                    VALUES (?, ?, ?, ?, ?, ?, 0)
+                """, (plate, rfid_token, time_in, image_path_in, status, gate_id))
+                record_id = cursor.lastrowid
+                self._enqueue_event(cursor, record_id, sync_event_type(status), time_in, image_path_in, gate_id)
+
+            self._notify_change("insert")
+            return record_id
+
+        except Exception as e:
+            raise Exception(f"Database error in insert_vehicle_entry: {e}")
+
+    def get_vehicle_inside_by_rfid(self, rfid_token: str) -> Optional[sqlite3.Row]:
+        """Get vehicle record that's currently inside by RFID token."""
+        try:
+            with self._locked_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT * FROM parking_log
+                    WHERE rfid_token = ? AND status = ?
+                    ORDER BY time_in DESC LIMIT 1
+                """, (rfid_token, STATUS_INSIDE))
+                return cursor.fetchone()
+
+        except Exception as e:
+            raise Exception(f"Database error in get_vehicle_inside_by_rfid: {e}")
+
+    def is_plate_inside(self, plate: str) -> bool:
+        """Check if a plate is currently inside the parking lot."""
+        try:
+            with self._locked_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT 1 FROM parking_log WHERE plate = ? AND status = ? LIMIT 1",
+                    (plate, STATUS_INSIDE)
+                )
+                return cursor.fetchone() is not None
+
+        except Exception as e:
+            raise Exception(f"Database error in is_plate_inside: {e}")
+
+    def get_vehicles_inside(self, search_query: Optional[str] = None) -> List[Dict]:
+        """Get list of vehicles currently inside the parking lot."""
+        try:
+            with self._locked_connection() as conn:
+                cursor = conn.cursor()
+
+                query = """
+                SELECT id, plate, time_in, image_path_in, gate_in
+                FROM parking_log
+                WHERE status = ?
+                """
+                params = [STATUS_INSIDE]
+
+                if search_query:
+                    query += " AND plate LIKE ?"
+                    params.append(f"%{search_query}%")
+
+                query += " ORDER BY time_in DESC"
+
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+
+                vehicles = []
+                for row in rows:
+                    dt_obj = datetime.strptime(row['time_in'], "%Y-%m-%d %H:%M:%S")
+                    vehicles.append({
+                        'db_id': row['id'],
+                        'plate': row['plate'],
+                        'dt': dt_obj,
+                        'time_str': dt_obj.strftime('%d-%m-%Y %H:%M:%S'),
+                        'type': 'IN',
+                        'raw': row['image_path_in'],
+                        'crop': None,
+                        'gate': row['gate_in']
+                    })
+
+                return vehicles
+
+        except Exception as e:
+            raise Exception(f"Database error in get_vehicles_inside: {e}")
+
+    def update_vehicle_exit(self, record_id: int, time_out: str, image_path_out: Optional[str],
+                            gate_id: Optional[str] = None) -> bool:
+        """Update vehicle exit information (exit through gate gate_id)."""
+        try:
+            with self._locked_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE parking_log
+                    SET time_out = ?, image_path_out = ?, status = ?, gate_out = ?, synced_to_server = 0
+                    WHERE id = ? AND status = ?
+                """, (time_out, image_path_out, STATUS_COMPLETED, gate_id, record_id, STATUS_INSIDE))
+                updated = cursor.rowcount > 0
+                if updated:
+                    self._enqueue_event(cursor, record_id, "OUT", time_out, image_path_out, gate_id)
+
+            if updated:
+                self._notify_change("exit")
+            return updated
+
+        except Exception as e:
+            raise Exception(f"Database error in update_vehicle_exit: {e}")
+
+    def has_unsynced_data(self) -> bool:
+        """Check if there are any events waiting in the outbox."""
+        try:
+            with self._locked_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT 1 FROM sync_outbox
+                    WHERE id > (SELECT value FROM sync_state WHERE name = 'outbox_cursor')
+                      AND acked_at IS NULL
+                    LIMIT 1
+                """)
+                return cursor.fetchone() is not None
+
+        except Exception as e:
+            raise Exception(f"Database error in has_unsynced_data: {e}")
+
+    def get_sync_cursor(self) -> int:
+        """Outbox id up to which every event has been handled (synced or rejected)."""
+        try:
+            with self._locked_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT value FROM sync_state WHERE name = 'outbox_cursor'")
+                row = cursor.fetchone()
+                return row[0] if row else 0
+
+        except Exception as e:
+            raise Exception(f"Database error in get_sync_cursor: {e}")
+
+    @contextmanager
+    def _read_connection(self):
+        """
+        Connection for small read-only queries the web app runs often. No
+        file lock: WAL readers see a consistent snapshot and never block
+        the writer.
+        """
+        conn = self._get_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get_data_version(self) -> Optional[int]:
+        """
+        Change counter of parking_log (see _init_data_version); None if the
+        database has not been initialized with it yet.
+
+        Asked on every page view, so it runs on a connection kept open per
+        thread (a few microseconds instead of opening the database). The
+        statement finishes each time, so no read transaction stays open.
+        """
+        conn = getattr(self._local, 'version_conn', None)
+        if conn is not None and self._local.version_pid != os.getpid():
+            conn = None  # inherited across fork: never share a connection
+        try:
+            if conn is None:
+                conn = sqlite3.connect(self.db_file, timeout=10.0)
+                self._local.version_conn, self._local.version_pid = conn, os.getpid()
+            rows = conn.execute("SELECT value FROM sync_state WHERE name = 'data_version'").fetchall()
+            return rows[0][0] if rows else None
+        except sqlite3.Error:
+            self.close_connections()
+            return None
+
+    def get_dashboard_summary(self) -> Optional[Dict[str, Any]]:
+        """Occupancy, sync backlog and change markers for the live dashboard; None before init."""
+        try:
+            with self._read_connection() as conn:
+                row = conn.execute("""
+                    SELECT
+                        (SELECT COUNT(*) FROM parking_log WHERE status = ?) AS occupancy,
+                        (SELECT COUNT(*) FROM sync_outbox WHERE acked_at IS NULL) AS sync_pending,
+                        (SELECT value FROM sync_state WHERE name = 'outbox_cursor') AS sync_cursor,
+                        (SELECT value FROM sync_state WHERE name = 'data_version') AS data_version,
+                        (SELECT COALESCE(MAX(id), 0) FROM sync_outbox) AS last_event_id
+                """, (STATUS_INSIDE,)).fetchone()
+                return dict(row)
+        except sqlite3.Error:
+            return None
+
+    def get_activity_after(self, last_event_id: int, limit: int = 200) -> List[Dict[str, Any]]:
+        """
+        Gate events (entries, failed swipes, exits) recorded after an outbox
+        id, oldest first, as shown on the dashboard. The outbox is
+        append-only, so this is a primary-key range scan.
+        """
+        with self._read_connection() as conn:
+            rows = conn.execute("""
+                SELECT o.id, o.log_id, o.event_type, o.event_time, o.image_path, o.gate_id,
+                       p.plate, p.status
+                FROM sync_outbox o JOIN parking_log p ON p.id = o.log_id
+                WHERE o.id > ?
+                ORDER BY o.id
+                LIMIT ?
+            """, (last_event_id, limit)).fetchall()
+
+        events = []
+        for row in rows:
+            is_exit = row['event_type'] == "OUT"
+            try:
+                time_str = datetime.strptime(row['event_time'], "%Y-%m-%d %H:%M:%S").strftime('%d-%m-%Y %H:%M:%S')
+            except (TypeError, ValueError):
+                time_str = row['event_time']
+            events.append({
+                'id': row['id'],
+                'db_id': row['log_id'],
+                'event_type': row['event_type'],
+                'type': "OUT" if is_exit else ("INVALID" if row['status'] == STATUS_INVALID else "IN"),
+                'status': row['status'],
+                'plate': row['plate'],
+                'time_str': time_str,
+                'raw': row['image_path'],
+                'gate': row['gate_id'],
+                'inside': not is_exit and row['status'] == STATUS_INSIDE,
+            })
+        return events
+
+    def query_log_events(self, start: Optional[str] = None, end: Optional[str] = None,
+                         plate: Optional[str] = None, after: Optional[Tuple[str, int, int]] = None,
+                         limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        One page of gate events as /log shows them (IN or INVALID at time_in,
+        plus OUT at time_out for completed trips), newest first, with
+        event_time in [start, end).
+
+        Keyset pagination: `after` is the 'cursor' of the last event of the
+        previous page, (event_time, db_id, kind). Both halves are range scans
+        of idx_time_in / idx_time_out merged by SQLite, so a page costs the
+        same however deep it is. `offset` (numbered pages on /log) skips
+        rows instead, which costs more the deeper the page.
+        """
+        conditions = {"in": ["1 = 1"], "out": ["status = ?"]}
+        params = {"in": [], "out": [STATUS_COMPLETED]}
+        for side, column, kind in (("in", "time_in", 0), ("out", "time_out", 1)):
+            if start:
+                conditions[side].append(f"{column} >= ?")
+                params[side].append(start)
+            if end:
+                conditions[side].append(f"{column} < ?")
+                params[side].append(end)
+            if plate:
+                conditions[side].append("plate LIKE ?")
+                params[side].append(f"%{plate}%")
+            if after:
+                conditions[side].append(f"({column}, id, {kind}) < (?, ?, ?)")
+                params[side].extend(after)
+
+        query = f"""
+            SELECT id AS db_id, 0 AS kind, time_in AS event_time, plate, rfid_token, status,
+                   gate_in AS gate, image_path_in AS image
+            FROM parking_log WHERE {" AND ".join(conditions["in"])}
+            UNION ALL
+            SELECT id, 1, time_out, plate, rfid_token, status, gate_out, image_path_out
+            FROM parking_log WHERE {" AND ".join(conditions["out"])}
+            ORDER BY event_time DESC, db_id DESC, kind DESC
+            LIMIT ? OFFSET ?
+        """
+        with self._read_connection() as conn:
+            rows = conn.execute(query, params["in"] + params["out"] + [limit, max(offset, 0)]).fetchall()
+
+        events = []
+        for row in rows:
+            if row['kind'] == 1:
+                event_type = "OUT"
+            else:
+                event_type = "INVALID" if row['status'] == STATUS_INVALID else "IN"
+            events.append({
+                'db_id': row['db_id'],
+                'type': event_type,
+                'event_time': row['event_time'],
+                'plate': row['plate'],
+                'rfid_token': row['rfid_token'],
+                'status': row['status'],
+                'gate': row['gate'],
+                'image': row['image'],
+                'cursor': (row['event_time'], row['db_id'], row['kind']),
+            })
+        return events
+
+    def count_log_events(self, plate: Optional[str] = None) -> int:
+        """Number of events query_log_events would list (for page counts)."""
+        plate_condition = " AND plate LIKE ?" if plate else ""
+        plate_params = [f"%{plate}%"] if plate else []
+        with self._read_connection() as conn:
+            row = conn.execute(f"""
+                SELECT (SELECT COUNT(*) FROM parking_log WHERE 1 = 1{plate_condition})
+                     + (SELECT COUNT(*) FROM parking_log WHERE status = ?{plate_condition})
+            """, plate_params + [STATUS_COMPLETED] + plate_params).fetchone()
+        return row[0]
+
+    def query_records(self, start: Optional[str] = None, end: Optional[str] = None,
+                      plate: Optional[str] = None, status: Optional[int] = None,
+                      after: Optional[int] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        One page of parking_log rows (one per trip), newest id first, with
+        time_in in [start, end). Keyset pagination on the primary key:
+        `after` is the id of the last row of the previous page.
+        """
+        conditions, params = ["1 = 1"], []
+        if start:
+            conditions.append("time_in >= ?")
+            params.append(start)
+        if end:
+            conditions.append("time_in < ?")
+            params.append(end)
+        if plate:
+            conditions.append("plate LIKE ?")
+            params.append(f"%{plate}%")
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if after is not None:
+            conditions.append("id < ?")
+            params.append(after)
+
+        with self._read_connection() as conn:
+            rows = conn.execute(f"""
+                SELECT id, plate, rfid_token, time_in, time_out, status, gate_in, gate_out,
+                       image_path_in, image_path_out
+                FROM parking_log WHERE {" AND ".join(conditions)}
+                ORDER BY id DESC
+                LIMIT ?
+            """, params + [limit]).fetchall()
+        return [dict(row, cursor=row['id']) for row in rows]
+
+    @staticmethod
+    def iter_pages(query_page: Callable[..., List[Dict[str, Any]]], batch_size: int = 500,
+                   **filters) -> Iterator[Dict[str, Any]]:
+        """
+        Every row of a keyset-paginated query (query_log_events,
+        query_records) in order, fetched batch_size rows per short read
+        transaction: memory stays flat and the gate writer is never blocked
+        by a long export.
+        """
+        after = filters.pop('after', None)
+        while True:
+            page = query_page(after=after, limit=batch_size, **filters)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after = page[-1]['cursor']
+
+    def get_statistics(self, start: str, end: Optional[str] = None) -> Optional[Dict[str, int]]:
+        """Entries, exits and failed swipes in [start, end) plus current occupancy; None on DB error."""
+        end = end or "9999-12-31 23:59:59"
+        try:
+            with self._read_connection() as conn:
+                row = conn.execute("""
+                    SELECT
+                        (SELECT COUNT(id) FROM parking_log
+                         WHERE time_in >= ? AND time_in < ? AND status IN (?, ?)) AS total_in,
+                        (SELECT COUNT(id) FROM parking_log
+                         WHERE status = ? AND time_out >= ? AND time_out < ?) AS total_out,
+                        (SELECT COUNT(id) FROM parking_log
+                         WHERE time_in >= ? AND time_in < ? AND status NOT IN (?, ?)) AS total_fail,
+                        (SELECT COUNT(*) FROM parking_log WHERE status = ?) AS occupancy
+                """, (start, end, STATUS_INSIDE, STATUS_COMPLETED,
+                      STATUS_COMPLETED, start, end,
+                      start, end, STATUS_INSIDE, STATUS_COMPLETED,
+                      STATUS_INSIDE)).fetchone()
+                return dict(row)
+        except sqlite3.Error:
+            return None
+
+    def record_event_trace(self, trace: "EventTrace") -> bool:
+        """Store a closed swipe trace next to its parking_log row; False if it has no event."""
+        if trace.log_id is None or trace.total is None:
+            return False
+        columns = ", ".join(f"{stage}_us" for stage in TRACE_STAGES)
+        stage_values = [round(trace.stages[stage] * 1e6) if stage in trace.stages else None
+                        for stage in TRACE_STAGES]
+        try:
+            with self._locked_connection() as conn:
+                conn.execute(f"""
+                    INSERT OR REPLACE INTO event_trace (log_id, kind, lane, created_at, total_us, {columns})
+                    VALUES (?, ?, ?, ?, ?, {", ".join("?" * len(TRACE_STAGES))})
+                """, [trace.log_id, trace.kind or TRACE_KIND_ENTRY, trace.lane_id, get_vietnam_time_str(),
+                      round(trace.total * 1e6)] + stage_values)
+            return True
+
+        except Exception as e:
+            raise Exception(f"Database error in record_event_trace: {e}")
+
+    def get_trace_percentiles(self, start: str, end: Optional[str] = None,
+                              limit: int = 5000) -> Optional[Dict[str, Any]]:
+        """
+        p50/p95/p99/max (ms) of the total and of every stage over the newest
+        `limit` swipe traces in [start, end); None on DB error.
+        """
+        end = end or "9999-12-31 23:59:59"
+        columns = ["total"] + list(TRACE_STAGES)
+        try:
+            with self._read_connection() as conn:
+                rows = conn.execute(f"""
+                    SELECT {", ".join(f"{column}_us" for column in columns)}
+                    FROM event_trace
+                    WHERE created_at >= ? AND created_at < ?
+                    ORDER BY created_at DESC
+                    LIMIT ?
+                """, (start, end, limit)).fetchall()
+        except sqlite3.Error:
+            return None
+
+        summary = {'events': len(rows), 'stages': []}
+        for index, column in enumerate(columns):
+            values = sorted(row[index] / 1000.0 for row in rows if row[index] is not None)
+            stats = {'stage': column, 'count': len(values)}
+            for q in (50, 95, 99):
+                value = percentile(values, q)
+                stats[f'p{q}'] = round(value, 1) if value is not None else None
+            stats['max'] = round(values[-1], 1) if values else None
+            if column == "total":
+                summary['total'] = stats
+            else:
+                summary['stages'].append(stats)
+        return summary
+
+    def get_slow_traces(self, start: str, end: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Slowest swipes in [start, end) with their stage breakdown (ms), plate and picture."""
+        end = end or "9999-12-31 23:59:59"
+        with self._read_connection() as conn:
+            rows = conn.execute("""
+                SELECT t.*, p.plate, p.status, p.rfid_token,
+                       CASE t.kind WHEN 1 THEN p.image_path_out ELSE p.image_path_in END AS image
+                FROM event_trace t JOIN parking_log p ON p.id = t.log_id
+                WHERE t.created_at >= ? AND t.created_at < ?
+                ORDER BY t.total_us DESC
+                LIMIT ?
+            """, (start, end, limit)).fetchall()
+
+        traces = []
+        for row in rows:
+            stages = {stage: row[f"{stage}_us"] / 1000.0 for stage in TRACE_STAGES if row[f"{stage}_us"] is not None}
+            total = row['total_us'] / 1000.0
+            if row['kind'] == TRACE_KIND_EXIT:
+                event_type = "OUT"
+            elif row['status'] in (STATUS_INSIDE, STATUS_COMPLETED):
+                event_type = "IN"
+            else:
+                event_type = sync_event_type(row['status'])  # refused swipe: NO_PLATE_DETECTED, ...
+            traces.append({
+                'log_id': row['log_id'],
+                'type': event_type,
+                'lane': row['lane'],
+                'created_at': row['created_at'],
+                'plate': row['plate'],
+                'image': row['image'],
+                'total_ms': round(total, 1),
+                'stages_ms': {stage: round(value, 1) for stage, value in stages.items()},
+                'other_ms': round(max(total - sum(stages.values()), 0.0), 1),
+            })
+        return traces
+
+    def get_pending_events(self, limit: int = 1) -> List[sqlite3.Row]:
+        """Outbox events after the cursor, oldest first, with their parking_log fields."""
+        try:
+            with self._locked_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT o.*, p.plate, p.rfid_token
+                    FROM sync_outbox o
+                    JOIN parking_log p ON p.id = o.log_id
+                    WHERE o.id > (SELECT value FROM sync_state WHERE name = 'outbox_cursor')
+                      AND o.acked_at IS NULL
+                    ORDER BY o.id ASC
+                    LIMIT ?
+                """, (limit,))
+                return cursor.fetchall()
+
+        except Exception as e:
+            raise Exception(f"Database error in get_pending_events: {e}")
+
+    def begin_event_attempt(self, event: sqlite3.Row) -> int:
+        """Count a send attempt before it goes out; returns the attempt number."""
+        try:
+            with self._locked_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE sync_outbox
+                    SET attempts = attempts + 1, last_attempt_at = datetime('now')
+                    WHERE id = ?
+                """, (event['id'],))
+                cursor.execute("SELECT attempts FROM sync_outbox WHERE id = ?", (event['id'],))
+                return cursor.fetchone()[0]
+
+        except Exception as e:
+            raise Exception(f"Database error in begin_event_attempt: {e}")
+
+    def complete_event(self, event: sqlite3.Row, invalid: bool = False) -> bool:
+        """
+        Atomically acknowledge an outbox event and advance the cursor.
+
+        A rejected event marks its parking_log row invalid. The row's legacy
+        synced_to_server flag is set once none of its events are pending.
+        Returns True if the row is now fully synced.
+        """
+        try:
+            with self._locked_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE sync_outbox SET acked_at = datetime('now'), result = ?
+                    WHERE id = ?
+                """, ('rejected' if invalid else 'synced', event['id']))
+                # The cursor only moves over a fully acknowledged prefix, so an
+                # event that failed inside a batch is never skipped
+                cursor.execute("""
+                    UPDATE sync_state SET value = MAX(value, COALESCE(
+                        (SELECT MIN(id) - 1 FROM sync_outbox WHERE acked_at IS NULL),
+                        (SELECT MAX(id) FROM sync_outbox)
+                    ))
+                    WHERE name = 'outbox_cursor'
+                """)
+                if invalid:
+                    cursor.execute("UPDATE parking_log SET status = ? WHERE id = ?",
+                                   (STATUS_INVALID, event['log_id']))
+                cursor.execute("""
+                    UPDATE parking_log SET synced_to_server = 1
+                    WHERE id = ? AND NOT EXISTS (
+                        SELECT 1 FROM sync_outbox WHERE log_id = ? AND acked_at IS NULL
+                    )
+                """, (event['log_id'], event['log_id']))
+                fully_synced = cursor.rowcount > 0
+
+        except Exception as e:
+            raise Exception(f"Database error in complete_event: {e}")
+
+        self._notify_change("sync")
+        return fully_synced
+
+    def close_connections(self):
+        """Close this thread's data_version connection; all others are opened per operation."""
+        conn = getattr(self._local, 'version_conn', None)
+        self._local.version_conn = None
+        if conn is not None and self._local.version_pid == os.getpid():
+            conn.close()
 
 # === NETWORK MANAGER ===
-class NetworkManager:
-    """Handle network operations and server synchronization."""
-    
-    def __init__(self, server_url: str):
-        self.server_url = server_url
+class SyncResult(Enum):
+    """Enumeration for sync operation results."""
+    SUCCESS = "success"
+    TEMPORARY_FAILURE = "temporary_failure"
+    PERMANENT_FAILURE = "permanent_failure"
+    NETWORK_ERROR = "network_error"
+    CIRCUIT_OPEN = "circuit_open"
+
+
+class CircuitState(Enum):
+    """States of the server circuit breaker."""
+    CLOSED = "closed"        # Server reachable, requests flow normally
+    OPEN = "open"            # Server unreachable, requests fail fast
+    HALF_OPEN = "half_open"  # Cooldown elapsed, a single trial request is allowed
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker shared by all server sync work.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    every request fails fast until `reset_timeout` has elapsed. One trial
+    request is then let through (half-open): success closes the circuit,
+    failure re-opens it with a doubled cooldown (capped at `max_reset_timeout`).
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 10.0,
+                 max_reset_timeout: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+
         self._lock = threading.Lock()
-    
-    def sync_record(self, record_data: Dict) -> bool:
-        """Sync a single record to server (mock implementation)."""
+        self._state = CircuitState.CLOSED
+        self._consecutive_failures = 0
+        self._reset_timeout = reset_timeout
+        self._opened_at = 0.0
+        self._trial_started_at = None
+        self._listeners: List[Callable[[CircuitState], None]] = []
+
+    @property
+    def state(self) -> CircuitState:
+        """Current state (no transition is triggered by reading it)."""
         with self._lock:
-            try:
-                # Mock successful sync - replace with actual HTTP request
-                time.sleep(0.1)  # Simulate network delay
-                print(f"✅ [Network] Server accepted event {record_data.get('id', 'unknown')}")
+            return self._state
+
+    def add_listener(self, callback: Callable[[CircuitState], None]):
+        """Register a callback invoked with the new state on every transition."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def seconds_until_trial(self) -> float:
+        """Seconds left before an open circuit allows a trial request."""
+        with self._lock:
+            if self._state != CircuitState.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self._reset_timeout - time.monotonic())
+
+    def allow_request(self) -> bool:
+        """Return True if a request may be sent now (fast-fail path when open)."""
+        transitioned = False
+        with self._lock:
+            now = time.monotonic()
+            if self._state == CircuitState.CLOSED:
                 return True
-            except Exception as e:
-                print(f"❌ [Network] Failed to sync record: {e}")
+
+            if self._state == CircuitState.OPEN:
+                if now - self._opened_at < self._reset_timeout:
+                    return False
+                self._state = CircuitState.HALF_OPEN
+                self._trial_started_at = now
+                transitioned = True
+            elif self._trial_started_at is not None and now - self._trial_started_at < self._reset_timeout:
+                # Half-open with a trial still in flight
                 return False
+            else:
+                # Previous trial never reported back; let another one through
+                self._trial_started_at = now
 
-# === CAMERA MANAGER ===
-class SafeCameraManager:
-    """Safe camera operations with hardware abstraction."""
-    
-    def __init__(self, mock_mode: bool = False):
-        self.mock_mode = mock_mode
-        self._lock = threading.Lock()
-    
-    def capture_image(self, output_path: str) -> bool:
-        """Capture image from camera."""
+        if transitioned:
+            self._notify(CircuitState.HALF_OPEN)
+        return True
+
+    def record_success(self):
+        """Report a request that reached the server."""
         with self._lock:
+            self._consecutive_failures = 0
+            self._trial_started_at = None
+            if self._state == CircuitState.CLOSED:
+                return
+            self._state = CircuitState.CLOSED
+            self._reset_timeout = self.base_reset_timeout
+        self._notify(CircuitState.CLOSED)
+
+    def record_failure(self):
+        """Report a request that could not reach the server."""
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == CircuitState.HALF_OPEN:
+                self._reset_timeout = min(self._reset_timeout * 2, self.max_reset_timeout)
+            elif self._state == CircuitState.OPEN or self._consecutive_failures < self.failure_threshold:
+                return
+            self._state = CircuitState.OPEN
+            self._opened_at = time.monotonic()
+            self._trial_started_at = None
+        self._notify(CircuitState.OPEN)
+
+    def _notify(self, new_state: CircuitState):
+        """Call listeners outside the lock so they may query the breaker."""
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
             try:
-                if self.mock_mode:
-                    # Create a simple mock image file
-                    with open(output_path, 'w') as f:
-                        f.write("mock_image_data")
-                    return True
+                callback(new_state)
+            except Exception as e:
+                print(f"⚠️  [Network] Circuit listener error: {e}")
+
+
+class NetworkManager:
+    """Handle network operations and server synchronization."""
+
+    def __init__(self, api_endpoint: str, error_logger: SafeErrorLogger,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        self.api_endpoint = api_endpoint
+        self.error_logger = error_logger
+        self._lock = threading.Lock()
+
+        # Network configuration
+        self.connect_timeout = 10.0    # Connection timeout
+        self.read_timeout = 30.0       # Read timeout
+        self.max_retries = 3           # Max retry attempts
+        self.retry_delay = 2.0         # Delay between retries
+        self.health_timeout = (2.0, 3.0)
+
+        # Shared by every caller so one dead server is detected once
+        self.circuit_breaker = circuit_breaker or CircuitBreaker(
+            failure_threshold=Config.CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=Config.CIRCUIT_RESET_TIMEOUT,
+            max_reset_timeout=Config.CIRCUIT_MAX_RESET_TIMEOUT
+        )
+
+        # Session for connection reuse
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'ParkingSystem/1.0',
+            'Accept': 'application/json'
+        })
+
+    @property
+    def health_url(self) -> str:
+        """Health-check URL derived from the submit endpoint."""
+        return self.api_endpoint.replace('/submit', '/health')
+
+    @property
+    def batch_url(self) -> str:
+        """Batch submit URL derived from the submit endpoint."""
+        return self.api_endpoint.replace('/submit', '/submit_batch')
+
+    def _make_request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Make HTTP request with proper timeout and error handling."""
+        if 'timeout' not in kwargs:
+            kwargs['timeout'] = (self.connect_timeout, self.read_timeout)
+
+        endpoint = urlsplit(url).path or "/"
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            SERVER_REQUESTS.inc(endpoint=endpoint, status=type(e).__name__)
+            raise
+        finally:
+            SERVER_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        SERVER_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+        return response
+
+    def _is_retryable_error(self, e: Exception) -> bool:
+        """Determine if an error is retryable."""
+        if isinstance(e, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+            return True
+        elif isinstance(e, requests.exceptions.RequestException):
+            if getattr(e, 'response', None) is not None:
+                # Retry on 5xx server errors
+                return 500 <= e.response.status_code < 600
+            return True
+        return False
+
+    def is_server_available(self) -> bool:
+        """False while the circuit is open or probing, so callers can skip sync work."""
+        return self.circuit_breaker.state == CircuitState.CLOSED
+
+    def sync_record(self, event: Dict, uid: Optional[str] = None,
+                    picture_dir: Optional[str] = None) -> bool:
+        """Sync a single outbox event (payload + image) to the server."""
+        event_payload, image_filename = build_sync_event(event, uid)
+        image_bytes = read_event_image(picture_dir or Config.PICTURE_OUTPUT_DIR, image_filename)
+        return self.send_event_to_server(event_payload, image_bytes,
+                                         event['idempotency_key']) == SyncResult.SUCCESS
+
+    def _post_with_retries(self, url: str, log_identifier: Any,
+                           **request_kwargs) -> Tuple[SyncResult, Optional[requests.Response]]:
+        """
+        POST with retries, feeding every outcome into the circuit breaker.
+
+        Returns the overall result and, on success, the response so batch
+        callers can read per-event results from it.
+        """
+        for attempt in range(self.max_retries):
+            try:
+                response = self._make_request('POST', url, **request_kwargs)
+
+                if 200 <= response.status_code < 300:
+                    self.circuit_breaker.record_success()
+                    return SyncResult.SUCCESS, response
+
+                elif 400 <= response.status_code < 500:
+                    # Client error - server is up, but don't retry this payload
+                    self.circuit_breaker.record_success()
+                    error_msg = f"Server rejected event {log_identifier} (Client Error: {response.status_code}): {response.text[:200]}"
+                    print(f"❌ [Network] {error_msg}")
+                    self.error_logger.log_error(error_msg, "SERVER_RESPONSE")
+                    return SyncResult.PERMANENT_FAILURE, response
+
                 else:
-                    # TODO: Implement actual camera capture
-                    return False
+                    self.circuit_breaker.record_failure()
+                    error_msg = f"Server error for event {log_identifier} (Code: {response.status_code})"
+                    print(f"❌ [Network] {error_msg}")
+                    self.error_logger.log_error(f"{error_msg}: {response.text[:200]}", "SERVER_RESPONSE")
+
+                    if attempt < self.max_retries - 1 and self.circuit_breaker.allow_request():
+                        print(f"🔄 [Network] Retrying in {self.retry_delay} seconds... (attempt {attempt + 2}/{self.max_retries})")
+                        time.sleep(self.retry_delay)
+                        continue
+                    return SyncResult.TEMPORARY_FAILURE, None
+
+            except requests.exceptions.RequestException as e:
+                self.circuit_breaker.record_failure()
+                error_msg = f"Network error for event {log_identifier}: {str(e)[:200]}"
+                print(f"❌ [Network] {error_msg}")
+                self.error_logger.log_error(error_msg, "NETWORK", e)
+
+                if not self.circuit_breaker.allow_request():
+                    print("🔌 [Network] Server unreachable, circuit opened. Sync paused until it recovers.")
+                    return SyncResult.CIRCUIT_OPEN, None
+
+                if self._is_retryable_error(e) and attempt < self.max_retries - 1:
+                    print(f"🔄 [Network] Retrying in {self.retry_delay} seconds... (attempt {attempt + 2}/{self.max_retries})")
+                    time.sleep(self.retry_delay)
+                    continue
+
+                return SyncResult.NETWORK_ERROR, None
+
             except Exception as e:
-                print(f"❌ [Camera] Error capturing image: {e}")
-                return False
+                # Still counts against the breaker: otherwise an unexpected
+                # error never opens the circuit and leaves a half-open trial hanging
+                self.circuit_breaker.record_failure()
+                error_msg = f"Unexpected error sending event {log_identifier}: {str(e)[:200]}"
+                print(f"🔥 [Network] {error_msg}")
+                self.error_logger.log_error(error_msg, "NETWORK", e)
+                if not self.circuit_breaker.allow_request():
+                    return SyncResult.CIRCUIT_OPEN, None
+                return SyncResult.NETWORK_ERROR, None
+
+        return SyncResult.TEMPORARY_FAILURE, None
+
+    @staticmethod
+    def _to_server_payload(event_payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Server expects 'token' instead of 'rfid_token'."""
+        if 'rfid_token' not in event_payload:
+            return event_payload
+        event_payload = event_payload.copy()
+        event_payload['token'] = event_payload.pop('rfid_token')
+        return event_payload
+
+    def send_event_to_server(self, event_payload: Dict[str, Any],
+                             image_data_bytes: Optional[bytes] = None,
+                             idempotency_key: Optional[str] = None) -> SyncResult:
+        """
+        Send event to server with retries and proper error handling.
+
+        The optional idempotency key goes out as the Idempotency-Key header so
+        the server can ignore re-sends. Fails fast with SyncResult.CIRCUIT_OPEN
+        while the server is known to be down.
+        """
+        if not self.circuit_breaker.allow_request():
+            return SyncResult.CIRCUIT_OPEN
+
+        log_identifier = event_payload.get('device_db_id') or event_payload.get('timestamp')
+        print(f"📡 [Network] Preparing to send event: ID/Time {log_identifier}, Type: {event_payload.get('event_type')}")
+        event_payload = self._to_server_payload(event_payload)
+        headers = {'Idempotency-Key': idempotency_key} if idempotency_key else None
+
+        if image_data_bytes:
+            # Send as multipart/form-data
+            files_payload = {'image': (f"img_{log_identifier}.jpg", image_data_bytes, 'image/jpeg')}
+            result, _ = self._post_with_retries(self.api_endpoint, log_identifier, headers=headers,
+                                                data=event_payload, files=files_payload)
+        else:
+            # Send as application/json
+            result, _ = self._post_with_retries(self.api_endpoint, log_identifier, headers=headers,
+                                                json=event_payload)
+
+        if result == SyncResult.SUCCESS:
+            print(f"✅ [Network] Server accepted event {log_identifier}")
+        return result
+
+    def send_events_batch(self, events: List[Tuple[Dict[str, Any], Optional[bytes], Optional[str]]]) -> List[SyncResult]:
+        """
+        Send several (payload, image bytes, idempotency key) events in one
+        multipart request to the batch endpoint.
+
+        The form field 'events' holds a JSON list of payloads and the image of
+        event i (if any) is attached as file 'image_<i>'. Per-event idempotency
+        keys travel in each payload's 'idempotency_key' field. Returns one
+        SyncResult per event, in order; a failed request yields the same result
+        for all.
+        """
+        if not events:
+            return []
+        if not self.circuit_breaker.allow_request():
+            return [SyncResult.CIRCUIT_OPEN] * len(events)
+
+        first_id = events[0][0].get('device_db_id')
+        last_id = events[-1][0].get('device_db_id')
+        log_identifier = f"{first_id}..{last_id}"
+        print(f"📡 [Network] Preparing to send batch of {len(events)} events: ID {log_identifier}")
+
+        payloads = []
+        files_payload = {}
+        for index, (event_payload, image_data_bytes, idempotency_key) in enumerate(events):
+            server_payload = dict(self._to_server_payload(event_payload))
+            if idempotency_key:
+                server_payload['idempotency_key'] = idempotency_key
+            payloads.append(server_payload)
+            if image_data_bytes:
+                files_payload[f'image_{index}'] = (f"img_{event_payload.get('device_db_id')}.jpg",
+                                                   image_data_bytes, 'image/jpeg')
+
+        result, response = self._post_with_retries(
+            self.batch_url, log_identifier,
+            data={'events': json.dumps(payloads)}, files=files_payload or None
+        )
+        if result != SyncResult.SUCCESS:
+            return [result] * len(events)
+
+        try:
+            statuses = [item.get('status', 200) for item in response.json().get('results', [])]
+        except ValueError:
+            statuses = []
+        if len(statuses) != len(events):
+            # Server accepted the request as a whole without per-event detail
+            statuses = [200] * len(events)
+
+        results = []
+        for status in statuses:
+            if 200 <= status < 300:
+                results.append(SyncResult.SUCCESS)
+            elif 400 <= status < 500:
+                results.append(SyncResult.PERMANENT_FAILURE)
+            else:
+                results.append(SyncResult.TEMPORARY_FAILURE)
+        print(f"✅ [Network] Server accepted batch {log_identifier} "
+              f"({results.count(SyncResult.SUCCESS)}/{len(events)} events)")
+        return results
+
+    def test_connection(self) -> bool:
+        """Probe the server's /health endpoint; any non-5xx answer means reachable."""
+        try:
+            response = self._make_request('GET', self.health_url, timeout=self.health_timeout)
+            return response.status_code < 500
+        except Exception as e:
+            print(f"🔌 [Network] Connection test failed: {e}")
+            return False
+
+    def close(self):
+        """Close the session."""
+        if self.session:
+            self.session.close()
+
+
+class ConnectivityMonitor:
+    """
+    Background watcher that brings an open circuit back to closed.
+
+    While the circuit is open it probes the /health endpoint (instead of
+    spending full sync attempts) once each cooldown expires. When the server
+    answers again the circuit closes and `on_recovered` is called so the
+    sync backlog drains immediately.
+    """
+
+    def __init__(self, network_manager: NetworkManager,
+                 on_recovered: Optional[Callable[[], None]] = None,
+                 poll_interval: float = 1.0):
+        self.network_manager = network_manager
+        self.circuit_breaker = network_manager.circuit_breaker
+        self.on_recovered = on_recovered
+        self.poll_interval = poll_interval
+
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.circuit_breaker.add_listener(self._on_state_change)
+
+    def _on_state_change(self, new_state: CircuitState):
+        if new_state == CircuitState.OPEN:
+            print("🔌 [Network] Server marked unreachable. Sync will fail fast until it recovers.")
+            self._wake_event.set()
+        elif new_state == CircuitState.CLOSED:
+            print("🌐 [Network] Server reachable again. Draining sync backlog.")
+            if self.on_recovered:
+                self.on_recovered()
+
+    def start(self):
+        """Start the monitor thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ConnectivityMonitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the monitor thread."""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2.0)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if self.circuit_breaker.state == CircuitState.CLOSED:
+                # Healthy: real sync traffic keeps the breaker up to date
+                self._wake_event.wait()
+                self._wake_event.clear()
+                continue
+
+            wait_time = self.circuit_breaker.seconds_until_trial()
+            if wait_time > 0:
+                self._stop_event.wait(min(wait_time, self.poll_interval))
+                continue
+
+            if self.circuit_breaker.allow_request():
+                if self.network_manager.test_connection():
+                    self.circuit_breaker.record_success()
+                else:
+                    self.circuit_breaker.record_failure()
+            else:
+                # A sync request holds the half-open trial; check back shortly
+                self._stop_event.wait(self.poll_interval)
+
+
+def create_event_payload(uid: str, plate: str, rfid_token: str, timestamp: str,
+                         event_type: str, details: str, device_db_id: int,
+                         gate_id: Optional[str] = None) -> Dict[str, Any]:
+    """Create a properly formatted event payload for the server."""
+    payload = {
+        "uid": uid,
+        "plate": plate,
+        "rfid_token": rfid_token,  # Will be renamed to 'token' in NetworkManager
+        "timestamp": timestamp,
+        "event_type": event_type,
+        "details": details,
+        "device_db_id": device_db_id
+    }
+    if gate_id is not None:
+        payload["gate_id"] = gate_id  # Only sent when the lane has a gate ID configured
+    return payload
+
+
+def make_idempotency_key(uid: Optional[str], device_db_id: int, event_type: str) -> str:
+    """Stable per-event key so the server can drop re-sends after a crash."""
+    return f"{uid}:{device_db_id}:{event_type}"
+
+
+# parking_log status at insert time -> server event type (exits are always "OUT")
+SYNC_EVENT_TYPES = {
+    STATUS_INSIDE: "IN",
+    STATUS_FAIL_NO_PLATE: "NO_PLATE_DETECTED",
+    STATUS_FAIL_PLATE_INSIDE: "TOKEN_DUPLICATED",
+    STATUS_FAIL_PLATE_MISMATCH: "PLATE_MISMATCH",
+}
+
+SYNC_EVENT_ERRORS = {
+    "NO_PLATE_DETECTED": "AI không nhận dạng được biển số.",
+    "TOKEN_DUPLICATED": "Biển số đã có trong bãi với thẻ khác.",
+    "PLATE_MISMATCH": "Biển số ra không khớp biển số vào.",
+    "FAIL_OUT": "Lỗi hệ thống không xác định.",
+}
+
+
+def sync_event_type(status: int) -> str:
+    """Server event type for a parking_log row inserted with this status."""
+    return SYNC_EVENT_TYPES.get(status, "FAIL_OUT")
+
+
+def build_sync_event(event: Dict[str, Any], uid: Optional[str]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Map a sync_outbox row (joined with plate/rfid_token) to its server event.
+
+    Returns (event payload, image file name or None).
+    """
+    event_type = event['event_type']
+    details_payload = f"DB_ID: {event['log_id']}"
+    if event_type in SYNC_EVENT_ERRORS:
+        details_payload += f" - Lỗi: {SYNC_EVENT_ERRORS[event_type]}"
+
+    event_payload = create_event_payload(
+        uid=uid,
+        plate=event['plate'],
+        rfid_token=event['rfid_token'],
+        timestamp=event['event_time'],
+        event_type=event_type,
+        details=details_payload,
+        device_db_id=event['log_id'],
+        gate_id=event['gate_id']
+    )
+    return event_payload, event['image_path']
+
+
+def read_event_image(picture_dir: str, image_filename: Optional[str]) -> Optional[bytes]:
+    """
+    Event image bytes: from the in-memory cache when this process wrote it
+    recently, else from disk. None if there is no file; raises IOError on
+    read errors.
+    """
+    if not image_filename:
+        return None
+    cached = event_image_cache.get(image_filename)
+    if cached is not None:
+        return cached
+    full_image_path = os.path.join(picture_dir, image_filename)
+    if not os.path.exists(full_image_path):
+        return None
+    with open(full_image_path, 'rb') as img_file:
+        return img_file.read()
+
+# === IMAGE CODEC ===
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+except ImportError:  # Optional: PyTurboJPEG + libjpeg-turbo
+    TurboJPEG = None
+
+
+class ImageCodec:
+    """
+    JPEG encode/decode shared by event saving, live view and sync.
+
+    Uses libjpeg-turbo (PyTurboJPEG) when it is installed, OpenCV otherwise.
+    Resize targets are reused per thread and size, so steady-state live
+    view does not allocate a new frame buffer for every resize.
+    """
+
+    BACKENDS = ("auto", "turbojpeg", "opencv")
+
+    def __init__(self, backend: str = "auto"):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown image codec '{backend}' (choose from {', '.join(self.BACKENDS)})")
+        self._turbo = None
+        if backend in ("auto", "turbojpeg"):
+            try:
+                if TurboJPEG is None:
+                    raise ImportError("PyTurboJPEG is not installed")
+                self._turbo = TurboJPEG()
+            except Exception as e:
+                if backend == "turbojpeg":
+                    raise
+                print(f"⚠️  [Codec] libjpeg-turbo unavailable ({e}), using OpenCV")
+        self.name = "turbojpeg" if self._turbo else "opencv"
+        self._buffers = threading.local()
+
+    def encode(self, frame: np.ndarray, quality: int = 85) -> bytes:
+        """Encode a BGR (or grayscale) frame as JPEG bytes."""
+        if self._turbo:
+            return self._turbo.encode(frame, quality=quality, pixel_format=TJPF_BGR,
+                                      jpeg_subsample=TJSAMP_420)
+        ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        if not ok:
+            raise ValueError("OpenCV could not encode the frame as JPEG")
+        return buf.tobytes()
+
+    def decode(self, data: bytes, scale: int = 1) -> Optional[np.ndarray]:
+        """Decode JPEG bytes to BGR, optionally downscaled by 2, 4 or 8 while decoding."""
+        if self._turbo:
+            return self._turbo.decode(data, pixel_format=TJPF_BGR, scaling_factor=(1, scale))
+        flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}[scale]
+        return cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+
+    def resize(self, frame: np.ndarray, width: int) -> np.ndarray:
+        """
+        Downscale to width (keeping aspect) into a reused per-thread buffer.
+        The result is only valid until the next resize to the same size on
+        this thread; copy it to keep it.
+        """
+        if not width or frame.shape[1] <= width:
+            return frame
+        height = int(round(frame.shape[0] * width / frame.shape[1]))
+        shape = (height, width) + frame.shape[2:]
+        buffers = getattr(self._buffers, "resize", None)
+        if buffers is None:
+            buffers = self._buffers.resize = {}
+        target = buffers.get(shape)
+        if target is None or target.dtype != frame.dtype:
+            target = buffers[shape] = np.empty(shape, dtype=frame.dtype)
+        return cv2.resize(frame, (width, height), dst=target, interpolation=cv2.INTER_AREA)
+
+    def encode_resized(self, frame: np.ndarray, width: int = 0, quality: int = 85) -> bytes:
+        return self.encode(self.resize(frame, width), quality)
+
+
+_image_codec: Optional[ImageCodec] = None
+_image_codec_lock = threading.Lock()
+
+
+def get_image_codec() -> ImageCodec:
+    """Process-wide codec chosen by IMAGE_CODEC (auto | turbojpeg | opencv)."""
+    global _image_codec
+    with _image_codec_lock:
+        if _image_codec is None:
+            _image_codec = ImageCodec(Config.IMAGE_CODEC)
+            print(f"🖼️  [Codec] Using {_image_codec.name} for JPEG")
+        return _image_codec
+
+
+class EncodedImageCache:
+    """
+    Recently written event JPEGs kept in memory (LRU, bounded by bytes), so
+    the sync thread uploads the bytes that were just encoded instead of
+    reading the file back from the SD card.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, filename: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(filename, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[filename] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def get(self, filename: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(filename)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(filename)
+            self.hits += 1
+            return data
+
+
+event_image_cache = EncodedImageCache()
+
+
+def write_file_atomic(path: str, data: bytes, fsync: bool = False):
+    """
+    Write bytes via a temp file + rename so readers never see a partial file.
+    The temp name is unique per process and thread, so concurrent writers of
+    the same path never share one; the last rename wins. With fsync the data
+    and the rename (directory entry) reach the disk before this returns.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if fsync and hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def save_event_image(picture_dir: str, filename: str, frame: np.ndarray,
+                     quality: Optional[int] = None, fsync: bool = False) -> bytes:
+    """
+    Encode an event frame once, write it to picture_dir and keep the bytes
+    for the sync upload. Returns the JPEG bytes.
+    """
+    jpeg_bytes = get_image_codec().encode(frame, quality or Config.EVENT_JPEG_QUALITY)
+    write_file_atomic(os.path.join(picture_dir, filename), jpeg_bytes, fsync=fsync)
+    event_image_cache.put(filename, jpeg_bytes)
+    return jpeg_bytes
+
+
+class AsyncImageWriter:
+    """
+    Encode and write event images on a background thread.
+
+    submit() only queues the frame, so the gate decision, DB write and LED
+    do not wait for the SD card; the filename can be stored right away.
+    The queue is bounded: when it is full the caller writes the image
+    itself instead of dropping it. With durable=True every file is fsynced
+    (data and directory entry) before it counts as written. The sync
+    thread calls wait_for() so an event is never uploaded before its image
+    is on disk.
+
+    Frames are written as submitted (not copied); callers must not modify
+    them afterwards.
+    """
+
+    def __init__(self, picture_dir: str, max_queue: int = 32, durable: bool = False,
+                 quality: Optional[int] = None, name: str = "ImageWriter"):
+        self.picture_dir = picture_dir
+        self.durable = durable
+        self.quality = quality
+        self.name = name
+        self._queue: "queue.Queue[Optional[Tuple[str, np.ndarray, float]]]" = queue.Queue(maxsize=max(1, max_queue))
+        self._pending: Dict[str, int] = {}
+        self._pending_cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.inline_writes = 0      # queue was full, written by the caller
+        self.max_queue_depth = 0
+        self.total_write_latency = 0.0  # submit -> file on disk
+        self.max_write_latency = 0.0
+        self.total_write_time = 0.0     # encode + write only
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10.0):
+        """Write everything still queued, then stop the worker."""
+        if self._thread and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=timeout)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, filename: str, frame: np.ndarray) -> str:
+        """Queue a frame to be saved as picture_dir/filename; returns filename."""
+        with self._pending_cond:
+            self._pending[filename] = self._pending.get(filename, 0) + 1
+        queued_at = time.monotonic()
+        with self._stats_lock:
+            self.submitted += 1
+        try:
+            self._queue.put_nowait((filename, frame, queued_at))
+        except queue.Full:
+            print(f"⚠️  [{self.name}] Queue full, writing {filename} inline")
+            with self._stats_lock:
+                self.inline_writes += 1
+            self._write(filename, frame, queued_at)
+            return filename
+        with self._stats_lock:
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return filename
+
+    def is_pending(self, filename: Optional[str]) -> bool:
+        with self._pending_cond:
+            return bool(filename) and filename in self._pending
+
+    def wait_for(self, filename: Optional[str], timeout: Optional[float] = None) -> bool:
+        """Block until filename is no longer queued or being written; False on timeout."""
+        if not filename:
+            return True
+        with self._pending_cond:
+            return self._pending_cond.wait_for(lambda: filename not in self._pending, timeout)
+
+    def _write(self, filename: str, frame: np.ndarray, queued_at: float):
+        started = time.monotonic()
+        try:
+            save_event_image(self.picture_dir, filename, frame, self.quality, fsync=self.durable)
+            ok = True
+        except Exception as e:
+            ok = False
+            print(f"❌ [{self.name}] Failed to write {filename}: {e}")
+        finished = time.monotonic()
+
+        if ok:
+            IMAGE_WRITE_SECONDS.observe(finished - queued_at)
+        else:
+            IMAGE_WRITE_FAILURES.inc()
+        with self._stats_lock:
+            if ok:
+                self.written += 1
+                self.total_write_time += finished - started
+                self.total_write_latency += finished - queued_at
+                self.max_write_latency = max(self.max_write_latency, finished - queued_at)
+            else:
+                self.failed += 1
+        with self._pending_cond:
+            remaining = self._pending.get(filename, 1) - 1
+            if remaining > 0:
+                self._pending[filename] = remaining
+            else:
+                self._pending.pop(filename, None)
+            self._pending_cond.notify_all()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            self._write(*item)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                'queue_depth': self.queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'submitted': self.submitted,
+                'written': self.written,
+                'failed': self.failed,
+                'inline_writes': self.inline_writes,
+                'durable': self.durable,
+                'avg_write_latency': round(self.total_write_latency / self.written, 4) if self.written else None,
+                'max_write_latency': round(self.max_write_latency, 4),
+                'avg_write_time': round(self.total_write_time / self.written, 4) if self.written else None,
+            }
+
 
 # === HARDWARE MOCK ===
 class HardwareMock:
     """Mock hardware components for testing."""
-    
+
     @staticmethod
     def read_rfid() -> Optional[str]:
         """Mock RFID reading."""
-        import random
         if random.random() < 0.3:  # 30% chance of reading
             return f"MOCK_RFID_{random.randint(1000, 9999)}"
         return None
-    
+
     @staticmethod
     def control_led(state: bool):
         """Mock LED control."""
         print(f"🔵 [LED] {'ON' if state else 'OFF'}")
-    
+
     @staticmethod
     def control_barrier(action: str):
         """Mock barrier control."""
         print(f"🚧 [Barrier] {action.upper()}")
 
+
+class MockGPIO:
+    """Mock GPIO class for non-Raspberry Pi systems."""
+    BCM = "BCM"
+    OUT = "OUT"
+    IN = "IN"
+    HIGH = 1
+    LOW = 0
+
+    _pin_states = {}
+
+    @classmethod
+    def setwarnings(cls, state: bool):
+        print(f"🔧 [MockGPIO] setwarnings({state})")
+
+    @classmethod
+    def setmode(cls, mode):
+        print(f"🔧 [MockGPIO] setmode({mode})")
+
+    @classmethod
+    def setup(cls, pin: int, mode, initial=None):
+        cls._pin_states[pin] = initial if initial is not None else cls.LOW
+        print(f"🔧 [MockGPIO] setup(pin={pin}, mode={mode}, initial={initial})")
+
+    @classmethod
+    def output(cls, pin: int, state: int):
+        cls._pin_states[pin] = state
+        state_name = "HIGH" if state == cls.HIGH else "LOW"
+        print(f"🔧 [MockGPIO] output(pin={pin}, state={state_name})")
+
+    @classmethod
+    def input(cls, pin: int) -> int:
+        return cls._pin_states.get(pin, cls.LOW)
+
+    @classmethod
+    def cleanup(cls):
+        cls._pin_states.clear()
+        print("🔧 [MockGPIO] cleanup() - All pins reset")
+
+
+class MockSimpleMFRC522:
+    """Mock RFID reader for non-Raspberry Pi systems."""
+
+    def __init__(self):
+        self._card_counter = 1000
+        print("🔧 [MockRFID] SimpleMFRC522 initialized")
+
+    def read(self) -> Tuple[int, str]:
+        """Simulate RFID card reading (press Enter to scan)."""
+        print("🔧 [MockRFID] Waiting for RFID card (Press Enter to simulate card scan)...")
+        input()
+
+        self._card_counter += 1
+        rfid_id = self._card_counter
+        rfid_text = f"MockCard_{rfid_id}"
+
+        print(f"🔧 [MockRFID] Card detected: ID={rfid_id}, Text={rfid_text}")
+        return rfid_id, rfid_text
+
+
+def get_hardware_modules():
+    """Return (GPIO, SimpleMFRC522): real modules on a Raspberry Pi, mocks elsewhere."""
+    try:
+        import RPi.GPIO as GPIO
+        from mfrc522 import SimpleMFRC522
+        print("✅ [Hardware] Real Raspberry Pi modules loaded")
+        return GPIO, SimpleMFRC522
+    except ImportError:
+        print("⚠️  [Hardware] Raspberry Pi modules not available, using mock modules")
+        return MockGPIO, MockSimpleMFRC522
+
 # === THREAD SAFE UTILITIES ===
 class ThreadSafeManager:
     """Manage thread-safe operations for the parking system."""
-    
-    def __init__(self):
+
+    def __init__(self, db_file: Optional[str] = None):
+        db_file = db_file or Config.DB_FILE
+
+        # Lock hierarchy (always acquire in this order to prevent deadlock)
+        self.camera_lock = threading.Lock()                     # Level 1
+        self.db_lock = FileLock(f"{db_file}.lock", timeout=15)  # Level 2
+
+        # Thread coordination events
+        self.vehicle_event = threading.Event()
+        self.sync_work_available = threading.Event()
+        self.live_view_running = threading.Event()
+
+        self._processing_lock = threading.Lock()
+        self._decision_lock = threading.Lock()  # held for a whole entry/exit decision
+        self._is_processing = False
+        self._idle_event = threading.Event()
+        self._idle_event.set()
+
         self._shutdown_event = threading.Event()
         self._threads = []
-    
+
+    @contextmanager
+    def camera_access(self):
+        """Safe camera access with timeout."""
+        acquired = self.camera_lock.acquire(timeout=5.0)
+        if not acquired:
+            raise TimeoutError("Could not acquire camera lock within 5 seconds")
+        try:
+            yield
+        finally:
+            self.camera_lock.release()
+
+    @contextmanager
+    def database_access(self):
+        """Safe database access with proper error handling."""
+        try:
+            with self.db_lock:
+                yield
+        except Exception as e:
+            print(f"🔥 [ThreadSafe] Database access error: {e}")
+            raise
+
+    @contextmanager
+    def exclusive_processing(self):
+        """
+        Process one vehicle event at a time: a swipe on another lane waits
+        here until the current entry/exit decision is committed.
+        """
+        self._decision_lock.acquire()
+        with self._processing_lock:
+            self._is_processing = True
+            self._idle_event.clear()
+            self.vehicle_event.set()
+
+        try:
+            yield
+        finally:
+            with self._processing_lock:
+                self._is_processing = False
+                self.vehicle_event.clear()
+                self._idle_event.set()
+            self._decision_lock.release()
+
+    def wait_for_sync_work(self, timeout: Optional[float] = None) -> bool:
+        """Wait for sync work with proper event handling."""
+        return self.sync_work_available.wait(timeout=timeout)
+
+    def signal_sync_work(self):
+        """Signal that sync work is available."""
+        self.sync_work_available.set()
+
+    def clear_sync_work(self):
+        """Clear sync work signal."""
+        self.sync_work_available.clear()
+
+    def is_vehicle_processing(self) -> bool:
+        """Check if a vehicle event is currently being processed."""
+        with self._processing_lock:
+            return self._is_processing
+
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        """Block until no vehicle event is being processed (no polling)."""
+        return self._idle_event.wait(timeout=timeout)
+
+    def start_live_view(self):
+        """Start live view thread."""
+        self.live_view_running.set()
+
+    def stop_live_view(self):
+        """Stop live view thread."""
+        self.live_view_running.clear()
+
+    def is_live_view_running(self) -> bool:
+        """Check if live view is running."""
+        return self.live_view_running.is_set()
+
     def start_background_thread(self, target, name: str, *args, **kwargs):
         """Start a background thread with proper management."""
         thread = threading.Thread(target=target, name=name, args=args, kwargs=kwargs)
@@ -216,14 +2134,14 @@ class ThreadSafeManager:
         thread.start()
         self._threads.append(thread)
         return thread
-    
+
     def shutdown(self):
         """Gracefully shutdown all managed threads."""
         self._shutdown_event.set()
         for thread in self._threads:
             if thread.is_alive():
                 thread.join(timeout=5.0)
-    
+
     def is_shutdown_requested(self) -> bool:
         """Check if shutdown has been requested."""
         return self._shutdown_event.is_set()
@@ -231,30 +2149,166 @@ class ThreadSafeManager:
 # === CONFIGURATION ===
 class Config:
     """Centralized configuration management."""
-    
+
     # Database
     DB_FILE = os.getenv("DB_FILE", "parking_data.db")
-    
-    # Directories  
+
+    # Directories
     PICTURE_OUTPUT_DIR = os.getenv("PICTURE_OUTPUT_DIR", "picture")
     TMP_DIR = "tmp"
-    
+
+    # Dashboard thumbnails (generated on first view, LRU cache on disk)
+    THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", os.path.join("tmp", "thumbnails"))
+    THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", "320"))
+    THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "70"))
+    THUMBNAIL_CACHE_MAX_MB = int(os.getenv("THUMBNAIL_CACHE_MAX_MB", "64"))
+
+    # Dashboard query results, reused until the data changes (QueryResultCache)
+    RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "128"))
+    RESULT_CACHE_LOG_PAGES = int(os.getenv("RESULT_CACHE_LOG_PAGES", "3"))  # first N pages of /log
+
+    # Metrics: every process (gate, web workers) writes a snapshot of its
+    # registry here; the web app serves them all at /metrics. Snapshots not
+    # refreshed for METRICS_STALE_AFTER seconds are left out.
+    METRICS_DIR = os.getenv(
+        "METRICS_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "tmp", "metrics")
+    )
+    METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+    METRICS_STALE_AFTER = float(os.getenv("METRICS_STALE_AFTER", "60"))
+    # Swipe traces (/traces): newest traces the percentiles are computed
+    # over, and how many of the slowest swipes are listed
+    TRACE_STATS_MAX_EVENTS = int(os.getenv("TRACE_STATS_MAX_EVENTS", "5000"))
+    TRACE_SLOW_EVENTS = int(os.getenv("TRACE_SLOW_EVENTS", "20"))
+
+    # Sync signalling
+    SYNC_NOTIFY_SOCKET = os.getenv(
+        "SYNC_NOTIFY_SOCKET",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "tmp", "sync_notify.sock")
+    )
+    SYNC_SAFETY_INTERVAL = float(os.getenv("SYNC_SAFETY_INTERVAL", "60"))
+    # Live dashboard: each web app process listens for change notifications
+    # on its own socket in this directory; polls as a fallback
+    DASHBOARD_NOTIFY_DIR = os.getenv(
+        "DASHBOARD_NOTIFY_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "tmp", "dashboard_notify")
+    )
+    DASHBOARD_POLL_INTERVAL = float(os.getenv("DASHBOARD_POLL_INTERVAL", "2"))
+
+    # Device identity (also part of every sync idempotency key)
+    UID = os.getenv("UID")
+
     # Network
     SERVER_URL = os.getenv("SERVER_URL", "http://localhost:8080")
-    
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+    CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "10"))
+    CIRCUIT_MAX_RESET_TIMEOUT = float(os.getenv("CIRCUIT_MAX_RESET_TIMEOUT", "300"))
+
+    # Camera capture backend: opencv | gstreamer | v4l2_mjpeg | rtsp | file
+    CAMERA_BACKEND = os.getenv("CAMERA_BACKEND", "opencv")
+    # Device index/path, GStreamer pipeline, RTSP URL or replay file/directory
+    CAMERA_SOURCE = os.getenv("CAMERA_SOURCE", "0")
+    CAMERA_WIDTH = int(os.getenv("CAMERA_WIDTH", "640"))
+    CAMERA_HEIGHT = int(os.getenv("CAMERA_HEIGHT", "480"))
+    CAMERA_FPS = float(os.getenv("CAMERA_FPS", "15"))
+    # Extra backend-specific settings as JSON, e.g. {"decode_scale": 2} or {"loop": false}
+    CAMERA_BACKEND_OPTIONS = json.loads(os.getenv("CAMERA_BACKEND_OPTIONS", "{}"))
+    # Camera watchdog: seconds without a fresh frame before the device is
+    # reopened, max backoff between failed reopens, and how long a swipe
+    # waits for a recovering camera
+    CAMERA_STALL_TIMEOUT = float(os.getenv("CAMERA_STALL_TIMEOUT", "3"))
+    CAMERA_REOPEN_BACKOFF_MAX = float(os.getenv("CAMERA_REOPEN_BACKOFF_MAX", "30"))
+    CAMERA_RECOVERY_WAIT = float(os.getenv("CAMERA_RECOVERY_WAIT", "3"))
+
+    # Frame quality gating: frames kept by the grabber, how long after a
+    # swipe (and before it) frames are compared, and the thresholds below
+    # which a frame is not worth running the detector on (see FrameQuality).
+    # The window after a swipe delays every decision by that much, so by
+    # default only the first frame after the swipe is added to the lookback
+    FRAME_QUALITY_GATING = os.getenv("FRAME_QUALITY_GATING", "true").lower() == "true"
+    FRAME_RING_SIZE = int(os.getenv("FRAME_RING_SIZE", "8"))
+    FRAME_SELECT_WINDOW = float(os.getenv("FRAME_SELECT_WINDOW", "0"))
+    FRAME_SELECT_LOOKBACK = float(os.getenv("FRAME_SELECT_LOOKBACK", "0.2"))
+    FRAME_MIN_SHARPNESS = float(os.getenv("FRAME_MIN_SHARPNESS", "15"))
+    FRAME_MAX_CLIPPED = float(os.getenv("FRAME_MAX_CLIPPED", "0.6"))
+    FRAME_MAX_MOTION = float(os.getenv("FRAME_MAX_MOTION", "60"))
+
+    # Live view streaming (per-viewer frame rate cap for /video_stream)
+    LIVE_VIEW_MAX_FPS = float(os.getenv("LIVE_VIEW_MAX_FPS", "10"))
+    # JPEG codec: auto (libjpeg-turbo if installed) | turbojpeg | opencv
+    IMAGE_CODEC = os.getenv("IMAGE_CODEC", "auto")
+    # Quality of saved event images (cv2.imwrite's default was 95)
+    EVENT_JPEG_QUALITY = int(os.getenv("EVENT_JPEG_QUALITY", "95"))
+    # Background image writer: queued frames before callers write inline,
+    # fsync each image (durable mode) and how long sync waits for a write
+    IMAGE_WRITE_QUEUE_SIZE = int(os.getenv("IMAGE_WRITE_QUEUE_SIZE", "32"))
+    IMAGE_WRITE_DURABLE = os.getenv("IMAGE_WRITE_DURABLE", "false").lower() == "true"
+    IMAGE_WRITE_SYNC_WAIT = float(os.getenv("IMAGE_WRITE_SYNC_WAIT", "5"))
+
+    # Live view variants: max width (0 = camera size) and JPEG quality.
+    # The dashboard picks one from its viewport size.
+    LIVE_VIEW_VARIANTS = {
+        "thumb": {"width": 320, "quality": 60},
+        "medium": {"width": 640, "quality": 75},
+        "full": {"width": 0, "quality": 85},
+    }
+    LIVE_VIEW_DEFAULT_VARIANT = "full"
+    # Shared memory segment the LPR process publishes camera frames to
+    FRAME_BUS_NAME = os.getenv("FRAME_BUS_NAME", "ce232_frame_bus")
+
+    # Lanes: JSON list of lanes (see LaneConfig); without it one lane is
+    # built from the CAMERA_* settings, GREEN_LED_PIN and GATE_ID
+    LANES_FILE = os.getenv("LANES_FILE")
+    LANE_ID = os.getenv("LANE_ID", "lane1")
+    GATE_ID = os.getenv("GATE_ID")
+    LANE_QUEUE_SIZE = int(os.getenv("LANE_QUEUE_SIZE", "4"))
+    INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "4"))
+    INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "0"))
+    # Re-read an unreadable plate crop after deskewing it (utils_rotate.deskew);
+    # costs up to 4 extra OCR passes, measure with recognition_benchmark.py
+    PLATE_DESKEW = os.getenv("PLATE_DESKEW", "false").lower() == "true"
+
     # Hardware
+    GREEN_LED_PIN = int(os.getenv("GREEN_LED_PIN", str(GREEN_LED_PIN)))
     MOCK_HARDWARE = os.getenv("MOCK_HARDWARE", "true").lower() == "true"
-    
+
     # Flask
-    FLASK_HOST = "0.0.0.0"
-    FLASK_PORT = 5000
+    FLASK_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+    FLASK_PORT = int(os.getenv("WEB_PORT", "5000"))
     FLASK_DEBUG = False
 
+    # Production web server (gunicorn.conf.py): gthread workers, since every
+    # live view / dashboard client holds one thread for as long as it watches
+    WEB_SERVER = os.getenv("WEB_SERVER", "gunicorn").lower()  # gunicorn | dev
+    WEB_WORKERS = int(os.getenv("WEB_WORKERS", "2"))
+    WEB_THREADS = int(os.getenv("WEB_THREADS", "16"))
+    WEB_TIMEOUT = int(os.getenv("WEB_TIMEOUT", "60"))
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "10"))
+    WEB_MAX_REQUESTS = int(os.getenv("WEB_MAX_REQUESTS", "5000"))
+    WEB_PID_FILE = os.getenv("WEB_PID_FILE", os.path.join(TMP_DIR, "gunicorn.pid"))
+    # Who sends /image and /thumb file bodies: "" (the app), "x-sendfile"
+    # (Apache/lighttpd) or "x-accel-redirect" (nginx, see nginx.example.conf);
+    # the app still checks the file and answers 304s itself
+    SENDFILE_MODE = os.getenv("SENDFILE_MODE", "").lower()
+    ACCEL_REDIRECT_PREFIX = os.getenv("ACCEL_REDIRECT_PREFIX", "/_protected")
+
 # Export all components
 __all__ = [
     'STATUS_INSIDE', 'STATUS_COMPLETED', 'STATUS_INVALID',
-    'get_vietnam_time_str',
-    'SafeErrorLogger', 'SafeDatabaseManager', 'NetworkManager',
-    'SafeCameraManager', 'HardwareMock', 'ThreadSafeManager',
-    'Config'
+    'STATUS_FAIL_NO_PLATE', 'STATUS_FAIL_PLATE_INSIDE', 'STATUS_FAIL_PLATE_MISMATCH',
+    'ERROR_LOG_FILE', 'GREEN_LED_PIN',
+    'CAMERA_STATE_STARTING', 'CAMERA_STATE_OK', 'CAMERA_STATE_STALLED', 'CAMERA_STATE_RECOVERING',
+    'CAMERA_STATE_DOWN',
+    'get_vietnam_time_str', 'get_vietnam_time_for_filename',
+    'normalize_plate', 'safe_normalize_plate', 'sanitize_filename_component',
+    'ensure_directories_exist',
+    'TRACE_STAGES', 'TRACE_KIND_ENTRY', 'TRACE_KIND_EXIT', 'percentile', 'EventTrace',
+    'SafeErrorLogger', 'ChangeNotifier', 'SafeDatabaseManager',
+    'SyncResult', 'CircuitState', 'CircuitBreaker', 'NetworkManager',
+    'ConnectivityMonitor', 'create_event_payload', 'make_idempotency_key',
+    'SYNC_EVENT_TYPES', 'sync_event_type', 'build_sync_event', 'read_event_image',
+    'ImageCodec', 'get_image_codec', 'EncodedImageCache', 'event_image_cache', 'write_file_atomic',
+    'save_event_image', 'AsyncImageWriter',
+    'HardwareMock', 'get_hardware_modules',
+    'ThreadSafeManager', 'Config'
 ]
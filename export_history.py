@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Export parking history to CSV or Parquet.
+
+Streams gate events (IN/OUT/INVALID, as on /log) or parking_log records for
+a date range straight from the database, batch by batch, so memory stays
+flat and the gate process can keep writing while it runs. The same export
+is available from the web app at /api/v1/export.
+
+    python3 export_history.py --from 2026-09-01 --to 2026-09-30 --gzip
+    python3 export_history.py --kind records --format parquet -o records.parquet
+    python3 export_history.py --from 2026-10-01 -o - | head
+
+Parquet needs pyarrow (pip install pyarrow).
+"""
+import argparse
+import sys
+import time
+
+from core_utils import SafeDatabaseManager, Config
+from history_export import EXPORT_KINDS, EXPORT_FORMATS, HistoryExporter, parse_time_bound
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export parking history as CSV or Parquet")
+    parser.add_argument('--kind', choices=tuple(EXPORT_KINDS), default='events',
+                        help='events: one row per IN/OUT; records: one row per trip')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--from', dest='start', help='Start date/time (YYYY-MM-DD[ HH:MM:SS])')
+    parser.add_argument('--to', dest='end', help='End date/time; a date includes that whole day')
+    parser.add_argument('--gzip', action='store_true', help='gzip the CSV (gzip pages inside Parquet)')
+    parser.add_argument('--excel', action='store_true', help='Add a UTF-8 BOM so Excel opens the CSV correctly')
+    parser.add_argument('--batch-size', type=int, default=2000, help='Rows read per database query')
+    parser.add_argument('--db', default=Config.DB_FILE)
+    parser.add_argument('-o', '--output', help="Output file ('-' for stdout; default: generated name)")
+    args = parser.parse_args()
+
+    try:
+        exporter = HistoryExporter(
+            SafeDatabaseManager(args.db),
+            kind=args.kind,
+            fmt=args.format,
+            start=parse_time_bound(args.start),
+            end=parse_time_bound(args.end, is_end=True),
+            compress=args.gzip,
+            excel=args.excel,
+            batch_size=args.batch_size,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    output_path = args.output or exporter.filename
+    # Progress goes to stderr so '-o -' can be piped
+    log = sys.stderr
+    print(f"📤 [Export] {args.kind} {exporter.start or 'beginning'} → {exporter.end or 'now'} "
+          f"as {args.format} to {output_path}", file=log)
+
+    started = time.perf_counter()
+    output = sys.stdout.buffer if output_path == '-' else open(output_path, 'wb')
+    try:
+        for chunk in exporter.chunks():
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    elapsed = time.perf_counter() - started
+
+    rate = exporter.rows / elapsed if elapsed else 0.0
+    print(f"✅ [Export] {exporter.rows} rows, {exporter.bytes / 1024:.1f} KB in {elapsed:.2f}s "
+          f"({rate:.0f} rows/s)", file=log)
+
+
+if __name__ == '__main__':
+    main()
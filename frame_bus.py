@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+"""
+Frame bus between the camera and its readers, and the MJPEG live view built
+on it.
+"""
+
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Dict, Tuple
+
+import numpy as np
+
+from core_utils import get_image_codec, Config
+
+
+class FrameBus:
+    """
+    Single-producer, multi-consumer latest-frame slot with sequence numbers.
+
+    Without a name the slot lives in this process only. With a name it is a
+    shared memory segment: the camera process creates it and publishes raw
+    frames, other processes (the web app) attach and read them. Only the
+    newest frame is kept; a reader that is behind skips straight to it.
+
+    Shared layout: a header (write counter, timestamp, height, width,
+    channels, producer generation) followed by the frame bytes. The writer
+    makes the counter odd while copying, readers retry when it was odd or
+    changed (seqlock), so a frame is never read half-written; a counter
+    that stays odd (producer died mid-write) reads as no frame. Frame
+    sequence = counter // 2.
+
+    A restarted producer replaces the segment under the same name with a
+    new generation. Readers check for that every REATTACH_INTERVAL seconds
+    and re-attach, continuing the sequence numbers from where the old
+    segment stopped; while no producer segment exists they read no frame.
+    """
+
+    _HEADER = struct.Struct("<QdIIIQ")
+    _created_names = set()  # segments owned by a producer in this process
+    REATTACH_INTERVAL = 1.0   # seconds between checks for a replaced segment
+    WRITE_WAIT = 0.05         # longest a reader waits out a write in progress
+
+    def __init__(self, name: Optional[str] = None, create: bool = False,
+                 max_width: int = 1920, max_height: int = 1080, channels: int = 3,
+                 poll_interval: float = 0.005):
+        self.name = name
+        self.create = create
+        self.poll_interval = poll_interval
+        self._capacity = max_width * max_height * channels
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._write_counter = 0
+        self._generation = 0
+        # Reader side: when the segment was last checked, and the offset that
+        # keeps sequence numbers increasing across producer restarts
+        self._checked_at = 0.0
+        self._seq_offset = 0
+        self._last_seq = 0
+
+        # In-process slot
+        self._condition = threading.Condition()
+        self._seq = 0
+        self._frame: Optional[np.ndarray] = None
+        self._timestamp = 0.0
+
+        if name and create:
+            self._create_segment()
+
+    @property
+    def is_shared(self) -> bool:
+        return self.name is not None
+
+    def _create_segment(self):
+        size = self._HEADER.size + self._capacity
+        try:
+            # A segment left behind by a crashed producer is simply replaced
+            stale = shared_memory.SharedMemory(name=self.name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        self._shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        FrameBus._created_names.add(self.name)
+        self._generation = time.time_ns()
+        self._HEADER.pack_into(self._shm.buf, 0, 0, 0.0, 0, 0, 0, self._generation)
+
+    def _open_segment(self) -> Optional[shared_memory.SharedMemory]:
+        """The producer's current segment, or None while it does not exist."""
+        try:
+            shm = shared_memory.SharedMemory(name=self.name)
+        except (FileNotFoundError, ValueError):  # ValueError: created but not sized yet
+            return None
+        # Readers must not unlink the producer's segment when they exit
+        if self.name not in FrameBus._created_names:
+            try:
+                resource_tracker.unregister(shm._name, "shared_memory")
+            except Exception:
+                pass
+        return shm
+
+    def _segment_generation(self, shm: shared_memory.SharedMemory) -> int:
+        return self._HEADER.unpack_from(shm.buf, 0)[5]
+
+    def _attach(self) -> bool:
+        """
+        Attach to the producer's segment; False while it does not exist.
+        Re-attaches when a restarted producer has replaced it.
+        """
+        now = time.monotonic()
+        if self._shm is not None and (self.create or now - self._checked_at < self.REATTACH_INTERVAL):
+            return True
+        self._checked_at = now
+
+        current = self._open_segment()
+        if self._shm is not None:
+            if current is not None and self._segment_generation(current) == self._generation:
+                current.close()
+                return True
+            print(f"🔄 [FrameBus] {self.name} was replaced by a new producer, re-attaching")
+            self._shm.close()
+            self._shm = None
+            # New producers count from zero again
+            self._seq_offset = self._last_seq
+        if current is None:
+            return False
+        self._shm = current
+        self._generation = self._segment_generation(current)
+        return True
+
+    def publish(self, frame: np.ndarray, timestamp: Optional[float] = None) -> int:
+        """Make frame the latest one; returns its sequence number (producer only)."""
+        timestamp = timestamp or time.time()
+        if self._shm is None:
+            with self._condition:
+                self._seq += 1
+                self._frame = frame
+                self._timestamp = timestamp
+                self._condition.notify_all()
+                return self._seq
+
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes > self._capacity:
+            raise ValueError(f"Frame {frame.shape} does not fit the frame bus ({self._capacity} bytes)")
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+
+        buf = self._shm.buf
+        self._write_counter += 1        # odd: write in progress
+        struct.pack_into("<Q", buf, 0, self._write_counter)
+        buf[self._HEADER.size:self._HEADER.size + frame.nbytes] = frame.reshape(-1).data
+        self._write_counter += 1        # even: frame complete
+        self._HEADER.pack_into(buf, 0, self._write_counter, timestamp, height, width, channels, self._generation)
+        return self._write_counter // 2
+
+    def read_latest(self, after_seq: int = 0) -> Optional[Tuple[int, float, np.ndarray]]:
+        """(sequence, timestamp, frame) if a frame newer than after_seq exists, else None."""
+        if not self.is_shared:
+            with self._condition:
+                if self._seq <= after_seq or self._frame is None:
+                    return None
+                return self._seq, self._timestamp, self._frame
+
+        if not self._attach():
+            return None
+        buf = self._shm.buf
+        deadline = time.monotonic() + self.WRITE_WAIT
+        while True:
+            counter, timestamp, height, width, channels, _ = self._HEADER.unpack_from(buf, 0)
+            if counter % 2:
+                if time.monotonic() >= deadline:
+                    return None  # producer stalled or died mid-write
+                time.sleep(0.0005)
+                continue
+            seq = counter // 2 + self._seq_offset
+            if seq <= after_seq or not height:
+                return None
+            nbytes = height * width * channels
+            data = bytes(buf[self._HEADER.size:self._HEADER.size + nbytes])
+            if struct.unpack_from("<Q", buf, 0)[0] != counter:
+                if time.monotonic() >= deadline:
+                    return None
+                continue  # overwritten while copying
+            self._last_seq = max(self._last_seq, seq)
+            shape = (height, width, channels) if channels > 1 else (height, width)
+            return seq, timestamp, np.frombuffer(data, dtype=np.uint8).reshape(shape)
+
+    def wait_for_frame(self, after_seq: int = 0,
+                       timeout: Optional[float] = None) -> Optional[Tuple[int, float, np.ndarray]]:
+        """Block until a frame newer than after_seq is published; None on timeout."""
+        if not self.is_shared:
+            with self._condition:
+                if not self._condition.wait_for(lambda: self._seq > after_seq, timeout):
+                    return None
+            return self.read_latest(after_seq)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            frame = self.read_latest(after_seq)
+            if frame is not None:
+                return frame
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    @property
+    def latest_seq(self) -> int:
+        if not self.is_shared:
+            with self._condition:
+                return self._seq
+        if not self._attach():
+            return self._last_seq
+        return struct.unpack_from("<Q", self._shm.buf, 0)[0] // 2 + self._seq_offset
+
+    def close(self):
+        """Detach; the producer also removes the shared segment."""
+        if self._shm is None:
+            return
+        try:
+            self._shm.close()
+            if self.create:
+                self._shm.unlink()
+                FrameBus._created_names.discard(self.name)
+        except Exception as e:
+            print(f"⚠️  [FrameBus] Error closing {self.name}: {e}")
+        finally:
+            self._shm = None
+
+
+class FrameBroadcaster:
+    """
+    Latest-frame slot that fans one stream of JPEG frames out to many viewers.
+
+    Only the newest frame is kept: a viewer that falls behind simply skips to
+    it, so slow clients drop frames instead of queueing them, and a frame is
+    encoded once no matter how many viewers there are.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._seq = 0
+        self._jpeg: Optional[bytes] = None
+        self._timestamp = 0.0
+        self._subscribers = 0
+
+    def publish(self, jpeg_bytes: bytes, timestamp: Optional[float] = None) -> int:
+        """Replace the latest frame and wake all viewers; returns its sequence number."""
+        with self._condition:
+            self._seq += 1
+            self._jpeg = jpeg_bytes
+            self._timestamp = timestamp or time.time()
+            self._condition.notify_all()
+            return self._seq
+
+    def latest(self) -> Optional[Tuple[int, bytes]]:
+        """The current (sequence, JPEG bytes), or None before the first frame."""
+        with self._condition:
+            return (self._seq, self._jpeg) if self._jpeg is not None else None
+
+    def wait_for_frame(self, after_seq: int, timeout: Optional[float] = None) -> Optional[Tuple[int, bytes]]:
+        """Block until a frame newer than after_seq exists; None on timeout."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._seq > after_seq, timeout):
+                return None
+            return self._seq, self._jpeg
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._condition:
+            return self._subscribers
+
+    @contextmanager
+    def subscription(self):
+        """Count a viewer for as long as the block runs."""
+        with self._condition:
+            self._subscribers += 1
+        try:
+            yield self
+        finally:
+            with self._condition:
+                self._subscribers -= 1
+
+
+def mjpeg_stream(broadcaster: FrameBroadcaster, max_fps: float, boundary: str = "frame",
+                 keepalive: float = 5.0):
+    """
+    Generator of multipart/x-mixed-replace parts for one viewer.
+
+    Frames published while the viewer is still sending the previous one, or
+    faster than max_fps, are skipped. Without a new frame for keepalive
+    seconds the last one is sent again, so a viewer that went away is noticed
+    (and its subscription released) even while the camera is down. A stream
+    that never got a frame ends instead; the page reconnects.
+    """
+    min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+    header = f"--{boundary}\r\nContent-Type: image/jpeg\r\nContent-Length: ".encode()
+    last_seq = 0
+    next_frame_at = 0.0
+    part = None
+
+    with broadcaster.subscription():
+        while True:
+            delay = next_frame_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            frame = broadcaster.wait_for_frame(last_seq, timeout=keepalive)
+            if frame is not None:
+                last_seq, jpeg_bytes = frame
+                part = header + str(len(jpeg_bytes)).encode() + b"\r\n\r\n" + jpeg_bytes + b"\r\n"
+            elif part is None:
+                return
+            next_frame_at = time.monotonic() + min_interval
+            yield part
+
+
+class FrameBusSource:
+    """
+    Feed per-variant FrameBroadcasters with JPEGs of the frames on a FrameBus.
+
+    Each variant (e.g. thumb/medium/full) has its own size and quality and
+    is derived from the same captured frame. A variant is only encoded while
+    somebody watches it, and only once per frame sequence however many
+    viewers share it.
+    """
+
+    def __init__(self, frame_bus: FrameBus, variants: Optional[Dict[str, Dict[str, int]]] = None,
+                 idle_interval: float = 0.2):
+        self.frame_bus = frame_bus
+        self.variants = variants or Config.LIVE_VIEW_VARIANTS
+        self.idle_interval = idle_interval
+        self.broadcasters = {name: FrameBroadcaster() for name in self.variants}
+        self._encoded_seq = {name: 0 for name in self.variants}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._last_seq = 0
+
+    def start(self):
+        """Start the encoder thread once; later calls are no-ops."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="FrameBusSource", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+
+    def broadcaster(self, variant: str) -> Optional[FrameBroadcaster]:
+        return self.broadcasters.get(variant)
+
+    def _encode(self, frame: np.ndarray, variant: str) -> Optional[bytes]:
+        settings = self.variants[variant]
+        return get_image_codec().encode_resized(frame, settings.get("width") or 0, settings.get("quality", 85))
+
+    def snapshot(self, variant: str) -> Optional[bytes]:
+        """JPEG of the newest frame in one variant (for single-image requests)."""
+        latest = self.frame_bus.read_latest(0)
+        if latest is None:
+            return None
+        seq, timestamp, frame = latest
+        current = self.broadcasters[variant].latest()
+        if current is not None and self._encoded_seq[variant] == seq:
+            return current[1]
+        return self._encode(frame, variant)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            watched = [name for name, broadcaster in self.broadcasters.items() if broadcaster.subscriber_count]
+            if not watched:
+                self._stop_event.wait(self.idle_interval)
+                continue
+            try:
+                latest = self.frame_bus.wait_for_frame(self._last_seq, timeout=self.idle_interval)
+                if latest is None:
+                    continue
+                seq, timestamp, frame = latest
+                self._last_seq = seq
+                for name in watched:
+                    jpeg_bytes = self._encode(frame, name)
+                    if jpeg_bytes:
+                        self._encoded_seq[name] = seq
+                        self.broadcasters[name].publish(jpeg_bytes, timestamp)
+            except Exception as e:
+                print(f"⚠️  [LiveView] Error encoding frame from bus: {e}")
+                self._stop_event.wait(1.0)
+
+
+__all__ = [
+    'FrameBus', 'FrameBroadcaster', 'mjpeg_stream', 'FrameBusSource'
+]
@@ -0,0 +1,73 @@
+"""
+Gunicorn settings for the web interface (production serving profile).
+
+    gunicorn -c gunicorn.conf.py app:app      # start (start.sh does this)
+    ./manage.sh reload                        # zero-downtime code reload (USR2, then TERM old master)
+
+Worker model: gthread. Every MJPEG live view (/video_stream) and dashboard
+stream (/events) holds one thread for as long as the page is open, so a
+couple of processes with a generous thread pool fit a Raspberry Pi far
+better than one process per connection; the JPEG/SQLite work releases the
+GIL. gevent is not used: the frame bus, file locks and encoder threads are
+plain threads and blocking calls.
+
+The app is preloaded in the master, so the DB schema check and imports run
+once and workers share those pages copy-on-write (and HUP only respawns
+workers with the same code, hence the USR2 reload). Everything that starts a
+thread or opens a socket (FrameBusSource, DashboardFeed) does so lazily on
+the first request, i.e. inside the worker, so forking after preload is safe.
+
+All values come from Config (WEB_* in .env).
+"""
+import os
+
+from core_utils import Config
+
+bind = f"{Config.FLASK_HOST}:{Config.FLASK_PORT}"
+worker_class = "gthread"
+workers = Config.WEB_WORKERS
+threads = Config.WEB_THREADS
+preload_app = True
+
+# gthread workers heartbeat from their main loop, so long-lived streams do
+# not trip the timeout; it only catches a truly stuck worker
+timeout = Config.WEB_TIMEOUT
+# Streams never finish on their own: on reload/stop old workers get this long,
+# then browsers reconnect (/events resumes from Last-Event-ID)
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT
+keepalive = 5
+
+# Recycle workers now and then to bound memory growth on the Pi
+max_requests = Config.WEB_MAX_REQUESTS
+max_requests_jitter = max(Config.WEB_MAX_REQUESTS // 10, 0)
+
+pidfile = Config.WEB_PID_FILE
+os.makedirs(os.path.dirname(pidfile) or ".", exist_ok=True)
+
+# Access logs on the SD card cost more than they are worth here; errors go
+# to stderr (flask_app.log via start.sh)
+accesslog = None
+errorlog = "-"
+loglevel = os.getenv("WEB_LOG_LEVEL", "info")
+# Behind nginx on the same host
+forwarded_allow_ips = "127.0.0.1"
+
+
+def when_ready(server):
+    print(f"✅ [Web] gunicorn ready on {bind}: {workers} workers x {threads} threads "
+          f"(sendfile: {Config.SENDFILE_MODE or 'app'})")
+
+
+def post_fork(server, worker):
+    print(f"🔧 [Web] Worker {worker.pid} started")
+
+
+def worker_exit(server, worker):
+    # Stop this worker's dashboard feed so its notify socket is removed, and
+    # its metrics exporter so /metrics stops listing it
+    try:
+        from app import dashboard_feed, metrics
+        dashboard_feed.stop()
+        metrics.stop_exporter()
+    except Exception as e:
+        print(f"⚠️  [Web] Worker {worker.pid} cleanup failed: {e}")
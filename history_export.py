@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Parking history export (CSV or Parquet), streamed batch by batch from the
+database; used by export_history.py and /api/v1/export.
+"""
+
+import csv
+import io
+import zlib
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Iterator
+
+from core_utils import SafeDatabaseManager
+
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pyarrow_parquet
+except ImportError:  # Optional: Parquet export (CSV works without it)
+    pyarrow = None
+
+# Exportable history views: SafeDatabaseManager page query and its columns
+EXPORT_KINDS = {
+    "events": "query_log_events",
+    "records": "query_records",
+}
+EXPORT_COLUMNS = {
+    "events": ('db_id', 'type', 'event_time', 'plate', 'rfid_token', 'status', 'gate', 'image'),
+    "records": ('id', 'plate', 'rfid_token', 'time_in', 'time_out', 'status', 'gate_in', 'gate_out',
+                'image_path_in', 'image_path_out'),
+}
+EXPORT_INTEGER_COLUMNS = {'db_id', 'id', 'status'}
+EXPORT_FORMATS = ("csv", "parquet")
+
+
+def parse_time_bound(value: Optional[str], is_end: bool = False) -> Optional[str]:
+    """
+    'YYYY-MM-DD' or 'YYYY-MM-DD[ T]HH:MM:SS' as a DB time string, for
+    half-open [start, end) filters. A bare date as the end bound means the
+    end of that day. Raises ValueError for anything else.
+    """
+    value = (value or "").strip()
+    if not value:
+        return None
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == "%Y-%m-%d" and is_end:
+            parsed += timedelta(days=1)
+        return parsed.strftime("%Y-%m-%d %H:%M:%S")
+    raise ValueError(f"invalid time {value!r}: use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands back what was written since the last take()."""
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class HistoryExporter:
+    """
+    Streams parking history as CSV or Parquet, chunk by chunk.
+
+    kind is 'events' (IN/OUT/INVALID as on /log) or 'records' (one
+    parking_log row per trip), limited to [start, end). Rows are read with
+    SafeDatabaseManager.iter_pages, batch_size rows per short WAL read, and
+    each batch is encoded and handed out before the next one is read, so
+    memory stays flat whatever the range and the gate process keeps writing
+    meanwhile. compress gzips CSV (.csv.gz) or uses gzip pages inside the
+    Parquet file; excel adds a UTF-8 BOM so Excel opens the CSV correctly.
+    """
+
+    def __init__(self, db_manager: SafeDatabaseManager, kind: str = "events", fmt: str = "csv",
+                 start: Optional[str] = None, end: Optional[str] = None, compress: bool = False,
+                 excel: bool = False, batch_size: int = 2000):
+        if kind not in EXPORT_KINDS:
+            raise ValueError(f"unknown export kind {kind!r}: use {', '.join(EXPORT_KINDS)}")
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"unknown export format {fmt!r}: use {', '.join(EXPORT_FORMATS)}")
+        if fmt == "parquet" and pyarrow is None:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.db_manager = db_manager
+        self.kind = kind
+        self.fmt = fmt
+        self.start = start
+        self.end = end
+        self.compress = compress
+        self.excel = excel
+        self.batch_size = batch_size
+        self.columns = EXPORT_COLUMNS[kind]
+        self.rows = 0
+        self.bytes = 0
+
+    @property
+    def filename(self) -> str:
+        period = "_".join(part[:10] for part in (self.start, self.end) if part) or "all"
+        suffix = ".csv.gz" if self.fmt == "csv" and self.compress else f".{self.fmt}"
+        return f"parking_{self.kind}_{period}{suffix}"
+
+    @property
+    def mimetype(self) -> str:
+        if self.fmt == "parquet":
+            return "application/vnd.apache.parquet"
+        return "application/gzip" if self.compress else "text/csv"
+
+    def chunks(self) -> Iterator[bytes]:
+        """The export file as byte chunks (one per batch of rows)."""
+        encoded = self._parquet_chunks() if self.fmt == "parquet" else self._csv_chunks()
+        if self.fmt == "csv" and self.compress:
+            encoded = self._gzip(encoded)
+        for chunk in encoded:
+            if chunk:
+                self.bytes += len(chunk)
+                yield chunk
+
+    def _batches(self) -> Iterator[List[Dict[str, Any]]]:
+        query_page = getattr(self.db_manager, EXPORT_KINDS[self.kind])
+        batch = []
+        for row in SafeDatabaseManager.iter_pages(query_page, batch_size=self.batch_size,
+                                                  start=self.start, end=self.end):
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.rows += len(batch)
+                yield batch
+                batch = []
+        if batch:
+            self.rows += len(batch)
+            yield batch
+
+    def _csv_chunks(self) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if self.excel:
+            buffer.write("\ufeff")
+        writer.writerow(self.columns)
+        for batch in self._batches():
+            writer.writerows([row[column] for column in self.columns] for row in batch)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode("utf-8")
+
+    def _parquet_chunks(self) -> Iterator[bytes]:
+        schema = pyarrow.schema([
+            (column, pyarrow.int64() if column in EXPORT_INTEGER_COLUMNS else pyarrow.string())
+            for column in self.columns
+        ])
+        sink = _ChunkSink()
+        writer = pyarrow_parquet.ParquetWriter(sink, schema, compression="gzip" if self.compress else "snappy")
+        try:
+            for batch in self._batches():
+                columns = {column: [row[column] for row in batch] for column in self.columns}
+                writer.write_table(pyarrow.Table.from_pydict(columns, schema=schema))
+                yield sink.take()
+        finally:
+            writer.close()
+        yield sink.take()
+
+    @staticmethod
+    def _gzip(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+        for chunk in chunks:
+            yield compressor.compress(chunk)
+        yield compressor.flush()
+
+
+__all__ = [
+    'EXPORT_KINDS', 'EXPORT_COLUMNS', 'EXPORT_FORMATS', 'parse_time_bound', 'HistoryExporter'
+]
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP caching for the web app: compressed text responses, content-hash ETags
+for pictures, cache statistics and the query result cache.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable, Tuple
+
+
+try:
+    import brotli
+except ImportError:  # Optional: br encoding for text responses
+    brotli = None
+
+
+def compress_body(data: bytes, accept_encoding: str, min_size: int = 512,
+                  gzip_level: int = 6, brotli_quality: int = 5) -> Tuple[bytes, Optional[str]]:
+    """
+    Compress a text response body for the client's Accept-Encoding.
+    Returns (body, content-encoding); encoding is None when the body is
+    left as is (too small, not accepted, or compression did not help).
+    """
+    if len(data) < min_size or not accept_encoding:
+        return data, None
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        compressed, encoding = brotli.compress(data, quality=brotli_quality), "br"
+    elif "gzip" in accepted:
+        compressed, encoding = gzip.compress(data, compresslevel=gzip_level, mtime=0), "gzip"
+    else:
+        return data, None
+    if len(compressed) >= len(data):
+        return data, None
+    return compressed, encoding
+
+
+class FileDigestCache:
+    """
+    Content hashes of files for strong ETags, remembered per
+    (path, size, mtime) so each file is hashed once (LRU bounded).
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+
+    def digest(self, path: str) -> Optional[str]:
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return None
+        key = (path, stat_result.st_size, stat_result.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(key)
+            if digest is not None:
+                self._digests.move_to_end(key)
+                return digest
+
+        hasher = hashlib.blake2b(digest_size=16)
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(65536), b""):
+                    hasher.update(chunk)
+        except OSError:
+            return None
+        digest = hasher.hexdigest()
+
+        with self._lock:
+            self._digests[key] = digest
+            while len(self._digests) > self.max_entries:
+                self._digests.popitem(last=False)
+        return digest
+
+
+class HttpCacheStats:
+    """Counters for conditional GETs and compression (bytes and render time saved)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+        self.compressed = 0
+        self.bytes_uncompressed = 0     # body size before compression
+        self.bytes_sent = 0             # body size after compression
+        self.bytes_not_sent = 0         # full bodies avoided by 304s (last known size)
+        self.render_seconds_saved = 0.0  # estimated from the last full render
+        self._last_full: Dict[str, Tuple[int, float]] = {}
+
+    def record_full(self, endpoint: str, body_bytes: int, render_seconds: float):
+        with self._lock:
+            self.requests += 1
+            self._last_full[endpoint] = (body_bytes, render_seconds)
+
+    def record_not_modified(self, endpoint: str):
+        with self._lock:
+            self.requests += 1
+            self.not_modified += 1
+            body_bytes, render_seconds = self._last_full.get(endpoint, (0, 0.0))
+            self.bytes_not_sent += body_bytes
+            self.render_seconds_saved += render_seconds
+
+    def record_compression(self, original_bytes: int, sent_bytes: int):
+        with self._lock:
+            self.compressed += 1
+            self.bytes_uncompressed += original_bytes
+            self.bytes_sent += sent_bytes
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'not_modified': self.not_modified,
+                'hit_ratio': round(self.not_modified / self.requests, 3) if self.requests else None,
+                'bytes_not_sent': self.bytes_not_sent,
+                'render_seconds_saved': round(self.render_seconds_saved, 3),
+                'compressed_responses': self.compressed,
+                'compression_ratio': round(self.bytes_sent / self.bytes_uncompressed, 3) if self.bytes_uncompressed else None,
+                'compression_bytes_saved': self.bytes_uncompressed - self.bytes_sent,
+            }
+
+
+class QueryResultCache:
+    """
+    Results of dashboard queries, keyed by route and parameters and valid
+    for one database version.
+
+    version_source() returns the current change counter (the data_version
+    kept by SafeDatabaseManager triggers); an entry computed at another
+    version is recomputed, so nothing is served stale and no TTL is needed.
+    A hit costs the version read plus a dict lookup. Size-bounded LRU.
+    None results are not kept. Cached values are shared between requests
+    and must not be mutated.
+    """
+
+    def __init__(self, version_source: Callable[[], Optional[int]], max_entries: int = 128):
+        self.version_source = version_source
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, Tuple[int, Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0           # misses because the data changed since the entry was computed
+        self.evictions = 0
+        self.uncached = 0        # version unknown (DB not ready): computed without caching
+        self.compute_seconds = 0.0
+        self.seconds_saved = 0.0  # compute time of the entries that were hit
+
+    def get_or_compute(self, key: Any, compute: Callable[[], Any]) -> Any:
+        """Cached result for key at the current version, else compute() (and remember it)."""
+        version = self.version_source()
+        if version is None:
+            with self._lock:
+                self.uncached += 1
+            return compute()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.seconds_saved += entry[2]
+                return entry[1]
+            self.misses += 1
+            if entry is not None:
+                self.stale += 1
+
+        # Computed outside the lock; two threads missing together both compute
+        started = time.perf_counter()
+        value = compute()
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.compute_seconds += elapsed
+            if value is None:
+                return value  # failure marker of the query helpers: do not keep it
+            self._entries[key] = (version, value, elapsed)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'evictions': self.evictions,
+                'uncached': self.uncached,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+                'compute_seconds': round(self.compute_seconds, 3),
+                'seconds_saved': round(self.seconds_saved, 3),
+            }
+
+
+__all__ = [
+    'compress_body', 'FileDigestCache', 'HttpCacheStats', 'QueryResultCache'
+]
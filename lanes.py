@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+"""
+Gate lanes (camera, RFID reader, LED and gate ID each), the plate
+recognizer and the scheduler that batches the lanes' frames for it.
+"""
+
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+import numpy as np
+
+from core_utils import GREEN_LED_PIN, safe_normalize_plate, sanitize_filename_component, Config
+from camera import CaptureBackend, capture_backend_from_config
+from metrics import metrics
+
+
+# Metrics updated by the recognizer and the lane classes
+LANE_SWIPES = metrics.counter('parking_swipes_total', 'Card swipes read', ('lane',))
+LANE_SWIPES_DROPPED = metrics.counter(
+    'parking_swipes_dropped_total', 'Swipes dropped because the lane queue was full', ('lane',))
+LANE_SWIPE_SECONDS = metrics.histogram(
+    'parking_swipe_seconds', 'Card swipe -> gate decision (frame, recognition, DB)', ('lane', 'result'))
+LANE_PLATES = metrics.counter(
+    'parking_plates_total', 'Plate recognitions by outcome (recognized, unreadable, skipped)', ('lane', 'result'))
+DETECTOR_SECONDS = metrics.histogram('parking_detector_seconds', 'Plate detector time per inference batch')
+DETECTOR_BATCH_SIZE = metrics.histogram('parking_detector_batch_size', 'Frames per detector batch',
+                                        buckets=(1, 2, 3, 4, 6, 8))
+OCR_SECONDS = metrics.histogram('parking_ocr_seconds', 'Plate OCR time per frame')
+
+
+# === PLATE RECOGNITION ===
+def load_plate_models(repo_path: str, detector_path: str, ocr_path: str,
+                      ocr_confidence: float = 0.60) -> Tuple[Any, Any]:
+    """Plate detector and OCR models (YOLOv5 via torch.hub from a local repo)."""
+    import torch  # only the gate process and the benchmark need torch
+
+    detector = torch.hub.load(repo_path, 'custom', path=detector_path, source='local', _verbose=False)
+    ocr_model = torch.hub.load(repo_path, 'custom', path=ocr_path, source='local', _verbose=False)
+    ocr_model.conf = ocr_confidence
+    return detector, ocr_model
+
+
+class PlateRecognizer:
+    """
+    Detector + OCR for a batch of frames (one per lane swipe): the gate's
+    recognition step, run by the shared BatchInferenceScheduler in LPR.py
+    and replayed as-is by recognition_benchmark.py.
+
+    The largest detection is cropped and read with read_plate(ocr_model,
+    image); without a usable box the whole frame is read. With deskew
+    (utils_rotate.deskew) an unreadable crop is read again after
+    deskewing it with each contrast/centre setting until one gives a
+    plate.
+    """
+
+    DESKEW_SETTINGS = ((0, 0), (0, 1), (1, 0), (1, 1))  # (change_cons, center_thres)
+
+    def __init__(self, detector: Any, ocr_model: Any, read_plate: Callable[[Any, np.ndarray], str],
+                 deskew: Optional[Callable[[np.ndarray, int, int], np.ndarray]] = None,
+                 detect_size: int = 640):
+        self.detector = detector
+        self.ocr_model = ocr_model
+        self.read_plate = read_plate
+        self.deskew = deskew
+        self.detect_size = detect_size
+
+    def recognize_batch(self, frames: List[np.ndarray]) -> List[Tuple[str, Optional[np.ndarray], Dict[str, float]]]:
+        """
+        [(plate text, plate crop or None, stage timings)] for the frames.
+        Every frame of a batch waited for the whole detector pass, so each
+        gets the batch's detect time.
+        """
+        DETECTOR_BATCH_SIZE.observe(len(frames))
+        started = time.perf_counter()
+        detections = self.detector([frame.copy() for frame in frames], size=self.detect_size).pandas().xyxy
+        detect_time = time.perf_counter() - started
+        DETECTOR_SECONDS.observe(detect_time)
+
+        results = []
+        for frame, detected in zip(frames, detections):
+            crop_started = time.perf_counter()
+            crop = self._largest_crop(frame, detected.values.tolist())
+            ocr_started = time.perf_counter()
+            text = self._read(frame, crop)
+            ocr_time = time.perf_counter() - ocr_started
+            OCR_SECONDS.observe(ocr_time)
+            timings = {"detect": detect_time, "crop": ocr_started - crop_started, "ocr": ocr_time}
+            results.append((text, crop, timings))
+        return results
+
+    @staticmethod
+    def _largest_crop(frame: np.ndarray, boxes: List[List[float]]) -> Optional[np.ndarray]:
+        if not boxes:
+            return None
+        # Sort by area (largest first) and take the biggest detection
+        boxes.sort(key=lambda x: (x[2] - x[0]) * (x[3] - x[1]), reverse=True)
+        x1, y1, x2, y2 = map(int, boxes[0][:4])
+
+        # Ensure coordinates are within image bounds
+        h, w = frame.shape[:2]
+        y1, y2 = max(0, y1), min(h, y2)
+        x1, x2 = max(0, x1), min(w, x2)
+        if y2 > y1 and x2 > x1:
+            return frame[y1:y2, x1:x2]
+        return None
+
+    def _read(self, frame: np.ndarray, crop: Optional[np.ndarray]) -> str:
+        if crop is None:
+            return self.read_plate(self.ocr_model, frame.copy())
+        text = self.read_plate(self.ocr_model, crop.copy())
+        if self.deskew is not None and safe_normalize_plate(text) == "UNKNOWN":
+            for change_cons, center_thres in self.DESKEW_SETTINGS:
+                text = self.read_plate(self.ocr_model, self.deskew(crop.copy(), change_cons, center_thres))
+                if safe_normalize_plate(text) != "UNKNOWN":
+                    break
+        return text
+
+
+# === LANES & BATCHED INFERENCE ===
+class LaneConfig:
+    """
+    One gate lane: its camera, RFID reader, LED pin and gate ID.
+
+    camera: {"backend": ..., "source": ..., "options": {...}} (CAMERA_* defaults)
+    reader: {"bus": 0, "device": 0, "pin_rst": null} (SPI bus/device of the MFRC522)
+    """
+
+    def __init__(self, lane_id: str, gate_id: Optional[str] = None,
+                 camera: Optional[Dict[str, Any]] = None, reader: Optional[Dict[str, Any]] = None,
+                 led_pin: int = GREEN_LED_PIN, frame_bus_name: Optional[str] = None):
+        self.lane_id = lane_id
+        self.gate_id = gate_id
+        self.camera = camera or {}
+        self.reader = reader or {}
+        self.led_pin = led_pin
+        self.frame_bus_name = frame_bus_name or f"{Config.FRAME_BUS_NAME}_{sanitize_filename_component(lane_id)}"
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], frame_bus_name: Optional[str] = None) -> "LaneConfig":
+        return cls(
+            lane_id=str(data["lane_id"]),
+            gate_id=data.get("gate_id"),
+            camera=data.get("camera"),
+            reader=data.get("reader"),
+            led_pin=int(data.get("led_pin", GREEN_LED_PIN)),
+            frame_bus_name=data.get("frame_bus_name", frame_bus_name)
+        )
+
+    def capture_backend(self) -> "CaptureBackend":
+        return capture_backend_from_config(self.camera.get("source"), self.camera.get("backend"),
+                                           self.camera.get("options"))
+
+
+def load_lane_configs(path: Optional[str] = None) -> List[LaneConfig]:
+    """
+    Lanes from the LANES_FILE JSON list, or one lane built from the single
+    camera/reader settings when there is no file. The first lane uses the
+    FRAME_BUS_NAME segment itself so single-lane setups are unchanged.
+    """
+    path = path or Config.LANES_FILE
+    if not path:
+        return [LaneConfig(Config.LANE_ID, Config.GATE_ID, led_pin=Config.GREEN_LED_PIN,
+                           frame_bus_name=Config.FRAME_BUS_NAME)]
+
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    if not entries:
+        raise ValueError(f"No lanes defined in {path}")
+
+    lanes = [LaneConfig.from_dict(entry, Config.FRAME_BUS_NAME if index == 0 else None)
+             for index, entry in enumerate(entries)]
+    lane_ids = [lane.lane_id for lane in lanes]
+    if len(set(lane_ids)) != len(lane_ids):
+        raise ValueError(f"Duplicate lane_id in {path}: {lane_ids}")
+    return lanes
+
+
+class LaneMetrics:
+    """Thread-safe per-lane counters (swipes, drops, processing latency)."""
+
+    def __init__(self, lane_id: str):
+        self.lane_id = lane_id
+        self._lock = threading.Lock()
+        self.swipes = 0
+        self.dropped = 0        # swipes rejected because the lane queue was full
+        self.processed = 0
+        self.failures = 0
+        self.inference_skipped = 0  # frames rejected by the quality gate
+        self.plates_recognized = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_event_at: Optional[float] = None
+
+    def record_swipe(self):
+        LANE_SWIPES.inc(lane=self.lane_id)
+        with self._lock:
+            self.swipes += 1
+            self.last_event_at = time.time()
+
+    def record_dropped(self):
+        LANE_SWIPES_DROPPED.inc(lane=self.lane_id)
+        with self._lock:
+            self.dropped += 1
+
+    def record_recognition(self, recognized: bool, skipped: bool = False):
+        result = "skipped" if skipped else ("recognized" if recognized else "unreadable")
+        LANE_PLATES.inc(lane=self.lane_id, result=result)
+        with self._lock:
+            if skipped:
+                self.inference_skipped += 1
+            if recognized:
+                self.plates_recognized += 1
+
+    def record_processed(self, latency: float, success: bool = True):
+        LANE_SWIPE_SECONDS.observe(latency, lane=self.lane_id, result="ok" if success else "error")
+        with self._lock:
+            self.processed += 1
+            if not success:
+                self.failures += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def as_dict(self, queue_depth: Optional[int] = None) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'lane_id': self.lane_id,
+                'swipes': self.swipes,
+                'dropped': self.dropped,
+                'processed': self.processed,
+                'failures': self.failures,
+                'inference_skipped': self.inference_skipped,
+                'plates_recognized': self.plates_recognized,
+                'queue_depth': queue_depth,
+                'avg_latency': round(self.total_latency / self.processed, 3) if self.processed else None,
+                'max_latency': round(self.max_latency, 3),
+                'last_event_at': self.last_event_at,
+            }
+
+
+class BatchInferenceScheduler:
+    """
+    Run requests from all lanes through one shared model in batches.
+
+    Lanes call infer(item) and block for their own result. A worker thread
+    takes whatever is queued (up to max_batch_size, waiting at most
+    max_wait seconds for more) and calls infer_batch(items) -> results, so
+    simultaneous swipes share one model pass and a lone swipe is not
+    delayed when max_wait is 0.
+    """
+
+    def __init__(self, infer_batch: Callable[[List[Any]], List[Any]], max_batch_size: int = 4,
+                 max_wait: float = 0.0, name: str = "Inference"):
+        self.infer_batch = infer_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.name = name
+        self._queue: "queue.Queue[Tuple[Any, Future, float]]" = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.total_inference_time = 0.0
+        self.total_queue_wait = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+
+    def submit(self, item: Any) -> Future:
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def infer(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """Submit one item and wait for its result (re-raises inference errors)."""
+        return self.submit(item).result(timeout)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _collect_batch(self) -> List[Tuple[Any, Future, float]]:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            started = time.monotonic()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.infer_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"infer_batch returned {len(results)} results for {len(items)} items")
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                print(f"🔥 [{self.name}] Batch of {len(items)} failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            finished = time.monotonic()
+
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.max_batch_seen = max(self.max_batch_seen, len(batch))
+                self.total_inference_time += finished - started
+                self.total_queue_wait += sum(started - queued_at for _, _, queued_at in batch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'avg_batch_size': round(self.items / self.batches, 2) if self.batches else None,
+                'max_batch_size': self.max_batch_seen,
+                'avg_inference_time': round(self.total_inference_time / self.batches, 3) if self.batches else None,
+                'total_inference_time': round(self.total_inference_time, 3),
+                'avg_queue_wait': round(self.total_queue_wait / self.items, 3) if self.items else None,
+                'queue_depth': self.queue_depth,
+            }
+
+
+def create_rfid_reader(reader_class, bus: int = 0, device: int = 0, pin_rst: Optional[int] = None):
+    """
+    RFID reader on a given SPI bus/device. SimpleMFRC522 always opens
+    bus 0 device 0, so for other lanes its MFRC522 is replaced.
+    """
+    reader = reader_class()
+    if (bus, device, pin_rst) != (0, 0, None) and hasattr(reader, "READER"):
+        from mfrc522 import MFRC522
+        kwargs = {"bus": bus, "device": device}
+        if pin_rst is not None:
+            kwargs["pin_rst"] = pin_rst
+        reader.READER = MFRC522(**kwargs)
+    return reader
+
+
+__all__ = [
+    'load_plate_models', 'PlateRecognizer',
+    'LaneConfig', 'load_lane_configs', 'LaneMetrics', 'BatchInferenceScheduler', 'create_rfid_reader'
+]
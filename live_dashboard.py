@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Live dashboard: database changes fanned out to the browsers as Server-Sent
+Events.
+"""
+
+import json
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Tuple
+
+from core_utils import ChangeNotifier, SafeDatabaseManager
+
+
+class EventBroadcaster:
+    """
+    Ordered fan-out of dashboard messages to any number of SSE clients.
+
+    Each message is serialized once into a ready-to-send SSE frame and kept
+    in a bounded history; clients only remember the last sequence number
+    they sent, so a publish costs the same for 1 or 100 clients. A client
+    that falls further behind than the history (or reconnects with an old
+    Last-Event-ID) is told to resync.
+    """
+
+    def __init__(self, history: int = 256):
+        self._condition = threading.Condition()
+        self._messages: "deque[Tuple[int, str]]" = deque(maxlen=history)
+        self._seq = 0
+        self._subscribers = 0
+
+    def publish(self, event: str, data: Dict[str, Any]) -> int:
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        with self._condition:
+            self._seq += 1
+            self._messages.append((self._seq, f"id: {self._seq}\nevent: {event}\ndata: {payload}\n\n"))
+            self._condition.notify_all()
+            return self._seq
+
+    @property
+    def latest_seq(self) -> int:
+        with self._condition:
+            return self._seq
+
+    def wait_for_messages(self, after_seq: int, timeout: Optional[float] = None) -> Tuple[List[str], int, bool]:
+        """(frames newer than after_seq, new last seq, missed_some); empty frames on timeout."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > after_seq, timeout)
+            if self._seq <= after_seq:
+                return [], after_seq, False
+            oldest = self._messages[0][0]
+            missed = after_seq + 1 < oldest
+            frames = [frame for seq, frame in self._messages if seq > after_seq]
+            return frames, self._seq, missed
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._condition:
+            return self._subscribers
+
+    @contextmanager
+    def subscription(self):
+        with self._condition:
+            self._subscribers += 1
+        try:
+            yield self
+        finally:
+            with self._condition:
+                self._subscribers -= 1
+
+
+def sse_stream(broadcaster: EventBroadcaster, last_event_id: Optional[str] = None,
+               initial: Optional[List[Tuple[str, Dict[str, Any]]]] = None,
+               keepalive: float = 15.0, retry_ms: int = 3000):
+    """
+    Server-sent events generator for one client. Resumes after
+    Last-Event-ID when the client reconnects; sends a comment line every
+    keepalive seconds so proxies keep the connection open.
+    """
+    with broadcaster.subscription():
+        yield f"retry: {retry_ms}\n\n"
+        for event, data in initial or []:
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        seq = broadcaster.latest_seq
+        if last_event_id and last_event_id.isdigit() and int(last_event_id) <= seq:
+            seq = int(last_event_id)
+        while True:
+            frames, seq, missed = broadcaster.wait_for_messages(seq, keepalive)
+            if missed:
+                yield "event: resync\ndata: {}\n\n"
+            if frames:
+                yield "".join(frames)
+            else:
+                yield ": keepalive\n\n"
+
+
+class DashboardFeed:
+    """
+    Pushes gate activity to dashboard clients through an EventBroadcaster.
+
+    One thread per web app process wakes on change notifications from the
+    gate process (its own socket in Config.DASHBOARD_NOTIFY_DIR) or every
+    poll_interval, reads only the outbox events added since the last look
+    and publishes them as 'gate_event', plus a 'summary' (occupancy, sync
+    backlog) whenever it changed. Clients never trigger queries.
+    """
+
+    def __init__(self, db_manager: "SafeDatabaseManager", broadcaster: Optional[EventBroadcaster] = None,
+                 poll_interval: float = 2.0, notify_dir: Optional[str] = None):
+        self.db_manager = db_manager
+        self.broadcaster = broadcaster or EventBroadcaster()
+        self.poll_interval = poll_interval
+        self.notify_dir = notify_dir
+        self.summary: Optional[Dict[str, Any]] = None
+        self.last_event_id = 0
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._notifier: Optional[ChangeNotifier] = None
+        self.refreshes = 0
+        self.events_published = 0
+
+    def start(self):
+        """Start the feed thread (idempotent; called lazily by the first client)."""
+        with self._start_lock:
+            if self._thread is not None:
+                return self
+            self.summary = self.db_manager.get_dashboard_summary()
+            self.last_event_id = self.summary['last_event_id'] if self.summary else 0
+            if self.notify_dir:
+                socket_path = os.path.join(self.notify_dir, f"dashboard_{os.getpid()}.sock")
+                self._notifier = ChangeNotifier(socket_path)
+                if not self._notifier.listen(lambda reason: self.wake()):
+                    self._notifier = None
+            self._thread = threading.Thread(target=self._run, name="DashboardFeed", daemon=True)
+            self._thread.start()
+            return self
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        if self._notifier:
+            self._notifier.close()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️  [Dashboard] Refresh failed: {e}")
+                self._stop_event.wait(self.poll_interval)
+
+    def refresh(self):
+        """Publish what changed since the last refresh."""
+        self.refreshes += 1
+        summary = self.db_manager.get_dashboard_summary()
+        if summary is None:
+            return
+        if summary['last_event_id'] > self.last_event_id:
+            while True:
+                events = self.db_manager.get_activity_after(self.last_event_id)
+                for event in events:
+                    self.broadcaster.publish("gate_event", event)
+                    self.last_event_id = event['id']
+                    self.events_published += 1
+                if len(events) < 200 or self.last_event_id >= summary['last_event_id']:
+                    break
+        if summary != self.summary:
+            self.summary = summary
+            self.broadcaster.publish("summary", summary)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'subscribers': self.broadcaster.subscriber_count,
+            'refreshes': self.refreshes,
+            'events_published': self.events_published,
+            'last_event_id': self.last_event_id,
+        }
+
+
+__all__ = [
+    'EventBroadcaster', 'sse_stream', 'DashboardFeed'
+]
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Sync pipeline load generator.
+
+Fills a scratch parking_log with N parking records (with real JPEG images,
+same scenario mix as cleanup_backup/test_data_generator.py), then drains it
+through NetworkManager against the mock backend and reports drain time,
+events/sec and bytes/sec for each sync strategy.
+
+    python3 load_generator.py --events 500 --strategy all --latency-ms 30 --error-rate 0.05
+
+A scratch database and picture directory are used so the real
+parking_data.db is never touched.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import time
+
+import cv2
+import numpy as np
+
+from core_utils import (
+    STATUS_INSIDE, STATUS_COMPLETED,
+    STATUS_FAIL_NO_PLATE, STATUS_FAIL_PLATE_INSIDE, STATUS_FAIL_PLATE_MISMATCH,
+    SafeDatabaseManager, SafeErrorLogger, NetworkManager, CircuitBreaker, SyncResult,
+    build_sync_event, read_event_image, get_vietnam_time_object
+)
+from mock_server import MockServerThread, add_settings_arguments, settings_from_args
+
+STRATEGIES = ('single', 'batch')
+
+# (status, weight) - roughly what a day at the gate looks like
+SCENARIO_MIX = [
+    (STATUS_COMPLETED, 50),
+    (STATUS_INSIDE, 30),
+    (STATUS_FAIL_NO_PLATE, 10),
+    (STATUS_FAIL_PLATE_INSIDE, 5),
+    (STATUS_FAIL_PLATE_MISMATCH, 5),
+]
+
+
+def make_test_frame(width: int = 640, height: int = 480, quality: int = 85) -> bytes:
+    """Encode a camera-sized synthetic frame so image sizes match production."""
+    frame = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (9, 9), 0)
+    cv2.rectangle(frame, (220, 300), (420, 360), (255, 255, 255), -1)
+    cv2.putText(frame, "51F-123.45", (230, 345), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not ok:
+        raise RuntimeError("Cannot encode test frame")
+    return buf.tobytes()
+
+
+def fill_parking_log(db_manager: SafeDatabaseManager, picture_dir: str, count: int,
+                     image_bytes: bytes) -> int:
+    """Insert `count` unsynced events with image files; returns bytes written to disk."""
+    statuses = [status for status, _ in SCENARIO_MIX]
+    weights = [weight for _, weight in SCENARIO_MIX]
+    start = get_vietnam_time_object()
+    written = 0
+
+    for index in range(count):
+        status = random.choices(statuses, weights)[0]
+        plate = f"LOAD{index:06d}"
+        time_in = start.strftime("%Y-%m-%d %H:%M:%S")
+
+        image_in = f"raw_load_in_{index:06d}.jpg"
+        with open(os.path.join(picture_dir, image_in), 'wb') as f:
+            f.write(image_bytes)
+        written += len(image_bytes)
+
+        entry_status = STATUS_INSIDE if status == STATUS_COMPLETED else status
+        record_id = db_manager.insert_vehicle_entry(plate, f"RFID{index:06d}", time_in, image_in, entry_status)
+
+        if status == STATUS_COMPLETED:
+            image_out = f"raw_load_out_{index:06d}.jpg"
+            with open(os.path.join(picture_dir, image_out), 'wb') as f:
+                f.write(image_bytes)
+            written += len(image_bytes)
+            db_manager.update_vehicle_exit(record_id, time_in, image_out)
+
+    return written
+
+
+def drain(db_manager: SafeDatabaseManager, network_manager: NetworkManager, picture_dir: str,
+          uid: str, strategy: str, batch_size: int, max_seconds: float) -> dict:
+    """Sync everything pending with the given strategy; returns client-side counters."""
+    limit = batch_size if strategy == 'batch' else 1
+    counters = {'synced': 0, 'invalid': 0, 'temporary_failures': 0, 'circuit_waits': 0, 'bytes_sent': 0}
+    deadline = time.monotonic() + max_seconds
+
+    while time.monotonic() < deadline:
+        pending = db_manager.get_pending_events(limit=limit)
+        if not pending:
+            break
+
+        events = []
+        for event in pending:
+            event_payload, image_filename = build_sync_event(event, uid)
+            image_bytes = read_event_image(picture_dir, image_filename)
+            db_manager.begin_event_attempt(event)
+            events.append((event_payload, image_bytes, event['idempotency_key']))
+
+        if strategy == 'batch':
+            results = network_manager.send_events_batch(events)
+        else:
+            results = [network_manager.send_event_to_server(*events[0])]
+
+        for event, (event_payload, image_bytes, _), result in zip(pending, events, results):
+            if result == SyncResult.SUCCESS:
+                db_manager.complete_event(event)
+                counters['synced'] += 1
+                counters['bytes_sent'] += len(json.dumps(event_payload)) + len(image_bytes or b'')
+            elif result == SyncResult.PERMANENT_FAILURE:
+                db_manager.complete_event(event, invalid=True)
+                counters['invalid'] += 1
+            elif result == SyncResult.CIRCUIT_OPEN:
+                counters['circuit_waits'] += 1
+                remaining = deadline - time.monotonic()
+                time.sleep(max(min(network_manager.circuit_breaker.seconds_until_trial(), remaining), 0.01))
+                break
+            else:
+                counters['temporary_failures'] += 1
+
+    counters['pending'] = len(db_manager.get_pending_events(limit=1_000_000))
+    return counters
+
+
+def run_strategy(args, strategy: str, server: MockServerThread, image_bytes: bytes) -> dict:
+    """Build a fresh scratch DB, fill it and drain it with one strategy."""
+    work_dir = os.path.join(args.work_dir, strategy)
+    picture_dir = os.path.join(work_dir, "picture")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(picture_dir)
+
+    db_manager = SafeDatabaseManager(os.path.join(work_dir, "loadtest.db"), device_uid=args.uid)
+    db_manager.init_database()
+    fill_parking_log(db_manager, picture_dir, args.events, image_bytes)
+
+    error_logger = SafeErrorLogger(os.path.join(work_dir, "loadtest_error.log"))
+    network_manager = NetworkManager(args.api_endpoint or server.submit_url, error_logger, CircuitBreaker())
+    network_manager.retry_delay = args.retry_delay
+
+    if server:
+        server.stats.reset()
+
+    output = open(os.devnull, 'w') if not args.verbose else None
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+        counters = drain(db_manager, network_manager, picture_dir, args.uid, strategy,
+                         args.batch_size, args.max_seconds)
+    elapsed = time.perf_counter() - started
+    if output:
+        output.close()
+    network_manager.close()
+
+    server_stats = server.stats.as_dict() if server else {}
+    bytes_on_wire = server_stats.get('bytes_received') or counters['bytes_sent']
+    return {
+        'strategy': strategy,
+        'events': args.events,
+        'drain_seconds': round(elapsed, 3),
+        'events_per_sec': round(counters['synced'] / elapsed, 2) if elapsed else 0.0,
+        'bytes_per_sec': round(bytes_on_wire / elapsed, 1) if elapsed else 0.0,
+        'requests': server_stats.get('requests'),
+        'duplicates': server_stats.get('duplicates'),
+        **counters
+    }
+
+
+def print_report(results: list):
+    print("\n📊 [LoadGen] Sync drain results")
+    header = f"{'strategy':<10}{'events':>8}{'synced':>8}{'invalid':>8}{'pending':>8}{'seconds':>10}{'ev/s':>10}{'KB/s':>10}{'reqs':>8}{'dups':>6}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['strategy']:<10}{r['events']:>8}{r['synced']:>8}{r['invalid']:>8}{r['pending']:>8}"
+              f"{r['drain_seconds']:>10.2f}{r['events_per_sec']:>10.1f}{r['bytes_per_sec'] / 1024:>10.1f}"
+              f"{str(r['requests']):>8}{str(r['duplicates']):>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the sync pipeline")
+    parser.add_argument('--events', type=int, default=200, help='Number of parking_log rows to create (completed trips queue both IN and OUT)')
+    parser.add_argument('--strategy', choices=STRATEGIES + ('all',), default='all')
+    parser.add_argument('--batch-size', type=int, default=20)
+    parser.add_argument('--retry-delay', type=float, default=0.2, help='NetworkManager retry delay (s)')
+    parser.add_argument('--max-seconds', type=float, default=300.0, help='Give up draining after this long')
+    parser.add_argument('--api-endpoint', help='Use an external server instead of the in-process mock')
+    parser.add_argument('--uid', default='loadtest-device')
+    parser.add_argument('--work-dir', default=os.path.join('tmp', 'loadtest'))
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    parser.add_argument('--verbose', action='store_true', help='Show per-event network logs')
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    strategies = STRATEGIES if args.strategy == 'all' else (args.strategy,)
+    server = None if args.api_endpoint else MockServerThread(settings_from_args(args)).start()
+    image_bytes = make_test_frame()
+    print(f"🧪 [LoadGen] {args.events} events, frame size {len(image_bytes) / 1024:.1f} KB, "
+          f"strategies: {', '.join(strategies)}")
+
+    try:
+        results = [run_strategy(args, strategy, server, image_bytes) for strategy in strategies]
+    finally:
+        if server:
+            server.stop()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 [LoadGen] Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -21,12 +21,13 @@ show_usage() {
     echo "🚗 Parking System Management Tool"
     echo "================================="
     echo ""
-    echo "Usage: $0 {start|stop|restart|status|logs|help}"
+    echo "Usage: $0 {start|stop|restart|reload|status|logs|help}"
     echo ""
     echo "Commands:"
     echo "  start    - Start the parking system services"
     echo "  stop     - Stop all parking system services"
     echo "  restart  - Restart the parking system"
+    echo "  reload   - Gracefully reload the web interface (gunicorn, no downtime)"
     echo "  status   - Show system status"
     echo "  logs     - Show recent logs"
     echo "  help     - Show this help message"
@@ -43,7 +44,7 @@ start_services() {
     print_color $BLUE "🚀 Starting parking system..."
     
     # Check if already running
-    if pgrep -f "LPR\.py\|app\.py" > /dev/null; then
+    if pgrep -f "LPR\.py\|app\.py\|app:app" > /dev/null; then
         print_color $YELLOW "⚠️  Some services are already running. Use 'restart' to restart them."
         ./status.sh
         return 1
@@ -69,6 +70,33 @@ restart_services() {
     start_services
 }
 
+# Function to reload the web interface without downtime. The app is preloaded
+# in the gunicorn master, so HUP would not pick up new code: USR2 starts a new
+# master (new code) next to the old one, then TERM lets the old master's
+# workers finish their requests and exit
+reload_web() {
+    local pid_file="${WEB_PID_FILE:-tmp/gunicorn.pid}"
+    if [ ! -f "$pid_file" ] || ! kill -0 "$(cat "$pid_file")" 2>/dev/null; then
+        print_color $YELLOW "⚠️  gunicorn is not running; use 'restart' instead"
+        return 1
+    fi
+    local old_pid=$(cat "$pid_file")
+    print_color $BLUE "🔄 Reloading web interface (gunicorn PID: $old_pid)..."
+    kill -USR2 "$old_pid"
+    for _ in $(seq 1 30); do
+        sleep 1
+        # The new master writes <pid file>.2 and takes over the pid file once the old one exits
+        local new_pid=$(cat "$pid_file.2" 2>/dev/null || true)
+        if [ -n "$new_pid" ] && kill -0 "$new_pid" 2>/dev/null; then
+            kill -TERM "$old_pid"
+            print_color $GREEN "✅ Web interface reloaded (new PID: $new_pid)"
+            return 0
+        fi
+    done
+    print_color $RED "❌ New gunicorn master did not start; old one keeps serving (see flask_app.log)"
+    return 1
+}
+
 # Function to show status
 show_status() {
     ./status.sh
@@ -112,6 +140,9 @@ case "${1:-help}" in
     restart)
         restart_services
         ;;
+    reload)
+        reload_web
+        ;;
     status)
         show_status
         ;;
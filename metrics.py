@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus-style counters, gauges and histograms.
+
+Each process keeps its own MetricsRegistry and (with start_exporter)
+writes a JSON snapshot of it to a shared directory every few seconds;
+the web app's /metrics merges the snapshots of all live processes into
+one Prometheus text page, with a "process" label telling the gate and
+the web workers apart.
+
+This module imports nothing from the rest of the app, so core_utils and
+the subsystem modules can declare their metrics at import time.
+"""
+
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+
+# Seconds; covers a DB lock wait (ms) up to a slow swipe (several s)
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                           1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    """Base for one metric family; samples are keyed by label values."""
+
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{'labels': list(key), 'value': value} for key, value in self._values.items()]
+
+    def collect(self) -> Dict[str, Any]:
+        return {'name': self.name, 'type': self.kind, 'help': self.help,
+                'labelnames': list(self.labelnames), 'samples': self._samples()}
+
+
+class Counter(_Metric):
+    """Monotonically increasing count (events, errors, bytes)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0  # exported as 0 before the first inc()
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    Current value (queue depth, backlog, fps). Either set() from the code
+    that knows the value, or set_function() to read it at snapshot time.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._functions: Dict[Tuple[str, ...], Callable[[], Optional[float]]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def clear(self, **labels):
+        """Drop the set() value, so the sample is omitted until the next set()."""
+        key = self._key(labels)
+        with self._lock:
+            self._values.pop(key, None)
+
+    def set_function(self, function: Callable[[], Optional[float]], **labels):
+        """Call function at every snapshot; None (or an exception) omits the sample."""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def _samples(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, function in functions:
+            try:
+                value = function()
+            except Exception:
+                value = None
+            if value is not None:
+                values[key] = value
+        return [{'labels': list(key), 'value': value} for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (latencies) over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        if not self.labelnames:
+            self._values[()] = self._empty_state()
+
+    def _empty_state(self) -> Dict[str, Any]:
+        return {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)  # le semantics; len(buckets) is +Inf
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = self._empty_state()
+            state['counts'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block, in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{'labels': list(key), 'counts': list(state['counts']),
+                     'sum': state['sum'], 'count': state['count']}
+                    for key, state in self._values.items()]
+
+    def collect(self) -> Dict[str, Any]:
+        family = super().collect()
+        family['buckets'] = list(self.buckets)
+        return family
+
+
+class MetricsRegistry:
+    """
+    Metric families of one process, created on first use (get-or-create, so
+    modules can declare the metrics they update at import time).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: "OrderedDict[str, _Metric]" = OrderedDict()
+        self._exporter: Optional[threading.Thread] = None
+        self._exporter_stop = threading.Event()
+        self.export_path: Optional[str] = None
+        self.role: Optional[str] = None
+        self._collect_hooks: List[Callable[[], None]] = []
+
+    def _get_or_create(self, cls, name: str, help_text: str, labelnames: Tuple[str, ...], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered as {metric.kind} {metric.labelnames}")
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def add_collect_hook(self, hook: Callable[[], None]):
+        """
+        Call hook once before every snapshot, e.g. to set() several gauges
+        from one query instead of one set_function() query per gauge.
+        """
+        with self._lock:
+            self._collect_hooks.append(hook)
+
+    def snapshot(self, role: Optional[str] = None) -> Dict[str, Any]:
+        """Current values of every family as a JSON-serializable dict."""
+        with self._lock:
+            hooks = list(self._collect_hooks)
+        for hook in hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"⚠️  [Metrics] Collect hook failed: {e}")
+        with self._lock:
+            families = list(self._metrics.values())
+        return {
+            'process': role or self.role or f"pid-{os.getpid()}",
+            'pid': os.getpid(),
+            'updated_at': time.time(),
+            'metrics': [family.collect() for family in families],
+        }
+
+    def flush(self):
+        """Write the snapshot file now (no-op before start_exporter)."""
+        if not self.export_path:
+            return
+        tmp_path = f"{self.export_path}.{os.getpid()}.tmp"
+        try:
+            data = json.dumps(self.snapshot(), separators=(',', ':')).encode("utf-8")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.export_path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"⚠️  [Metrics] Cannot write {self.export_path}: {e}")
+
+    def start_exporter(self, role: str, directory: str, interval: float) -> "MetricsRegistry":
+        """
+        Write this process's snapshot to <directory>/<role>.json every
+        interval seconds from a daemon thread, so /metrics in the web app
+        can serve it. Idempotent; call it in the process that owns the
+        metrics (after fork, not before).
+        """
+        with self._lock:
+            if self._exporter and self._exporter.is_alive():
+                return self
+            os.makedirs(directory, exist_ok=True)
+            self.role = role
+            self.export_path = os.path.join(directory, f"{role}.json")
+            self._exporter_stop.clear()
+            self._exporter = threading.Thread(target=self._export_loop, args=(interval,),
+                                              name="MetricsExporter", daemon=True)
+            self._exporter.start()
+        print(f"📈 [Metrics] Exporting '{role}' to {self.export_path} every {interval:g}s")
+        return self
+
+    def _export_loop(self, interval: float):
+        while not self._exporter_stop.is_set():
+            self.flush()
+            self._exporter_stop.wait(interval)
+
+    def stop_exporter(self):
+        """Stop exporting and remove the snapshot file (the process is going away)."""
+        self._exporter_stop.set()
+        if self._exporter:
+            self._exporter.join(timeout=2.0)
+        if self.export_path:
+            try:
+                os.remove(self.export_path)
+            except OSError:
+                pass
+        self._exporter = None
+
+
+def _process_alive(pid: Any) -> bool:
+    try:
+        os.kill(int(pid), 0)
+    except (OSError, TypeError, ValueError):
+        return False
+    return True
+
+
+def read_metric_snapshots(directory: str, max_age: float,
+                          exclude_pid: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Snapshots written by other processes' exporters. Files of processes
+    that died (their files are removed), or not refreshed within max_age
+    seconds, are skipped.
+    """
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    except OSError:
+        return []
+    snapshots = []
+    now = time.time()
+    for name in names:
+        try:
+            with open(os.path.join(directory, name), 'rb') as f:
+                snapshot = json.loads(f.read())
+        except (OSError, ValueError):
+            continue
+        pid = snapshot.get('pid')
+        if pid == exclude_pid:
+            continue
+        if not _process_alive(pid):
+            # Killed without stop_exporter (e.g. a recycled web worker)
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+            continue
+        if now - snapshot.get('updated_at', 0) > max_age:
+            continue
+        snapshots.append(snapshot)
+    return snapshots
+
+
+def _format_metric_value(value: float) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(names: List[str], values: List[str]) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+def render_prometheus(snapshots: List[Dict[str, Any]]) -> str:
+    """
+    Prometheus text exposition (format 0.0.4) of several processes'
+    snapshots. Families with the same name are merged; every sample gets a
+    "process" label with the snapshot's process name.
+    """
+    families: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    for snapshot in snapshots:
+        for family in snapshot.get('metrics', []):
+            merged = families.setdefault(family['name'], {'family': family, 'parts': []})
+            merged['parts'].append((snapshot.get('process', '?'), family))
+
+    lines = []
+    for name, merged in families.items():
+        first = merged['family']
+        help_text = first.get('help', '').replace('\\', '\\\\').replace('\n', '\\n')
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {first['type']}")
+        for process, family in merged['parts']:
+            if family['type'] != first['type']:
+                continue
+            names = ['process'] + family.get('labelnames', [])
+            for sample in family['samples']:
+                values = [process] + sample['labels']
+                if family['type'] != 'histogram':
+                    lines.append(f"{name}{_format_labels(names, values)} {_format_metric_value(sample['value'])}")
+                    continue
+                cumulative = 0
+                bounds = [_format_metric_value(b) for b in family['buckets']] + ["+Inf"]
+                for bound, count in zip(bounds, sample['counts']):
+                    cumulative += count
+                    labels = _format_labels(names + ['le'], values + [bound])
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                labels = _format_labels(names, values)
+                lines.append(f"{name}_sum{labels} {_format_metric_value(sample['sum'])}")
+                lines.append(f"{name}_count{labels} {sample['count']}")
+    return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+__all__ = [
+    'Counter', 'Gauge', 'Histogram', 'MetricsRegistry', 'metrics', 'read_metric_snapshots',
+    'render_prometheus', 'DEFAULT_LATENCY_BUCKETS'
+]
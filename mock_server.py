@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the parking backend.
+
+Serves the same endpoints LPR.py talks to (/api/events/submit, the batch
+variant /api/events/submit_batch and /api/events/health) with configurable
+latency, error rate, 4xx/5xx mix and an upload bandwidth cap, so the sync
+pipeline can be measured without the real server. Events carrying an
+idempotency key that was already accepted are acknowledged but not stored
+again, like the real backend is expected to do.
+
+    python3 mock_server.py --port 3000 --latency-ms 50 --error-rate 0.1
+
+Point API_ENDPOINT at http://localhost:3000/api/events/submit.
+"""
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+
+class MockServerSettings:
+    """Fault-injection knobs for the mock server."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, client_error_ratio: float = 0.5,
+                 bandwidth_kbps: float = 0.0):
+        self.latency_ms = latency_ms                    # Fixed delay per request
+        self.jitter_ms = jitter_ms                      # Extra uniform random delay
+        self.error_rate = error_rate                    # Probability an event fails
+        self.client_error_ratio = client_error_ratio    # Share of failures that are 4xx (rest 5xx)
+        self.bandwidth_kbps = bandwidth_kbps            # Upload cap in kbit/s, 0 = unlimited
+
+
+class MockServerStats:
+    """Thread-safe counters for what the mock server received."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.events_accepted = 0
+            self.events_rejected = 0
+            self.duplicates = 0
+            self.replays = 0
+            self.bytes_received = 0
+            self.status_codes = {}
+            self._seen_events = set()
+            self._seen_keys = set()
+
+    def record_request(self, status_code: int, body_bytes: int):
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += body_bytes
+            self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+
+    def is_replay(self, idempotency_key) -> bool:
+        """True if an event with this key was already accepted."""
+        if not idempotency_key:
+            return False
+        with self._lock:
+            if idempotency_key in self._seen_keys:
+                self.replays += 1
+                return True
+            return False
+
+    def record_event(self, event: dict, accepted: bool, idempotency_key=None):
+        key = (event.get('uid'), str(event.get('device_db_id')), event.get('event_type'))
+        with self._lock:
+            if not accepted:
+                self.events_rejected += 1
+                return
+            self.events_accepted += 1
+            if idempotency_key:
+                self._seen_keys.add(idempotency_key)
+            if key in self._seen_events:
+                self.duplicates += 1
+            self._seen_events.add(key)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'events_accepted': self.events_accepted,
+                'events_rejected': self.events_rejected,
+                'duplicates': self.duplicates,
+                'replays': self.replays,
+                'bytes_received': self.bytes_received,
+                'status_codes': {str(k): v for k, v in self.status_codes.items()},
+            }
+
+
+def create_mock_app(settings: MockServerSettings, stats: MockServerStats) -> Flask:
+    """Build the Flask app for the mock backend."""
+    app = Flask(__name__)
+
+    def _simulate_transfer() -> int:
+        """Apply latency and bandwidth cap; return request body size."""
+        body_bytes = request.content_length or len(request.get_data(cache=True))
+        delay = settings.latency_ms / 1000.0
+        if settings.jitter_ms:
+            delay += random.uniform(0, settings.jitter_ms) / 1000.0
+        if settings.bandwidth_kbps:
+            delay += body_bytes * 8 / (settings.bandwidth_kbps * 1000.0)
+        if delay > 0:
+            time.sleep(delay)
+        return body_bytes
+
+    def _draw_fault():
+        """Return None, 'client' or 'server' according to the configured mix."""
+        if random.random() >= settings.error_rate:
+            return None
+        return 'client' if random.random() < settings.client_error_ratio else 'server'
+
+    def _read_event() -> dict:
+        if request.is_json:
+            return request.get_json(silent=True) or {}
+        return request.form.to_dict()
+
+    @app.route('/api/events/health')
+    @app.route('/api/parking/events/health')
+    def health():
+        return jsonify({'status': 'ok'})
+
+    @app.route('/api/events/submit', methods=['POST'])
+    @app.route('/api/parking/events/submit', methods=['POST'])
+    def submit():
+        body_bytes = _simulate_transfer()
+        event = _read_event()
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if stats.is_replay(idempotency_key):
+            # Already applied: acknowledge again without storing a second copy
+            stats.record_request(200, body_bytes)
+            return jsonify({'status': 'duplicate', 'device_db_id': event.get('device_db_id')})
+
+        fault = _draw_fault()
+
+        if fault == 'server':
+            stats.record_request(503, body_bytes)
+            return jsonify({'error': 'simulated server error'}), 503
+        if fault == 'client':
+            stats.record_event(event, accepted=False)
+            stats.record_request(422, body_bytes)
+            return jsonify({'error': 'simulated validation error'}), 422
+
+        stats.record_event(event, accepted=True, idempotency_key=idempotency_key)
+        stats.record_request(200, body_bytes)
+        return jsonify({'status': 'accepted', 'device_db_id': event.get('device_db_id')})
+
+    @app.route('/api/events/submit_batch', methods=['POST'])
+    @app.route('/api/parking/events/submit_batch', methods=['POST'])
+    def submit_batch():
+        body_bytes = _simulate_transfer()
+        try:
+            events = json.loads(request.form.get('events', '[]'))
+        except ValueError:
+            stats.record_request(400, body_bytes)
+            return jsonify({'error': 'invalid events field'}), 400
+
+        replays = [stats.is_replay(event.get('idempotency_key')) for event in events]
+        faults = [None if replay else _draw_fault() for replay in replays]
+        if 'server' in faults:
+            # A server-side failure aborts the whole batch
+            stats.record_request(503, body_bytes)
+            return jsonify({'error': 'simulated server error'}), 503
+
+        results = []
+        for event, fault, replay in zip(events, faults, replays):
+            accepted = fault is None
+            if not replay:
+                stats.record_event(event, accepted=accepted, idempotency_key=event.get('idempotency_key'))
+            results.append({'device_db_id': event.get('device_db_id'), 'status': 200 if accepted else 422})
+
+        stats.record_request(200, body_bytes)
+        return jsonify({'results': results})
+
+    @app.route('/api/events/stats', methods=['GET', 'DELETE'])
+    def server_stats():
+        if request.method == 'DELETE':
+            stats.reset()
+        return jsonify(stats.as_dict())
+
+    return app
+
+
+class MockServerThread:
+    """Run the mock server in a background thread (used by load_generator.py)."""
+
+    def __init__(self, settings: MockServerSettings, host: str = '127.0.0.1', port: int = 0):
+        # Per-request access logs would dominate the load generator's output
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self.stats = MockServerStats()
+        self.app = create_mock_app(settings, self.stats)
+        self._server = make_server(host, port, self.app, threaded=True)
+        self.host = host
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MockServer", daemon=True)
+
+    @property
+    def submit_url(self) -> str:
+        return f"http://{self.host}:{self.port}/api/events/submit"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._thread.join(timeout=2.0)
+
+
+def add_settings_arguments(parser: argparse.ArgumentParser):
+    """Fault-injection CLI options shared with load_generator.py."""
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Fixed delay per request')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Extra random delay per request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability an event fails (0-1)')
+    parser.add_argument('--client-error-ratio', type=float, default=0.5,
+                        help='Share of failures returned as 4xx; the rest are 5xx')
+    parser.add_argument('--bandwidth-kbps', type=float, default=0.0, help='Upload cap in kbit/s, 0 = unlimited')
+
+
+def settings_from_args(args) -> MockServerSettings:
+    return MockServerSettings(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        client_error_ratio=args.client_error_ratio,
+        bandwidth_kbps=args.bandwidth_kbps
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock parking backend for sync testing")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=3000)
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    app = create_mock_app(settings_from_args(args), MockServerStats())
+    print(f"🧪 [MockServer] Listening on {args.host}:{args.port}")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
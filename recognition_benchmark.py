@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Plate recognition benchmark on recorded frames.
+
+Replays a directory of recorded frames with known plates through the
+gate's recognition pipeline exactly as LPR.py runs it (frame quality gate,
+PlateRecognizer detector + crop + OCR in batches, plate normalization),
+with no camera, RFID reader or server. --full adds the rest of an entry:
+the DB lookup, the event image write and the DB commit, on a throwaway
+database. Reports per-stage latency distributions, throughput, peak memory
+and plate accuracy, and writes them as JSON so runs can be compared:
+
+    python3 recognition_benchmark.py --fixtures bench/frames --json base.json
+    # ... change function/helper.py, utils_rotate.deskew or the model files ...
+    python3 recognition_benchmark.py --fixtures bench/frames --json new.json --compare base.json
+
+--compare exits with status 1 when total p95 latency or plate accuracy
+regressed beyond --max-slowdown / --max-accuracy-drop.
+
+Fixtures are image files plus ground_truth.csv with the columns file,plate
+(an empty plate means no readable plate is expected). --record builds a
+starting set from the gate's own event pictures; its plates are what the
+gate read, so check and correct them before using the set:
+
+    python3 recognition_benchmark.py --record bench/frames --limit 200
+
+Needs torch and the models, like LPR.py (YOLOV5_REPO_PATH,
+LP_DETECTOR_MODEL_PATH and LP_OCR_MODEL_PATH from .env).
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+
+from core_utils import (
+    STATUS_INSIDE, STATUS_FAIL_NO_PLATE, SafeDatabaseManager, AsyncImageWriter, percentile,
+    safe_normalize_plate, get_vietnam_time_str, Config
+)
+from camera import score_frame_quality
+from lanes import PlateRecognizer, load_plate_models
+
+GROUND_TRUTH_FILE = "ground_truth.csv"
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+# In pipeline order; lookup/image/commit only run with --full
+STAGES = ('quality', 'detect', 'crop', 'ocr', 'normalize', 'lookup', 'image', 'commit')
+
+
+def file_digest(path) -> str:
+    """Short sha256 of a file, to tell which model/helper version a result came from."""
+    if not path or not os.path.isfile(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), else the peak."""
+    try:
+        with open('/proc/self/statm') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024, 1)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)
+
+
+def edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def load_fixtures(directory: str) -> list:
+    """[(file name, expected normalized plate or "")] from ground_truth.csv."""
+    path = os.path.join(directory, GROUND_TRUTH_FILE)
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    fixtures = []
+    for row in rows:
+        name = (row.get('file') or '').strip()
+        if not name:
+            continue
+        if not os.path.isfile(os.path.join(directory, name)):
+            print(f"⚠️  [RecogBench] {name} is listed in {GROUND_TRUTH_FILE} but missing, skipped")
+            continue
+        plate = safe_normalize_plate((row.get('plate') or '').strip())
+        fixtures.append((name, "" if plate == "UNKNOWN" else plate))
+    return fixtures
+
+
+def record_fixtures(directory: str, limit: int, db_file: str, picture_dir: str):
+    """Copy the newest event pictures and the plates the gate read into a fixture set."""
+    os.makedirs(directory, exist_ok=True)
+    db_manager = SafeDatabaseManager(db_file)
+    rows, seen = [], set()
+    for event in SafeDatabaseManager.iter_pages(db_manager.query_log_events, batch_size=500):
+        if len(rows) >= limit:
+            break
+        if not event['image'] or event['image'] in seen or not os.path.isfile(os.path.join(picture_dir, event['image'])):
+            continue
+        seen.add(event['image'])
+        shutil.copy2(os.path.join(picture_dir, event['image']), os.path.join(directory, event['image']))
+        plate = safe_normalize_plate(event['plate'])
+        rows.append({'file': event['image'], 'plate': "" if plate == "UNKNOWN" else plate})
+
+    with open(os.path.join(directory, GROUND_TRUTH_FILE), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=('file', 'plate'))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"💾 [RecogBench] {len(rows)} frames written to {directory}; "
+          f"check the plates in {GROUND_TRUTH_FILE} before benchmarking")
+
+
+class FullPipeline:
+    """The entry path after recognition (LPR.py), on a throwaway database and picture dir."""
+
+    def __init__(self):
+        self.directory = tempfile.mkdtemp(prefix="recog_bench_")
+        self.db_manager = SafeDatabaseManager(os.path.join(self.directory, "bench.db"))
+        self.db_manager.init_database()
+        self.image_writer = AsyncImageWriter(os.path.join(self.directory, "picture"),
+                                             max_queue=Config.IMAGE_WRITE_QUEUE_SIZE,
+                                             durable=Config.IMAGE_WRITE_DURABLE)
+        os.makedirs(self.image_writer.picture_dir, exist_ok=True)
+        self.image_writer.start()
+        self.events = 0
+
+    def run(self, plate: str, frame, crop, timings: dict):
+        self.events += 1
+        index = self.events
+        token = f"bench-{index}"
+        started = time.perf_counter()
+        self.db_manager.get_vehicle_inside_by_rfid(token)
+        if plate != "UNKNOWN":
+            self.db_manager.is_plate_inside(plate)
+        timings['lookup'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        raw = self.image_writer.submit(f"raw_in_bench_{index}.jpg", frame)
+        if crop is not None and crop.size > 0:
+            self.image_writer.submit(f"crop_in_bench_{index}.jpg", crop)
+        timings['image'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        self.db_manager.insert_vehicle_entry(plate, token, get_vietnam_time_str(), raw,
+                                             STATUS_INSIDE if plate != "UNKNOWN" else STATUS_FAIL_NO_PLATE)
+        timings['commit'] = time.perf_counter() - started
+
+    def close(self) -> dict:
+        self.image_writer.stop()
+        stats = self.image_writer.get_stats()
+        self.db_manager.close_connections()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        return stats
+
+
+def run_pipeline(recognizer: PlateRecognizer, frames: list, gating: bool, full) -> list:
+    """
+    One batch through the gate's steps; [(normalized plate, stage timings,
+    skipped by the quality gate)] per frame.
+    """
+    results = [None] * len(frames)
+    timings = [{} for _ in frames]
+    to_recognize = []
+    for i, frame in enumerate(frames):
+        started = time.perf_counter()
+        quality = score_frame_quality(frame)
+        timings[i]['quality'] = time.perf_counter() - started
+        if gating and not quality.usable:
+            results[i] = (None, None)  # LPR.py treats it like an unreadable plate
+        else:
+            to_recognize.append(i)
+
+    if to_recognize:
+        for i, (text, crop, stage_times) in zip(to_recognize,
+                                                recognizer.recognize_batch([frames[i] for i in to_recognize])):
+            results[i] = (text, crop)
+            timings[i].update(stage_times)
+
+    outputs = []
+    for i, frame in enumerate(frames):
+        text, crop = results[i]
+        started = time.perf_counter()
+        plate = safe_normalize_plate(text)
+        timings[i]['normalize'] = time.perf_counter() - started
+        if full:
+            full.run(plate, frame, crop, timings[i])
+        outputs.append((plate, timings[i], i not in to_recognize))
+    return outputs
+
+
+def distribution(samples: list) -> dict:
+    """Latency distribution in ms."""
+    values = sorted(s * 1000 for s in samples)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values), 3),
+        'p50_ms': round(percentile(values, 50), 3),
+        'p95_ms': round(percentile(values, 95), 3),
+        'p99_ms': round(percentile(values, 99), 3),
+        'max_ms': round(values[-1], 3),
+    }
+
+
+def benchmark(args) -> dict:
+    fixtures = load_fixtures(args.fixtures)
+    if args.limit:
+        fixtures = fixtures[:args.limit]
+    if not fixtures:
+        raise SystemExit(f"❌ [RecogBench] No fixtures in {args.fixtures} (see {GROUND_TRUTH_FILE})")
+
+    rss_start = rss_mb()
+    started = time.perf_counter()
+    detector, ocr_model = load_plate_models(args.yolov5_repo, args.detector, args.ocr)
+    import function.helper as helper
+    import function.utils_rotate as utils_rotate
+    recognizer = PlateRecognizer(detector, ocr_model, helper.read_plate,
+                                 deskew=utils_rotate.deskew if args.deskew else None)
+    load_time = time.perf_counter() - started
+    rss_models = rss_mb()
+    print(f"🧠 [RecogBench] Models loaded in {load_time:.1f}s ({rss_models - rss_start:.0f} MB)")
+
+    def load(name):
+        frame = cv2.imread(os.path.join(args.fixtures, name))
+        if frame is None:
+            print(f"⚠️  [RecogBench] Cannot decode {name}, skipped")
+        return frame
+
+    # Warm-up (first passes allocate buffers / pick kernels), not recorded
+    warmup = [f for f in (load(name) for name, _ in fixtures[:args.warmup]) if f is not None]
+    if warmup:
+        run_pipeline(recognizer, warmup, args.gating, None)
+
+    full = FullPipeline() if args.full else None
+    samples = {stage: [] for stage in STAGES}
+    totals = []
+    outcomes = []
+    pipeline_time = 0.0
+    try:
+        for _ in range(args.repeat):
+            for offset in range(0, len(fixtures), args.batch_size):
+                batch = [(name, expected, load(name)) for name, expected in fixtures[offset:offset + args.batch_size]]
+                batch = [item for item in batch if item[2] is not None]
+                if not batch:
+                    continue
+                started = time.perf_counter()
+                outputs = run_pipeline(recognizer, [frame for _, _, frame in batch], args.gating, full)
+                pipeline_time += time.perf_counter() - started
+                for (name, expected, _), (plate, timings, skipped) in zip(batch, outputs):
+                    for stage, seconds in timings.items():
+                        samples[stage].append(seconds)
+                    totals.append(sum(timings.values()))
+                    outcomes.append((name, expected, "" if plate == "UNKNOWN" else plate, skipped))
+    finally:
+        image_writer_stats = full.close() if full else None
+
+    return {
+        'meta': {
+            'time': get_vietnam_time_str(),
+            'git_revision': git_revision(),
+            'host': platform.node(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'torch': sys.modules['torch'].__version__ if 'torch' in sys.modules else None,
+            'cpu_count': os.cpu_count(),
+            'fixtures': os.path.abspath(args.fixtures),
+            'frames': len(fixtures),
+            'repeat': args.repeat,
+            'batch_size': args.batch_size,
+            'deskew': args.deskew,
+            'quality_gating': args.gating,
+            'full_pipeline': args.full,
+            'files': {
+                'detector': file_digest(args.detector),
+                'ocr': file_digest(args.ocr),
+                'helper.py': file_digest(helper.__file__),
+                'utils_rotate.py': file_digest(utils_rotate.__file__),
+            },
+        },
+        'throughput': {
+            'frames': len(totals),
+            'seconds': round(pipeline_time, 3),
+            'frames_per_sec': round(len(totals) / pipeline_time, 2) if pipeline_time else None,
+        },
+        'latency': {
+            'total': distribution(totals),
+            'stages': {stage: distribution(values) for stage, values in samples.items() if values},
+        },
+        'memory': {
+            'rss_start_mb': rss_start,
+            'rss_after_models_mb': rss_models,
+            'rss_end_mb': rss_mb(),
+            'peak_rss_mb': peak_rss_mb(),
+            'model_load_seconds': round(load_time, 2),
+        },
+        'accuracy': accuracy(outcomes),
+        'image_writer': image_writer_stats,
+    }
+
+
+def accuracy(outcomes: list) -> dict:
+    """Plate accuracy over [(file, expected, predicted, skipped)] (plates normalized, "" = none)."""
+    with_plate = [o for o in outcomes if o[1]]
+    without_plate = [o for o in outcomes if not o[1]]
+    exact = sum(1 for _, expected, predicted, _ in with_plate if predicted == expected)
+    unread = sum(1 for _, _, predicted, _ in with_plate if not predicted)
+    chars = sum(len(expected) for _, expected, _, _ in with_plate)
+    errors = sum(min(edit_distance(expected, predicted), len(expected)) for _, expected, predicted, _ in with_plate)
+    mistakes = [{'file': name, 'expected': expected or None, 'predicted': predicted or None, 'skipped': skipped}
+                for name, expected, predicted, skipped in outcomes if predicted != expected]
+    return {
+        'frames': len(outcomes),
+        'frames_with_plate': len(with_plate),
+        'plate_accuracy': round(100.0 * exact / len(with_plate), 2) if with_plate else None,
+        'char_accuracy': round(100.0 * (1 - errors / chars), 2) if chars else None,
+        'unread_rate': round(100.0 * unread / len(with_plate), 2) if with_plate else None,
+        'misread_rate': round(100.0 * (len(with_plate) - exact - unread) / len(with_plate), 2) if with_plate else None,
+        'false_reads': sum(1 for o in without_plate if o[2]),
+        'skipped_by_quality_gate': sum(1 for o in outcomes if o[3]),
+        'mistakes': mistakes,
+    }
+
+
+def print_report(result: dict):
+    print("\n📊 [RecogBench] Latency per frame")
+    header = f"{'stage':<11}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(result['latency']['stages'].items()) + [('total', result['latency']['total'])]
+    for stage, d in rows:
+        if not d.get('count'):
+            continue
+        print(f"{stage:<11}{d['count']:>7}{d['mean_ms']:>10.2f}{d['p50_ms']:>10.2f}{d['p95_ms']:>10.2f}"
+              f"{d['p99_ms']:>10.2f}{d['max_ms']:>10.2f}")
+
+    t, m, a = result['throughput'], result['memory'], result['accuracy']
+    print(f"\n🚀 [RecogBench] Throughput: {t['frames_per_sec']} frames/s ({t['frames']} frames in {t['seconds']}s, "
+          f"batch size {result['meta']['batch_size']})")
+    print(f"🧠 [RecogBench] Memory: {m['rss_after_models_mb']} MB after loading models, "
+          f"peak {m['peak_rss_mb']} MB")
+    print(f"🎯 [RecogBench] Plate accuracy: {a['plate_accuracy']}% (chars {a['char_accuracy']}%), "
+          f"unread {a['unread_rate']}%, misread {a['misread_rate']}%, false reads {a['false_reads']}, "
+          f"skipped by quality gate {a['skipped_by_quality_gate']}")
+    for mistake in a['mistakes'][:10]:
+        print(f"   ✗ {mistake['file']}: expected {mistake['expected']}, got {mistake['predicted']}")
+    if len(a['mistakes']) > 10:
+        print(f"   ... {len(a['mistakes']) - 10} more in the JSON output")
+
+
+def compare(result: dict, baseline: dict, max_slowdown: float, max_accuracy_drop: float) -> bool:
+    """Print the differences to a baseline run; False if it regressed beyond the limits."""
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if new is not None and old else "n/a"
+
+    print(f"\n🔍 [RecogBench] Compared to {baseline['meta'].get('time')} "
+          f"(rev {baseline['meta'].get('git_revision')})")
+    for key in ('fixtures', 'frames', 'batch_size', 'deskew', 'quality_gating', 'full_pipeline', 'files'):
+        if baseline['meta'].get(key) != result['meta'].get(key):
+            print(f"⚠️  [RecogBench] {key} differs from the baseline: "
+                  f"{baseline['meta'].get(key)} → {result['meta'].get(key)}")
+    old_stages = dict(baseline['latency']['stages'], total=baseline['latency']['total'])
+    new_stages = dict(result['latency']['stages'], total=result['latency']['total'])
+    for stage in list(STAGES) + ['total']:
+        new, old = new_stages.get(stage, {}), old_stages.get(stage, {})
+        if new.get('count') and old.get('count'):
+            print(f"   {stage:<10} p50 {old['p50_ms']:.2f} → {new['p50_ms']:.2f} ms ({change(new['p50_ms'], old['p50_ms'])}), "
+                  f"p95 {old['p95_ms']:.2f} → {new['p95_ms']:.2f} ms ({change(new['p95_ms'], old['p95_ms'])})")
+    print(f"   throughput {baseline['throughput']['frames_per_sec']} → {result['throughput']['frames_per_sec']} "
+          f"frames/s ({change(result['throughput']['frames_per_sec'], baseline['throughput']['frames_per_sec'])})")
+    old_accuracy, new_accuracy = baseline['accuracy']['plate_accuracy'], result['accuracy']['plate_accuracy']
+    print(f"   plate accuracy {old_accuracy}% → {new_accuracy}%")
+
+    ok = True
+    old_p95, new_p95 = baseline['latency']['total'].get('p95_ms'), result['latency']['total'].get('p95_ms')
+    if old_p95 and new_p95 and (new_p95 - old_p95) / old_p95 * 100 > max_slowdown:
+        print(f"❌ [RecogBench] Total p95 is more than {max_slowdown:g}% slower")
+        ok = False
+    if old_accuracy is not None and new_accuracy is not None and old_accuracy - new_accuracy > max_accuracy_drop:
+        print(f"❌ [RecogBench] Plate accuracy dropped by more than {max_accuracy_drop:g} points")
+        ok = False
+    if ok:
+        print("✅ [RecogBench] No regression beyond the limits")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the plate recognition pipeline on recorded frames")
+    parser.add_argument('--fixtures', help=f"Directory with frames and {GROUND_TRUTH_FILE}")
+    parser.add_argument('--record', metavar='DIR', help="Build a fixture set from the gate's event pictures")
+    parser.add_argument('--limit', type=int, default=0, help='Use (or record) at most this many frames')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Frames per detector batch (1 = a lone swipe; up to INFERENCE_MAX_BATCH with busy lanes)')
+    parser.add_argument('--repeat', type=int, default=1, help='Passes over the fixtures')
+    parser.add_argument('--warmup', type=int, default=3, help='Frames run once before measuring')
+    parser.add_argument('--deskew', action='store_true', default=Config.PLATE_DESKEW,
+                        help='Re-read unreadable crops after utils_rotate.deskew (PLATE_DESKEW)')
+    parser.add_argument('--no-gating', dest='gating', action='store_false', default=Config.FRAME_QUALITY_GATING,
+                        help='Run the detector on every frame, even ones the quality gate rejects')
+    parser.add_argument('--full', action='store_true',
+                        help='Also time the DB lookup, image write and DB commit (throwaway DB)')
+    parser.add_argument('--yolov5-repo', default=os.getenv("YOLOV5_REPO_PATH"))
+    parser.add_argument('--detector', default=os.getenv("LP_DETECTOR_MODEL_PATH"))
+    parser.add_argument('--ocr', default=os.getenv("LP_OCR_MODEL_PATH"))
+    parser.add_argument('--db', default=Config.DB_FILE, help='Database for --record')
+    parser.add_argument('--json', help='Write the results to this JSON file')
+    parser.add_argument('--compare', metavar='BASELINE', help='Earlier --json output to compare with')
+    parser.add_argument('--max-slowdown', type=float, default=10.0, help='Allowed total p95 slowdown in %%')
+    parser.add_argument('--max-accuracy-drop', type=float, default=1.0,
+                        help='Allowed plate accuracy drop in percentage points')
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixtures(args.record, args.limit or 200, args.db, Config.PICTURE_OUTPUT_DIR)
+        return
+    if not args.fixtures:
+        parser.error("--fixtures (or --record) is required")
+    if not all((args.yolov5_repo, args.detector, args.ocr)):
+        parser.error("model paths missing: set YOLOV5_REPO_PATH, LP_DETECTOR_MODEL_PATH and LP_OCR_MODEL_PATH")
+    args.batch_size = max(1, args.batch_size)
+
+    print(f"🧪 [RecogBench] {args.fixtures}: batch size {args.batch_size}, {args.repeat} pass(es), "
+          f"deskew {'on' if args.deskew else 'off'}, quality gate {'on' if args.gating else 'off'}"
+          f"{', full pipeline' if args.full else ''}")
+    result = benchmark(args)
+    print_report(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 [RecogBench] Results written to {args.json}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.max_slowdown, args.max_accuracy_drop):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
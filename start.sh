@@ -44,8 +44,13 @@ fuser -k -n tcp 5000 2>/dev/null || true
 sleep 1 # Chờ một chút để port được giải phóng
 
 # Chạy ứng dụng web trong background và lưu PID
+# Mặc định dùng gunicorn (gunicorn.conf.py); WEB_SERVER=dev để dùng server phát triển của Flask
 echo "🌐 Khởi động ứng dụng web theo dõi..."
-python3 app.py > flask_app.log 2>&1 &
+if [ "${WEB_SERVER:-gunicorn}" != "dev" ] && command -v gunicorn > /dev/null 2>&1; then
+    gunicorn -c gunicorn.conf.py app:app > flask_app.log 2>&1 &
+else
+    python3 app.py > flask_app.log 2>&1 &
+fi
 FLASK_PID=$!
 
 # Kiểm tra xem Flask app có khởi động thành công không
@@ -37,7 +37,7 @@ check_port() {
 
 # Check main services
 check_process "LPR\.py" "Main Parking System (LPR.py)"
-check_process "app\.py" "Web Interface (Flask)"
+check_process "app\.py\|gunicorn.*app:app" "Web Interface (Flask)"
 
 echo ""
 echo "🌐 Network Status"
@@ -53,7 +53,7 @@ files_to_check=(
     "parking_data.db:Database"
     "flask_app.log:Flask Logs"
     "error_log.txt:Error Logs"
-    "tmp/live_view.jpg:Live Camera Feed"
+    "/dev/shm/${FRAME_BUS_NAME:-ce232_frame_bus}:Live Camera Frame Bus"
 )
 
 for file_info in "${files_to_check[@]}"; do
@@ -32,6 +32,21 @@ kill_by_name() {
 # Stop LPR.py processes
 kill_by_name "LPR.py"
 
+# Stop gunicorn: TERM to the master lets workers finish within graceful_timeout
+WEB_PID_FILE="${WEB_PID_FILE:-$(dirname "$0")/tmp/gunicorn.pid}"
+if [ -f "$WEB_PID_FILE" ]; then
+    master_pid=$(cat "$WEB_PID_FILE")
+    if kill -0 "$master_pid" 2>/dev/null; then
+        echo "🛑 Stopping gunicorn master (PID: $master_pid)..."
+        kill -TERM "$master_pid" 2>/dev/null || true
+        for _ in $(seq 1 15); do
+            kill -0 "$master_pid" 2>/dev/null || break
+            sleep 1
+        done
+    fi
+fi
+kill_by_name "gunicorn.*app:app"
+
 # Stop app.py (Flask) processes
 kill_by_name "app.py"
 
@@ -49,7 +64,7 @@ pkill -f "python.*app\.py" 2>/dev/null || true
 sleep 2
 
 # Verify cleanup
-remaining_procs=$(pgrep -f "LPR\.py\|app\.py" 2>/dev/null || true)
+remaining_procs=$(pgrep -f "LPR\.py\|app\.py\|app:app" 2>/dev/null || true)
 if [ ! -z "$remaining_procs" ]; then
     echo "⚠️  Warning: Some processes may still be running: $remaining_procs"
     echo "   You may need to manually kill them with: kill -9 $remaining_procs"
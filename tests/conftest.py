@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The modules live at the repository root (no package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Config is read at import: keep the files app.py creates out of the tree
+_scratch = tempfile.mkdtemp(prefix="parking-tests-")
+for name, default in (("DB_FILE", "parking_data.db"), ("PICTURE_OUTPUT_DIR", "picture"),
+                      ("THUMBNAIL_DIR", "thumbnails"), ("METRICS_DIR", "metrics"),
+                      ("DASHBOARD_NOTIFY_DIR", "dashboard")):
+    os.environ.setdefault(name, os.path.join(_scratch, default))
+
+from core_utils import SafeDatabaseManager, SafeErrorLogger  # noqa: E402
+
+
+@pytest.fixture
+def db_manager(tmp_path):
+    """Fresh database in a temporary directory."""
+    manager = SafeDatabaseManager(str(tmp_path / "parking_data.db"), device_uid="TEST-UID")
+    manager.init_database()
+    return manager
+
+
+@pytest.fixture
+def error_logger(tmp_path):
+    return SafeErrorLogger(str(tmp_path / "error_log.txt"))
+
+
+@pytest.fixture
+def web(db_manager, monkeypatch):
+    """app.py bound to the temporary database, with an empty result cache."""
+    import app as web_app
+    from http_cache import QueryResultCache
+
+    monkeypatch.setattr(web_app, "db_manager", db_manager)
+    monkeypatch.setattr(web_app, "result_cache", QueryResultCache(db_manager.get_data_version))
+    web_app.app.config['TESTING'] = True
+    return web_app
@@ -0,0 +1,54 @@
+from core_utils import STATUS_INSIDE, get_vietnam_time_str
+
+
+def test_unchanged_data_version_is_answered_with_304(web):
+    client = web.app.test_client()
+    first = client.get('/log')
+    tag = first.headers['ETag']
+    assert first.status_code == 200 and tag.startswith('W/')
+
+    again = client.get('/log', headers={'If-None-Match': tag})
+    assert again.status_code == 304
+    assert again.get_data() == b""
+    assert again.headers['ETag'] == tag
+
+
+def test_a_new_swipe_changes_the_tag(web, db_manager):
+    client = web.app.test_client()
+    tag = client.get('/log').headers['ETag']
+
+    db_manager.insert_vehicle_entry("51A12345", "card-1", get_vietnam_time_str(), None, STATUS_INSIDE)
+    response = client.get('/log', headers={'If-None-Match': tag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != tag
+    assert "51A12345" in response.get_data(as_text=True)
+
+
+def test_sync_acknowledgements_keep_the_tag(web, db_manager):
+    db_manager.insert_vehicle_entry("51A12345", "card-1", get_vietnam_time_str(), None, STATUS_INSIDE)
+    client = web.app.test_client()
+    tag = client.get('/log').headers['ETag']
+
+    for event in db_manager.get_pending_events(10):
+        db_manager.complete_event(event)
+
+    assert client.get('/log', headers={'If-None-Match': tag}).status_code == 304
+
+
+def test_api_tag_depends_on_the_negotiated_format(web):
+    client = web.app.test_client()
+    ndjson = client.get('/api/v1/events', headers={'Accept': 'application/x-ndjson'})
+    assert ndjson.mimetype == 'application/x-ndjson'
+    assert 'Accept' in ndjson.headers['Vary']
+
+    response = client.get('/api/v1/events', headers={'Accept': 'application/json',
+                                                     'If-None-Match': ndjson.headers['ETag']})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    assert response.headers['ETag'] != ndjson.headers['ETag']
+
+    again = client.get('/api/v1/events', headers={'Accept': 'application/json',
+                                                  'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+    assert 'Accept' in again.headers['Vary']
@@ -0,0 +1,87 @@
+import struct
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from frame_bus import FrameBroadcaster, FrameBus, mjpeg_stream
+
+
+@pytest.fixture
+def bus_name():
+    return f"test_bus_{uuid.uuid4().hex[:8]}"
+
+
+def frame(value):
+    return np.full((4, 6, 3), value, dtype=np.uint8)
+
+
+def test_reader_follows_a_restarted_producer(bus_name, monkeypatch):
+    monkeypatch.setattr(FrameBus, 'REATTACH_INTERVAL', 0.0)
+    producer = FrameBus(bus_name, create=True, max_width=6, max_height=4)
+    reader = FrameBus(bus_name)
+    try:
+        producer.publish(frame(1))
+        producer.publish(frame(2))
+        seq, _, data = reader.read_latest(0)
+        assert seq == 2 and data[0, 0, 0] == 2
+
+        # Producer restart: the segment is replaced under the same name
+        producer.close()
+        producer = FrameBus(bus_name, create=True, max_width=6, max_height=4)
+        assert reader.read_latest(0) is None  # no stale frame from the dead segment
+        producer.publish(frame(3))
+
+        new_seq, _, data = reader.read_latest(seq)
+        assert data[0, 0, 0] == 3
+        assert new_seq > seq  # consumers waiting for a newer seq still get it
+    finally:
+        reader.close()
+        producer.close()
+
+
+def test_reader_gets_no_frame_once_the_producer_is_gone(bus_name, monkeypatch):
+    monkeypatch.setattr(FrameBus, 'REATTACH_INTERVAL', 0.0)
+    producer = FrameBus(bus_name, create=True, max_width=6, max_height=4)
+    reader = FrameBus(bus_name)
+    producer.publish(frame(1))
+    assert reader.read_latest(0) is not None
+    producer.close()
+    assert reader.read_latest(0) is None
+    reader.close()
+
+
+def test_write_left_in_progress_does_not_hang_readers(bus_name):
+    producer = FrameBus(bus_name, create=True, max_width=6, max_height=4)
+    reader = FrameBus(bus_name)
+    try:
+        producer.publish(frame(1))
+        # Producer died mid-publish: the counter stays odd
+        struct.pack_into("<Q", producer._shm.buf, 0, 3)
+
+        started = time.monotonic()
+        assert reader.read_latest(0) is None
+        assert reader.wait_for_frame(0, timeout=0.2) is None
+        assert time.monotonic() - started < 1.0
+    finally:
+        reader.close()
+        producer.close()
+
+
+def test_mjpeg_stream_resends_the_last_frame_while_no_new_one_arrives():
+    broadcaster = FrameBroadcaster()
+    broadcaster.publish(b"jpeg-1")
+    stream = mjpeg_stream(broadcaster, max_fps=0, keepalive=0.01)
+    first = next(stream)
+    assert first.endswith(b"jpeg-1\r\n")
+    assert next(stream) == first  # keepalive: the write reveals a viewer that left
+    assert broadcaster.subscriber_count == 1
+    stream.close()  # what the server does when that write fails
+    assert broadcaster.subscriber_count == 0
+
+
+def test_mjpeg_stream_without_any_frame_ends_and_unsubscribes():
+    broadcaster = FrameBroadcaster()
+    assert list(mjpeg_stream(broadcaster, max_fps=0, keepalive=0.01)) == []
+    assert broadcaster.subscriber_count == 0
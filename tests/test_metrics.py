@@ -0,0 +1,39 @@
+from metrics import MetricsRegistry
+
+
+def values(snapshot, name):
+    family = next(family for family in snapshot['metrics'] if family['name'] == name)
+    return [sample['value'] for sample in family['samples']]
+
+
+def test_collect_hook_runs_once_per_snapshot_for_all_gauges():
+    registry = MetricsRegistry()
+    backlog = registry.gauge('backlog', 'Pending events')
+    occupancy = registry.gauge('occupancy', 'Vehicles inside')
+    queries = []
+
+    def update():
+        queries.append(1)
+        summary = {'sync_pending': 3, 'occupancy': 7}
+        backlog.set(summary['sync_pending'])
+        occupancy.set(summary['occupancy'])
+
+    registry.add_collect_hook(update)
+    snapshot = registry.snapshot()
+
+    assert len(queries) == 1
+    assert values(snapshot, 'backlog') == [3]
+    assert values(snapshot, 'occupancy') == [7]
+
+
+def test_cleared_gauge_is_omitted_and_a_failing_hook_does_not_break_the_snapshot():
+    registry = MetricsRegistry()
+    occupancy = registry.gauge('occupancy', 'Vehicles inside')
+    occupancy.set(7)
+
+    def broken():
+        occupancy.clear()
+        raise RuntimeError("database is locked")
+
+    registry.add_collect_hook(broken)
+    assert values(registry.snapshot(), 'occupancy') == []
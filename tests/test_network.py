@@ -0,0 +1,39 @@
+from core_utils import CircuitBreaker, CircuitState, NetworkManager, SyncResult
+
+
+def make_network_manager(error_logger, failure_threshold=2):
+    breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=60.0)
+    manager = NetworkManager("http://127.0.0.1:9/api/events/submit", error_logger, circuit_breaker=breaker)
+    manager.retry_delay = 0
+    return manager
+
+
+def test_unexpected_errors_open_the_circuit(error_logger, monkeypatch):
+    manager = make_network_manager(error_logger)
+
+    def broken_request(*args, **kwargs):
+        raise ValueError("unexpected")
+
+    monkeypatch.setattr(manager, '_make_request', broken_request)
+    event = {'device_db_id': 1, 'event_type': 'IN'}
+
+    assert manager.send_event_to_server(event) == SyncResult.NETWORK_ERROR
+    assert manager.send_event_to_server(event) == SyncResult.CIRCUIT_OPEN
+    assert manager.circuit_breaker.state == CircuitState.OPEN
+    # Open: fails fast without touching the network
+    assert manager.send_event_to_server(event) == SyncResult.CIRCUIT_OPEN
+
+
+def test_unexpected_error_in_half_open_trial_reopens(error_logger, monkeypatch):
+    manager = make_network_manager(error_logger, failure_threshold=1)
+    breaker = manager.circuit_breaker
+    breaker.record_failure()
+    breaker._opened_at -= 120  # cooldown elapsed: the next send is the half-open trial
+
+    def broken_request(*args, **kwargs):
+        assert breaker.state == CircuitState.HALF_OPEN
+        raise ValueError("unexpected")
+
+    monkeypatch.setattr(manager, '_make_request', broken_request)
+    assert manager.send_event_to_server({'device_db_id': 1, 'event_type': 'IN'}) == SyncResult.CIRCUIT_OPEN
+    assert breaker.state == CircuitState.OPEN
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+
+from core_utils import STATUS_INSIDE, TRACE_KIND_EXIT, EventTrace, get_vietnam_time_str
+from http_cache import QueryResultCache
+
+
+class Counter:
+    """compute() stand-in that counts its calls."""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_hit_while_the_data_is_unchanged(db_manager):
+    cache = QueryResultCache(db_manager.get_data_version)
+    compute = Counter(["row"])
+
+    assert cache.get_or_compute('log', compute) == ["row"]
+    assert cache.get_or_compute('log', compute) == ["row"]
+    assert compute.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entry_exit_and_trace_writes_invalidate(db_manager):
+    cache = QueryResultCache(db_manager.get_data_version)
+    compute = Counter(["row"])
+    cache.get_or_compute('log', compute)
+
+    record_id = db_manager.insert_vehicle_entry("51A12345", "card-1", get_vietnam_time_str(), None, STATUS_INSIDE)
+    cache.get_or_compute('log', compute)
+    assert compute.calls == 2
+
+    db_manager.update_vehicle_exit(record_id, get_vietnam_time_str(), None)
+    cache.get_or_compute('log', compute)
+    assert compute.calls == 3
+
+    trace = EventTrace("lane-1")
+    trace.add('ocr', 0.02)
+    trace.set_event(record_id, TRACE_KIND_EXIT)
+    trace.close()
+    assert db_manager.record_event_trace(trace)
+    cache.get_or_compute('log', compute)
+    assert compute.calls == 4
+    assert cache.stale == 3
+
+
+def test_failed_queries_are_not_cached(db_manager):
+    cache = QueryResultCache(db_manager.get_data_version)
+    failing = Counter(None)
+
+    assert cache.get_or_compute('statistics', failing) is None
+    assert cache.get_or_compute('statistics', failing) is None
+    assert failing.calls == 2
+    assert cache.get_stats()['entries'] == 0
+
+    # The next successful result is kept as usual
+    recovered = Counter({'total_in': 1})
+    cache.get_or_compute('statistics', recovered)
+    cache.get_or_compute('statistics', recovered)
+    assert recovered.calls == 1
+
+
+def test_unknown_version_bypasses_the_cache():
+    cache = QueryResultCache(lambda: None)
+    compute = Counter(["row"])
+
+    cache.get_or_compute('log', compute)
+    cache.get_or_compute('log', compute)
+    assert compute.calls == 2
+    assert cache.uncached == 2
+
+
+class BrokenConnection:
+    """Per-thread data_version connection whose queries fail."""
+
+    def __init__(self):
+        self.closed = False
+
+    def execute(self, *args):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    def close(self):
+        self.closed = True
+
+
+def test_data_version_error_closes_the_thread_connection(db_manager):
+    broken = BrokenConnection()
+    db_manager._local.version_conn, db_manager._local.version_pid = broken, os.getpid()
+
+    assert db_manager.get_data_version() is None
+    assert broken.closed
+    assert db_manager.get_data_version() is not None  # reconnects on the next call
@@ -0,0 +1,134 @@
+import sqlite3
+
+from core_utils import (
+    STATUS_INSIDE, STATUS_COMPLETED, STATUS_INVALID, STATUS_FAIL_NO_PLATE,
+    SafeDatabaseManager, make_idempotency_key
+)
+
+TIME_IN = "2026-10-01 08:00:00"
+TIME_OUT = "2026-10-01 17:30:00"
+
+
+def query(db_manager, sql, params=()):
+    conn = sqlite3.connect(db_manager.db_file)
+    conn.row_factory = sqlite3.Row
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def outbox(db_manager):
+    return [(row['log_id'], row['event_type'])
+            for row in query(db_manager, "SELECT log_id, event_type FROM sync_outbox ORDER BY id")]
+
+
+def enqueue_entries(db_manager, count):
+    return [db_manager.insert_vehicle_entry(f"51A{i:05d}", f"card-{i}", TIME_IN, None, STATUS_INSIDE)
+            for i in range(count)]
+
+
+def test_entry_and_exit_each_append_an_event(db_manager):
+    record_id = db_manager.insert_vehicle_entry("51A12345", "card-1", TIME_IN, "in.jpg", STATUS_INSIDE)
+    assert db_manager.update_vehicle_exit(record_id, TIME_OUT, "out.jpg")
+
+    rows = query(db_manager, "SELECT * FROM sync_outbox ORDER BY id")
+    assert [(r['event_type'], r['event_time'], r['image_path']) for r in rows] == [
+        ("IN", TIME_IN, "in.jpg"), ("OUT", TIME_OUT, "out.jpg")]
+    assert rows[0]['idempotency_key'] == make_idempotency_key("TEST-UID", record_id, "IN")
+
+
+def test_backfill_queues_what_the_synced_flag_still_owed(tmp_path):
+    db_file = str(tmp_path / "parking_data.db")
+    old = SafeDatabaseManager(db_file, device_uid="TEST-UID")
+    old.init_database()
+    completed = old.insert_vehicle_entry("51A00001", "card-1", TIME_IN, "in1.jpg", STATUS_INSIDE)
+    old.update_vehicle_exit(completed, TIME_OUT, "out1.jpg")
+    inside = old.insert_vehicle_entry("51A00002", "card-2", TIME_IN, "in2.jpg", STATUS_INSIDE)
+    no_plate = old.insert_vehicle_entry("UNKNOWN", "card-3", TIME_IN, "in3.jpg", STATUS_FAIL_NO_PLATE)
+    already_synced = old.insert_vehicle_entry("51A00004", "card-4", TIME_IN, "in4.jpg", STATUS_INSIDE)
+
+    # Database from before the outbox existed: only the per-row flag
+    conn = sqlite3.connect(db_file)
+    with conn:
+        conn.execute("DROP TABLE sync_outbox")
+        conn.execute("DELETE FROM sync_state")
+        conn.execute("UPDATE parking_log SET synced_to_server = (id = ?)", (already_synced,))
+    conn.close()
+
+    upgraded = SafeDatabaseManager(db_file, device_uid="TEST-UID")
+    upgraded.init_database()
+
+    # A completed trip queues both IN and OUT (we cannot know whether the IN went out)
+    assert outbox(upgraded) == [
+        (completed, "IN"), (completed, "OUT"), (inside, "IN"), (no_plate, "NO_PLATE_DETECTED"),
+    ]
+    rows = query(upgraded, "SELECT event_time, image_path FROM sync_outbox WHERE log_id = ? ORDER BY id",
+                 (completed,))
+    assert [(r['event_time'], r['image_path']) for r in rows] == [(TIME_IN, "in1.jpg"), (TIME_OUT, "out1.jpg")]
+
+    # Backfill runs only when the outbox is created
+    again = SafeDatabaseManager(db_file, device_uid="TEST-UID")
+    again.init_database()
+    assert len(outbox(again)) == 4
+
+
+def test_enqueue_is_idempotent(db_manager):
+    record_id = db_manager.insert_vehicle_entry("51A12345", "card-1", TIME_IN, None, STATUS_INSIDE)
+    with db_manager._locked_connection() as conn:
+        db_manager._enqueue_event(conn.cursor(), record_id, "IN", TIME_IN, None)
+        db_manager._enqueue_event(conn.cursor(), record_id, "IN", "2026-10-01 09:00:00", "other.jpg")
+
+    rows = query(db_manager, "SELECT event_time, image_path FROM sync_outbox")
+    assert [(r['event_time'], r['image_path']) for r in rows] == [(TIME_IN, None)]
+
+
+def test_cursor_stops_before_an_unacked_event(db_manager):
+    enqueue_entries(db_manager, 3)
+    first, second, third = db_manager.get_pending_events(limit=10)
+
+    # Acked out of order (a batch where the first event failed)
+    db_manager.complete_event(second)
+    db_manager.complete_event(third)
+    assert db_manager.get_sync_cursor() == 0
+    assert [e['id'] for e in db_manager.get_pending_events(limit=10)] == [first['id']]
+    assert db_manager.has_unsynced_data()
+
+    db_manager.complete_event(first)
+    assert db_manager.get_sync_cursor() == third['id']
+    assert db_manager.get_pending_events(limit=10) == []
+    assert not db_manager.has_unsynced_data()
+
+
+def test_cursor_advances_over_the_acked_prefix_only(db_manager):
+    enqueue_entries(db_manager, 3)
+    first, second, third = db_manager.get_pending_events(limit=10)
+
+    db_manager.complete_event(first)
+    db_manager.complete_event(third)
+    assert db_manager.get_sync_cursor() == first['id']
+    assert [e['id'] for e in db_manager.get_pending_events(limit=10)] == [second['id']]
+
+
+def test_trip_is_synced_once_both_events_are_acked(db_manager):
+    record_id = db_manager.insert_vehicle_entry("51A12345", "card-1", TIME_IN, None, STATUS_INSIDE)
+    db_manager.update_vehicle_exit(record_id, TIME_OUT, None)
+    entry, exit_event = db_manager.get_pending_events(limit=10)
+
+    assert db_manager.complete_event(entry) is False
+    assert query(db_manager, "SELECT synced_to_server FROM parking_log")[0][0] == 0
+    assert db_manager.complete_event(exit_event) is True
+    row = query(db_manager, "SELECT status, synced_to_server FROM parking_log")[0]
+    assert (row['status'], row['synced_to_server']) == (STATUS_COMPLETED, 1)
+
+
+def test_rejected_event_marks_the_row_invalid(db_manager):
+    record_id = db_manager.insert_vehicle_entry("51A12345", "card-1", TIME_IN, None, STATUS_INSIDE)
+    event = db_manager.get_pending_events()[0]
+
+    assert db_manager.complete_event(event, invalid=True) is True
+    row = query(db_manager, "SELECT status, synced_to_server FROM parking_log WHERE id = ?", (record_id,))[0]
+    assert (row['status'], row['synced_to_server']) == (STATUS_INVALID, 1)
+    event_row = query(db_manager, "SELECT result, acked_at FROM sync_outbox WHERE id = ?", (event['id'],))[0]
+    assert event_row['result'] == 'rejected' and event_row['acked_at'] is not None
+    assert db_manager.get_sync_cursor() == event['id']
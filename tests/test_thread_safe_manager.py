@@ -0,0 +1,46 @@
+import threading
+import time
+
+from core_utils import ThreadSafeManager
+
+
+def test_concurrent_decisions_wait_instead_of_failing(tmp_path):
+    manager = ThreadSafeManager(str(tmp_path / "parking_data.db"))
+    active = []
+    overlaps = []
+    errors = []
+    lock = threading.Lock()
+
+    def lane(name):
+        try:
+            with manager.exclusive_processing():
+                with lock:
+                    active.append(name)
+                    if len(active) > 1:
+                        overlaps.append(tuple(active))
+                time.sleep(0.05)
+                with lock:
+                    active.remove(name)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lane, args=(f"lane{i}",)) for i in range(3)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert errors == []
+    assert overlaps == []
+    assert time.monotonic() - started >= 0.15  # serialised, all three ran
+    assert not manager.is_vehicle_processing()
+    assert manager.wait_until_idle(timeout=0)
+
+
+def test_idle_is_cleared_while_a_decision_runs(tmp_path):
+    manager = ThreadSafeManager(str(tmp_path / "parking_data.db"))
+    with manager.exclusive_processing():
+        assert manager.is_vehicle_processing()
+        assert not manager.wait_until_idle(timeout=0)
+    assert manager.wait_until_idle(timeout=0)
@@ -0,0 +1,60 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from core_utils import write_file_atomic
+from thumbnails import ThumbnailService
+
+
+def run_concurrently(target, count=8):
+    errors = []
+    barrier = threading.Barrier(count)
+
+    def worker(index):
+        try:
+            barrier.wait()
+            target(index)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return errors
+
+
+def test_concurrent_atomic_writes_of_one_path(tmp_path):
+    path = str(tmp_path / "shared.bin")
+
+    def write(index):
+        for _ in range(50):
+            write_file_atomic(path, bytes([index]) * 1024)
+
+    assert run_concurrently(write) == []
+    with open(path, "rb") as f:
+        data = f.read()
+    assert len(data) == 1024 and len(set(data)) == 1
+    assert os.listdir(tmp_path) == ["shared.bin"]  # no temp files left behind
+
+
+def test_workers_sharing_a_cache_render_the_same_thumbnail(tmp_path):
+    source_dir = tmp_path / "picture"
+    source_dir.mkdir()
+    ok, jpeg = cv2.imencode(".jpg", np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8))
+    (source_dir / "raw_in.jpg").write_bytes(jpeg.tobytes())
+
+    # One service per worker process, one cache directory
+    services = [ThumbnailService(str(source_dir), str(tmp_path / "thumbs"), width=160) for _ in range(8)]
+    results = []
+
+    def get(index):
+        results.append(services[index].get("raw_in.jpg", "jpeg"))
+
+    assert run_concurrently(get) == []
+    assert len(results) == 8 and None not in results
+    assert len({path for path, _, _ in results}) == 1
+    assert os.path.getsize(results[0][0]) > 0
@@ -0,0 +1,23 @@
+import re
+
+from core_utils import STATUS_INSIDE, STATUS_FAIL_NO_PLATE, get_vietnam_time_str
+
+
+def page_counts(html):
+    return [int(value) for value in re.findall(r'<div class="stats-item">\s*<h3>[^<]*</h3>\s*<p>(\d+)</p>', html)]
+
+
+def test_page_and_api_report_the_same_totals(web, db_manager):
+    now = get_vietnam_time_str()
+    exited = db_manager.insert_vehicle_entry("51A00001", "card-1", now, None, STATUS_INSIDE)
+    db_manager.insert_vehicle_entry("51A00002", "card-2", now, None, STATUS_INSIDE)
+    db_manager.insert_vehicle_entry("UNKNOWN", "card-3", now, None, STATUS_FAIL_NO_PLATE)
+    db_manager.update_vehicle_exit(exited, get_vietnam_time_str(), None)
+    client = web.app.test_client()
+
+    api = client.get('/api/v1/statistics?period=daily').get_json()
+    page = client.get('/statistics?period=daily')
+
+    assert page.status_code == 200
+    assert (api['total_in'], api['total_out'], api['total_fail']) == (2, 1, 1)
+    assert page_counts(page.get_data(as_text=True)) == [api['total_in'], api['total_out'], api['total_fail']]
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Dashboard thumbnails: generated on first view, kept in an LRU cache on disk
+shared by all web app processes.
+"""
+
+import hashlib
+import os
+import struct
+import threading
+import time
+from typing import Optional, List, Dict, Any, Tuple
+
+import cv2
+
+from core_utils import get_image_codec, write_file_atomic
+
+
+def jpeg_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) from a JPEG's SOF header without decoding; None if not found."""
+    index = 2
+    while index + 9 < len(data):
+        if data[index] != 0xFF:
+            return None
+        marker = data[index + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            index += 2
+            continue
+        length = struct.unpack(">H", data[index + 2:index + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[index + 5:index + 9])
+            return width, height
+        index += 2 + length
+    return None
+
+
+class ThumbnailService:
+    """
+    Fixed-width WebP/JPEG thumbnails of event images, made on first request.
+
+    Thumbnails are stored in cache_dir, sharded by the first bytes of the
+    cache key (cache_dir/ab/cd/<key>.webp). The key hashes the source file
+    name, size and mtime plus the thumbnail settings, so a thumbnail never
+    changes once written; the key doubles as a strong ETag. The cache is
+    bounded by max_bytes and evicts least recently used files (file mtime
+    is bumped on use, at most once per touch_interval). Several processes
+    can share one cache directory.
+    """
+
+    FORMATS = {"webp": ("image/webp", ".webp"), "jpeg": ("image/jpeg", ".jpg")}
+
+    def __init__(self, source_dir: str, cache_dir: str, width: int = 320, quality: int = 70,
+                 max_bytes: int = 64 * 1024 * 1024, touch_interval: float = 3600.0):
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+        self.width = width
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._cache_bytes: Optional[int] = None  # lazily scanned
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generate_time = 0.0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _source_path(self, filename: str) -> Optional[str]:
+        if not filename or os.path.basename(filename) != filename or filename.startswith("."):
+            return None
+        return os.path.join(self.source_dir, filename)
+
+    def cache_key(self, filename: str, stat_result: os.stat_result, fmt: str) -> str:
+        identity = f"{filename}:{stat_result.st_size}:{stat_result.st_mtime_ns}:{self.width}:{self.quality}:{fmt}"
+        return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+    def _cache_path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key[2:4], key + self.FORMATS[fmt][1])
+
+    def get(self, filename: str, fmt: str = "webp") -> Optional[Tuple[str, str, str]]:
+        """
+        (path, mimetype, etag) of the thumbnail, generating it if needed.
+        None if the source image does not exist or cannot be decoded.
+        """
+        source_path = self._source_path(filename)
+        if source_path is None or fmt not in self.FORMATS:
+            return None
+        try:
+            stat_result = os.stat(source_path)
+        except OSError:
+            return None
+
+        key = self.cache_key(filename, stat_result, fmt)
+        path = self._cache_path(key, fmt)
+        mimetype = self.FORMATS[fmt][0]
+        if self._touch(path):
+            self.hits += 1
+            return path, mimetype, key
+
+        # One generator per key; concurrent requests for it wait and reuse the result
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            try:
+                if self._touch(path):
+                    self.hits += 1
+                    return path, mimetype, key
+                self.misses += 1
+                data = self._render(source_path, fmt)
+                if data is None:
+                    return None
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                try:
+                    write_file_atomic(path, data)
+                except OSError:
+                    # Another process wrote the same thumbnail (or evicted its
+                    # directory) meanwhile; if the file is there, use it
+                    if not self._touch(path):
+                        raise
+                    return path, mimetype, key
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+
+        self._account(len(data))
+        return path, mimetype, key
+
+    def _touch(self, path: str) -> bool:
+        """True if path exists; bumps its mtime for LRU if not used recently."""
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return False
+        if time.time() - mtime > self.touch_interval:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return True
+
+    def _render(self, source_path: str, fmt: str) -> Optional[bytes]:
+        started = time.monotonic()
+        try:
+            with open(source_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        # Let the JPEG decoder do most of the downscaling (1/2, 1/4, 1/8)
+        codec = get_image_codec()
+        scale = 1
+        dimensions = jpeg_dimensions(data)
+        if dimensions:
+            while scale < 8 and dimensions[0] // (scale * 2) >= self.width:
+                scale *= 2
+        try:
+            frame = codec.decode(data, scale)
+        except Exception:
+            frame = None
+        if frame is None:
+            return None
+        frame = codec.resize(frame, self.width)
+
+        if fmt == "webp":
+            ok, buf = cv2.imencode(".webp", frame, [int(cv2.IMWRITE_WEBP_QUALITY), self.quality])
+            result = buf.tobytes() if ok else None
+        else:
+            result = codec.encode(frame, self.quality)
+        self.generate_time += time.monotonic() - started
+        return result
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue  # being written by another worker
+                path = os.path.join(root, name)
+                try:
+                    stat_result = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat_result.st_mtime, stat_result.st_size, path))
+        return entries
+
+    def _account(self, added_bytes: int):
+        with self._lock:
+            if self._cache_bytes is None:
+                self._cache_bytes = sum(size for _, size, _ in self._scan())
+            else:
+                self._cache_bytes += added_bytes
+            if self._cache_bytes <= self.max_bytes:
+                return
+            self.evict()
+
+    def evict(self, target_ratio: float = 0.9):
+        """Delete least recently used thumbnails until the cache is under target_ratio of max_bytes."""
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * target_ratio
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except OSError:
+                pass
+        self._cache_bytes = total
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'cache_bytes': self._cache_bytes,
+            'avg_generate_time': round(self.generate_time / self.misses, 4) if self.misses else None,
+        }
+
+
+__all__ = [
+    'jpeg_dimensions', 'ThumbnailService'
+]
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Web interface load test.
+
+Drives a running web app (gunicorn or the dev server) with concurrent
+clients for a fixed time and reports sustained requests/sec and latency
+percentiles for the dashboard page (/log), event pictures (/image/<file>,
+full downloads or ETag revalidations) and the live MJPEG stream
+(/video_stream, frames/sec delivered across all viewers).
+
+    gunicorn -c gunicorn.conf.py app:app &
+    python3 web_load_test.py --url http://127.0.0.1:5000 --clients 8 --streams 4 --duration 30
+
+Only GET requests are sent, so it is safe against the live system.
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+
+import requests
+
+from core_utils import Config
+
+SCENARIOS = ('log', 'image', 'image_304', 'stream')
+
+
+class RequestStats:
+    """Thread-safe latency samples and counters for one scenario."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.status_codes = {}
+        self.errors = 0
+        self.bytes = 0
+        self.frames = 0
+
+    def record(self, latency: float, status_code: int, size: int):
+        with self._lock:
+            self.latencies.append(latency)
+            self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+            self.bytes += size
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def record_frames(self, count: int, size: int):
+        with self._lock:
+            self.frames += count
+            self.bytes += size
+
+    def as_dict(self, elapsed: float) -> dict:
+        with self._lock:
+            samples = sorted(self.latencies)
+            result = {
+                'scenario': self.name,
+                'requests': len(samples),
+                'errors': self.errors,
+                'requests_per_sec': round(len(samples) / elapsed, 1) if elapsed else 0.0,
+                'mb_per_sec': round(self.bytes / elapsed / 1024 / 1024, 2) if elapsed else 0.0,
+                'status_codes': {str(k): v for k, v in self.status_codes.items()},
+            }
+            if samples:
+                result.update({
+                    'p50_ms': round(statistics.median(samples) * 1000, 1),
+                    'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1),
+                    'p99_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 1),
+                })
+            if self.name == 'stream':
+                result['frames'] = self.frames
+                result['frames_per_sec'] = round(self.frames / elapsed, 1) if elapsed else 0.0
+            return result
+
+
+def request_loop(session: requests.Session, url: str, stats: RequestStats, deadline: float,
+                 revalidate: bool = False):
+    """Issue GETs back to back until the deadline (with If-None-Match when revalidating)."""
+    etag = None
+    while time.monotonic() < deadline:
+        headers = {'If-None-Match': etag} if revalidate and etag else {}
+        started = time.perf_counter()
+        try:
+            response = session.get(url, headers=headers, timeout=10)
+            body = response.content
+        except requests.RequestException:
+            stats.record_error()
+            time.sleep(0.1)
+            continue
+        stats.record(time.perf_counter() - started, response.status_code, len(body))
+        if response.status_code >= 400:
+            stats.record_error()
+        etag = response.headers.get('ETag') or etag
+
+
+def stream_loop(session: requests.Session, url: str, stats: RequestStats, deadline: float):
+    """Watch the MJPEG stream until the deadline, counting the parts received."""
+    marker = b"--frame\r\n"
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            with session.get(url, stream=True, timeout=10) as response:
+                if response.status_code != 200:
+                    stats.record(time.perf_counter() - started, response.status_code, 0)
+                    stats.record_error()
+                    time.sleep(1.0)
+                    continue
+                stats.record(time.perf_counter() - started, response.status_code, 0)
+                tail = b""
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    data = tail + chunk
+                    stats.record_frames(data.count(marker), len(chunk))
+                    tail = data[-(len(marker) - 1):]
+                    if time.monotonic() >= deadline:
+                        break
+        except requests.RequestException:
+            stats.record_error()
+            time.sleep(0.5)
+
+
+def pick_image(picture_dir: str):
+    """Newest event picture on disk (the web app serves the same directory)."""
+    try:
+        names = [name for name in os.listdir(picture_dir) if name.lower().endswith('.jpg')]
+    except OSError:
+        return None
+    if not names:
+        return None
+    return max(names, key=lambda name: os.path.getmtime(os.path.join(picture_dir, name)))
+
+
+def run_scenario(args, scenario: str, image_name) -> dict:
+    stats = RequestStats(scenario)
+    deadline = time.monotonic() + args.duration
+    base = args.url.rstrip('/')
+    threads = []
+
+    if scenario == 'stream':
+        url = f"{base}/video_stream?variant={args.variant}"
+        workers = [(stream_loop, (url, stats, deadline)) for _ in range(args.streams)]
+    elif scenario == 'log':
+        workers = [(request_loop, (f"{base}/log", stats, deadline, args.revalidate_pages))
+                   for _ in range(args.clients)]
+    else:
+        url = f"{base}/image/{image_name}"
+        workers = [(request_loop, (url, stats, deadline, scenario == 'image_304')) for _ in range(args.clients)]
+
+    started = time.perf_counter()
+    for target, target_args in workers:
+        session = requests.Session()
+        thread = threading.Thread(target=target, args=(session,) + target_args, daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join(timeout=args.duration + 15)
+    return stats.as_dict(time.perf_counter() - started)
+
+
+def print_report(results: list):
+    print("\n📊 [WebLoad] Results")
+    header = f"{'scenario':<11}{'reqs':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'MB/s':>8}{'fps':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        fps = f"{r['frames_per_sec']:.1f}" if 'frames_per_sec' in r else "-"
+        print(f"{r['scenario']:<11}{r['requests']:>8}{r['errors']:>8}{r['requests_per_sec']:>9.1f}"
+              f"{r.get('p50_ms', 0):>9.1f}{r.get('p95_ms', 0):>9.1f}{r.get('p99_ms', 0):>9.1f}"
+              f"{r['mb_per_sec']:>8.2f}{fps:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the web interface")
+    parser.add_argument('--url', default=f"http://127.0.0.1:{Config.FLASK_PORT}")
+    parser.add_argument('--scenario', choices=SCENARIOS + ('all',), default='all')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds per scenario')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients for /log and /image')
+    parser.add_argument('--streams', type=int, default=4, help='Concurrent /video_stream viewers')
+    parser.add_argument('--variant', default=Config.LIVE_VIEW_DEFAULT_VARIANT, help='Live view variant to watch')
+    parser.add_argument('--image', help='Picture file name for /image (default: newest in PICTURE_OUTPUT_DIR)')
+    parser.add_argument('--revalidate-pages', action='store_true',
+                        help='Send If-None-Match on /log like a browser reloading the page')
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+    image_name = args.image or pick_image(Config.PICTURE_OUTPUT_DIR)
+    if image_name is None and any(s.startswith('image') for s in scenarios):
+        print("⚠️  [WebLoad] No picture found; skipping /image scenarios (use --image)")
+        scenarios = tuple(s for s in scenarios if not s.startswith('image'))
+
+    print(f"🧪 [WebLoad] {args.url}: {', '.join(scenarios)}, {args.duration:.0f}s each, "
+          f"{args.clients} clients, {args.streams} stream viewers")
+    results = [run_scenario(args, scenario, image_name) for scenario in scenarios]
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 [WebLoad] Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()